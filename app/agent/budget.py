@@ -0,0 +1,74 @@
+"""Per-ticket agent loop budgets (iterations, wall clock, tokens) and a memo for redundant tool calls."""
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.rerank import jaccard, terms
+
+
+@dataclass
+class LoopBudget:
+    """Limits for one ticket's tool loop and final decision call (both bounded by the time budget)."""
+    max_iterations: int = field(default_factory=lambda: settings.agent_max_iterations)
+    time_budget_seconds: float = field(default_factory=lambda: settings.agent_time_budget_seconds)
+    token_budget: int = field(default_factory=lambda: settings.agent_token_budget)
+    started: float = field(default_factory=time.monotonic)
+    iterations: int = 0
+    tokens: int = 0
+
+    def record(self, usage: Optional[Dict[str, int]]):
+        """Count one LLM round trip and its token usage."""
+        self.iterations += 1
+        usage = usage or {}
+        self.tokens += usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+
+    def remaining_seconds(self) -> Optional[float]:
+        """Wall-clock time left (never negative), or None without a time budget; LLM calls use it as their timeout."""
+        if not self.time_budget_seconds:
+            return None
+        return max(0.0, self.time_budget_seconds - (time.monotonic() - self.started))
+
+    def exhausted(self) -> Optional[str]:
+        """Why no further LLM round trip is allowed, or None while within budget (0 = no limit)."""
+        if self.iterations >= self.max_iterations:
+            return "max_iterations"
+        if self.time_budget_seconds and time.monotonic() - self.started >= self.time_budget_seconds:
+            return "time_budget"
+        if self.token_budget and self.tokens >= self.token_budget:
+            return "token_budget"
+        return None
+
+
+class ToolMemo:
+    """
+    Results of one ticket's tool calls, reused for repeated calls.
+
+    A KB search matches an earlier one with the same top_k whose query terms
+    overlap at least `threshold` (Jaccard), so "export pdf greyed out" and
+    "pdf export button greyed" share one search. Other tools match on equal
+    arguments.
+    """
+
+    def __init__(self, threshold: Optional[float] = None):
+        self.threshold = settings.agent_tool_memo_threshold if threshold is None else threshold
+        self._exact: Dict[Tuple[str, str], Any] = {}
+        self._searches: List[Tuple[frozenset, Any, Any]] = []
+
+    def get(self, name: str, arguments: Dict[str, Any]) -> Optional[Any]:
+        if name == "search_knowledge_base":
+            query_terms = terms(arguments.get("query", ""))
+            for seen_terms, top_k, result in self._searches:
+                if top_k == arguments.get("top_k", 3) and (
+                    seen_terms == query_terms or jaccard(seen_terms, query_terms) >= self.threshold
+                ):
+                    return result
+            return None
+        return self._exact.get((name, json.dumps(arguments, sort_keys=True)))
+
+    def put(self, name: str, arguments: Dict[str, Any], result: Any):
+        if name == "search_knowledge_base":
+            self._searches.append((terms(arguments.get("query", "")), arguments.get("top_k", 3), result))
+        else:
+            self._exact[(name, json.dumps(arguments, sort_keys=True))] = result
@@ -25,6 +25,7 @@ class TicketThread:
     """full ticket messages that include customer info"""
     customer: CustomerInfo
     messages: List[TicketMessage]
+    tenant: Optional[str] = None  # KB tenant; None = default
 
 
 @dataclass
@@ -61,3 +62,5 @@ class AgentOutput:
     kb_results: List[KBResult]
     customer_profile: dict
     next_action: NextAction
+    iterations: int = 0  # tool-loop LLM round trips (the final decision call not included)
+    stop_reason: Optional[str] = None  # why the tool loop ended, e.g. "tools_done", "time_budget"
@@ -0,0 +1,172 @@
+"""Speculative tool calls: KB search and customer profile prefetched while the first LLM turn runs."""
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.rerank import terms
+from app.tracing import Trace, count, current_trace, stage, traced
+
+# Tool name -> kind of speculation that can answer it
+TOOL_KINDS = {"search_knowledge_base": "kb", "get_customer_profile": "profile"}
+
+_executor = ThreadPoolExecutor(max_workers=settings.speculation_workers, thread_name_prefix="speculate")
+
+
+class SpeculationStats:
+    """Process-wide speculation outcomes (served by GET /speculation)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"started": 0, "hits": 0, "misses": 0, "unused": 0, "errors": 0, "late": 0, "cancelled": 0}
+
+    def add(self, outcome: str):
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counts plus hit_rate: the share of settled speculations that served the model's call."""
+        with self._lock:
+            counts = dict(self._counts)
+        decided = counts["hits"] + counts["misses"] + counts["unused"] + counts["errors"] + counts["late"]
+        counts["hit_rate"] = round(counts["hits"] / decided, 4) if decided else None
+        return counts
+
+
+speculation_stats = SpeculationStats()
+
+
+@dataclass
+class _Pending:
+    kind: str  # "kb" or "profile"
+    future: Future
+    trace: Trace
+    query_terms: frozenset = frozenset()
+    top_k: int = 0
+    arguments: Optional[Dict[str, Any]] = None
+    used: bool = False
+    merged: bool = False
+
+
+def _submit(fn: Callable[..., Any], *args, **kwargs) -> Tuple[Future, Trace]:
+    # Records into its own trace, merged into the request's once the result is settled, so
+    # work still running when the request ends never writes to an already reported trace
+    trace = Trace()
+
+    def run():
+        with traced(trace):
+            return fn(*args, **kwargs)
+
+    return _executor.submit(contextvars.copy_context().run, run), trace
+
+
+class Speculation:
+    """
+    One ticket's speculative tool results.
+
+    The KB search uses the latest customer message as the query; the model's
+    own search is served from it when at least `threshold` of the model's
+    query terms appear in that message and it asks for the same top_k (a
+    different top_k over-fetches a different candidate pool, so its pick can
+    differ). The profile is served when the model asks for the ticket's own
+    plan and tenure. A matching speculation still queued behind other
+    requests' is cancelled and the tool runs inline; a running one is waited
+    for at most SPECULATION_WAIT_SECONDS. Speculations still running when the
+    tool loop ends are cancelled (or, once started, left to finish unrecorded).
+    """
+
+    def __init__(self, threshold: Optional[float] = None):
+        self.threshold = settings.speculation_match_threshold if threshold is None else threshold
+        self._pending: List[_Pending] = []
+
+    def start_kb_search(self, search: Callable[..., Any], query: str, top_k: int, **kwargs):
+        """Start search(query, top_k, **kwargs) in the background."""
+        def run():
+            with stage("speculative_kb_search"):
+                return search(query, top_k, **kwargs)
+
+        future, trace = _submit(run)
+        self._pending.append(_Pending("kb", future, trace, query_terms=terms(query), top_k=top_k))
+        speculation_stats.add("started")
+        count("speculation_started")
+
+    def start_profile(self, lookup: Callable[..., Any], arguments: Dict[str, Any]):
+        """Start lookup(**arguments) in the background."""
+        future, trace = _submit(lookup, **arguments)
+        self._pending.append(_Pending("profile", future, trace, arguments=arguments))
+        speculation_stats.add("started")
+        count("speculation_started")
+
+    def _matches(self, pending: _Pending, name: str, arguments: Dict[str, Any]) -> bool:
+        if pending.kind != TOOL_KINDS.get(name):
+            return False
+        if pending.kind == "kb":
+            wanted = terms(arguments.get("query", ""))
+            overlap = len(wanted & pending.query_terms) / len(wanted) if wanted else 0.0
+            return arguments.get("top_k", 3) == pending.top_k and overlap >= self.threshold
+        return all(
+            arguments.get(key) in (None, value) if key == "region" else arguments.get(key) == value
+            for key, value in pending.arguments.items()
+        )
+
+    def take(self, name: str, arguments: Dict[str, Any]) -> Optional[Any]:
+        """
+        The speculative result for a tool call, waiting (bounded) for it if still running.
+
+        Returns:
+            The result, or None when nothing speculated matches, it isn't ready
+            in time, or it failed; the caller then runs the tool itself
+        """
+        for pending in self._pending:
+            if pending.used or not self._matches(pending, name, arguments):
+                continue
+            pending.used = True
+            if pending.future.cancel():
+                # Still queued behind other requests' speculations: running the tool now is faster
+                speculation_stats.add("late")
+                count("speculation_late")
+                return None
+            try:
+                result = pending.future.result(timeout=settings.speculation_wait_seconds)
+            except FutureTimeout:
+                speculation_stats.add("late")
+                count("speculation_late")
+                return None
+            except Exception as e:
+                print(f"Speculative {pending.kind} call failed: {e}")
+                speculation_stats.add("errors")
+                count("speculation_errors")
+                return None
+            finally:
+                self._merge(pending)
+            speculation_stats.add("hits")
+            count("speculation_hits")
+            return result
+        # The model asked for this tool, but not what was speculated
+        for pending in self._pending:
+            if not pending.used and pending.kind == TOOL_KINDS.get(name):
+                pending.used = True
+                speculation_stats.add("misses")
+                count("speculation_misses")
+        return None
+
+    def _merge(self, pending: _Pending):
+        trace = current_trace()
+        if trace is not None and not pending.merged and pending.future.done():
+            trace.merge(pending.trace)
+            pending.merged = True
+
+    def finish(self):
+        """Count speculations the model never asked for; record finished ones, cancel the rest."""
+        for pending in self._pending:
+            if not pending.used:
+                pending.used = True
+                speculation_stats.add("unused")
+                count("speculation_unused")
+            if pending.future.done():
+                self._merge(pending)
+            elif pending.future.cancel():
+                speculation_stats.add("cancelled")
+                count("speculation_cancelled")
@@ -1,6 +1,6 @@
 """Main triage agent operation"""
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from app.agent.models import (
     TicketThread,
     Classification,
@@ -8,10 +8,36 @@ from app.agent.models import (
     AgentOutput,
     KBResult,
 )
+from app.agent.budget import LoopBudget, ToolMemo
+from app.agent.speculation import Speculation
+from app.config import settings
 from app.agent.prompts import SYSTEM_PROMPT, TOOL_DEFINITIONS
+from app.kb_metadata import detect_language
 from app.llm_client import llm_client
 from app.tools.knowledge_base import search_knowledge_base
 from app.tools.customer_profile import get_customer_profile
+from app.tracing import count, stage
+
+# Once both have run the model has everything the final decision needs
+REQUIRED_TOOLS = frozenset({"search_knowledge_base", "get_customer_profile"})
+
+
+def fallback_decision(summary: str) -> Dict[str, Any]:
+    """Decision used when the model gives none (unparseable reply, or no time left): escalate to a human."""
+    return {
+        "classification": {
+            "urgency": "medium",
+            "product": None,
+            "issue_type": None,
+            "sentiment": "neutral",
+            "short_summary": summary,
+        },
+        "next_action": {
+            "action": "escalate_to_human",
+            "target_queue": None,
+            "auto_reply": None,
+        },
+    }
 
 
 def build_conversation_summary(thread: TicketThread) -> str:
@@ -22,27 +48,35 @@ def build_conversation_summary(thread: TicketThread) -> str:
     return "\n".join(lines)
 
 
-def execute_tool_call(tool_call: Dict[str, Any]) -> Any:
-    """Execute a tool call and return the result"""
+def kb_tool_result(results: List[KBResult]) -> Dict[str, Any]:
+    """Convert KBResult objects to dicts for json encode"""
+    return {
+        "results": [
+            {
+                "id": r.id,
+                "title": r.title,
+                "snippet": r.snippet,
+                "score": r.score,
+            }
+            for r in results
+        ]
+    }
+
+
+def execute_tool_call(
+    tool_call: Dict[str, Any],
+    plan: Optional[str] = None,
+    language: Optional[str] = None,
+    tenant: Optional[str] = None,
+) -> Any:
+    """Execute a tool call and return the result (KB search is scoped to the ticket's tenant, plan and language)"""
     function_name = tool_call["function"]["name"]
     arguments = json.loads(tool_call["function"]["arguments"])
     
     if function_name == "search_knowledge_base":
         query = arguments.get("query", "")
         top_k = arguments.get("top_k", 3)
-        results = search_knowledge_base(query, top_k)
-        # Convert KBResult objects to dicts for json encode
-        return {
-            "results": [
-                {
-                    "id": r.id,
-                    "title": r.title,
-                    "snippet": r.snippet,
-                    "score": r.score,
-                }
-                for r in results
-            ]
-        }
+        return kb_tool_result(search_knowledge_base(query, top_k, plan=plan, language=language, tenant=tenant))
     
     elif function_name == "get_customer_profile":
         customer_plan = arguments.get("customer_plan", "")
@@ -59,10 +93,12 @@ def triage_ticket(thread: TicketThread) -> AgentOutput:
     Main triage function - tools selection
     """
     #conversation summary
-    conversation_summary = build_conversation_summary(thread)
-    
-    # user message with context
-    user_message = f"""Customer Information:
+    with stage("prompt_build"):
+        conversation_summary = build_conversation_summary(thread)
+        language = detect_language(" ".join(msg.text for msg in thread.messages))
+        
+        # user message with context
+        user_message = f"""Customer Information:
 - Plan: {thread.customer.plan}
 - Region: {thread.customer.region or 'Not specified'}
 - Tenure: {thread.customer.tenure_months} months
@@ -73,6 +109,20 @@ Conversation:
 
 Please analyze this ticket, use the available tools to gather information, and provide your triage decision."""
     
+    # Start the KB search (latest customer message as the query) and profile lookup now,
+    # overlapped with the first LLM turn; served if the model asks for something similar
+    speculation = Speculation()
+    if settings.speculation_enabled and thread.messages:
+        speculation.start_kb_search(
+            search_knowledge_base, thread.messages[-1].text, settings.speculation_top_k,
+            plan=thread.customer.plan, language=language, tenant=thread.tenant,
+        )
+        speculation.start_profile(get_customer_profile, {
+            "customer_plan": thread.customer.plan,
+            "tenure_months": thread.customer.tenure_months,
+            "region": thread.customer.region,
+        })
+    
     # Initialize conversation
     messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
@@ -83,19 +133,31 @@ Please analyze this ticket, use the available tools to gather information, and p
     tool_results = []
     kb_results = []
     customer_profile = None
-    max_iterations = 10
-    iteration = 0
+    budget = LoopBudget()
+    memo = ToolMemo()
+    tools_run = set()
+    stop_reason = None
     
-    # Main agent loop
-    while iteration < max_iterations:
-        iteration += 1
+    # Main agent loop: stops when the model stops calling tools, both required tools have run,
+    # every call in a round repeats an earlier one, or the iteration/time/token budget is spent
+    while True:
+        stop_reason = budget.exhausted()
+        if stop_reason:
+            break
+        count("llm_iterations")
         
-        # LLM call with tools
-        response = llm_client.chat_completion(
-            messages=messages,
-            tools=TOOL_DEFINITIONS,
-            tool_choice="auto",
-        )
+        # LLM call with tools, cut off when the time budget runs out
+        try:
+            response = llm_client.chat_completion(
+                messages=messages,
+                tools=TOOL_DEFINITIONS,
+                tool_choice="auto",
+                timeout=budget.remaining_seconds(),
+            )
+        except TimeoutError:
+            stop_reason = "time_budget"
+            break
+        budget.record(response.get("usage"))
         
         # Add assistant message
         assistant_message = {"role": "assistant", "content": response["content"]}
@@ -105,33 +167,61 @@ Please analyze this ticket, use the available tools to gather information, and p
         
         # if no call
         if not response["tool_calls"]:
+            stop_reason = "no_tool_calls"
             break
         
-        # Execute tool calls
+        # Execute tool calls (repeats are answered from the memo)
+        memo_hits = 0
         for tool_call in response["tool_calls"]:
-            tool_result = execute_tool_call(tool_call)
+            name = tool_call["function"]["name"]
+            arguments = json.loads(tool_call["function"]["arguments"])
+            tool_result = memo.get(name, arguments)
+            if tool_result is not None:
+                memo_hits += 1
+                count("tool_memo_hits")
+            else:
+                with stage(f"tool:{name}"):
+                    tool_result = speculation.take(name, arguments)
+                    if tool_result is not None and name == "search_knowledge_base":
+                        tool_result = kb_tool_result(tool_result)
+                    elif tool_result is None:
+                        tool_result = execute_tool_call(
+                            tool_call, plan=thread.customer.plan, language=language, tenant=thread.tenant
+                        )
+                memo.put(name, arguments, tool_result)
+            tools_run.add(name)
             tool_results.append({
                 "tool_call_id": tool_call["id"],
-                "name": tool_call["function"]["name"],
+                "name": name,
                 "result": tool_result,
             })
             
             # tools results if calleds
-            if tool_call["function"]["name"] == "search_knowledge_base":
+            if name == "search_knowledge_base":
                 kb_results = [
                     KBResult(**r) for r in tool_result.get("results", [])
                 ]
-            elif tool_call["function"]["name"] == "get_customer_profile":
+            elif name == "get_customer_profile":
                 customer_profile = tool_result
         
         # add tool result to chat
-        for tool_result in tool_results[-len(response["tool_calls"]):]:
-            messages.append({
-                "role": "tool",
-                "tool_call_id": tool_result["tool_call_id"],
-                "name": tool_result["name"],
-                "content": json.dumps(tool_result["result"]),
-            })
+        with stage("tool_json_encode"):
+            for tool_result in tool_results[-len(response["tool_calls"]):]:
+                messages.append({
+                    "role": "tool",
+                    "tool_call_id": tool_result["tool_call_id"],
+                    "name": tool_result["name"],
+                    "content": json.dumps(tool_result["result"]),
+                })
+        
+        if REQUIRED_TOOLS <= tools_run:
+            stop_reason = "tools_done"
+            break
+        if memo_hits == len(response["tool_calls"]):
+            stop_reason = "redundant_tool_calls"
+            break
+    count(f"agent_stop:{stop_reason}")
+    speculation.finish()
     
     # sturcture output
     final_prompt = """Based on your analysis and the tool results, provide your final triage decision in JSON format:
@@ -153,30 +243,24 @@ Please analyze this ticket, use the available tools to gather information, and p
     
     messages.append({"role": "user", "content": final_prompt})
     
-    final_response = llm_client.chat_completion(
-        messages=messages,
-        response_format={"type": "json_object"},
-    )
-    
-    # Parse final JSON output
-    try:
-        decision = json.loads(final_response["content"])
-    except json.JSONDecodeError:
-        # Fallback if JSON parsing fails
-        decision = {
-            "classification": {
-                "urgency": "medium",
-                "product": None,
-                "issue_type": None,
-                "sentiment": "neutral",
-                "short_summary": "Unable to parse response",
-            },
-            "next_action": {
-                "action": "escalate_to_human",
-                "target_queue": None,
-                "auto_reply": None,
-            },
-        }
+    # Final decision within what is left of the time budget; none left means no call at all
+    remaining = budget.remaining_seconds()
+    if remaining is not None and remaining <= 0:
+        count("final_decision_skipped")
+        decision = fallback_decision("Time budget exhausted before a decision")
+    else:
+        try:
+            final_response = llm_client.chat_completion(
+                messages=messages,
+                response_format={"type": "json_object"},
+                timeout=remaining,
+            )
+            decision = json.loads(final_response["content"])
+        except TimeoutError:
+            count("final_decision_timeout")
+            decision = fallback_decision("Time budget exhausted before a decision")
+        except json.JSONDecodeError:
+            decision = fallback_decision("Unable to parse response")
     
     # Build output objects (normalize LLM "null" strings to None)
     classification = Classification(**decision["classification"])
@@ -200,4 +284,6 @@ Please analyze this ticket, use the available tools to gather information, and p
         kb_results=kb_results,
         customer_profile=customer_profile,
         next_action=next_action,
+        iterations=budget.iterations,
+        stop_reason=stop_reason,
     )
@@ -1,17 +1,26 @@
 """FastAPI application and routes."""
-import dataclasses
-from fastapi import FastAPI, HTTPException
+from typing import Any, Dict, List, Optional, Sequence
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from app.schemas import (
     TicketThreadRequest,
     TriageResponse,
-    ClassificationResponse,
-    KBResultResponse,
-    NextActionResponse,
 )
 from app.agent.triage_agent import triage_ticket
-from app.agent.models import TicketThread, CustomerInfo, TicketMessage
+from app.agent.models import TicketThread, CustomerInfo, TicketMessage, AgentOutput
+from app.agent.speculation import speculation_stats
+from app.config import settings
+from app.dedup import ticket_deduplicator
+from app.kb_loader import TenantIndexing, get_ready_tenant
+from app.tenants import tenant_registry
+from app.kb_watcher import kb_watcher
+from app.profiling import SlowestProfiles, profile_request
+from app.results_store import results_sink, results_store
+from app.tracing import current_trace, stage, traced
 from datetime import datetime
+import time
 
 app = FastAPI(
     title="Support Ticket Triage Agent",
@@ -28,6 +37,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses for clients that send Accept-Encoding: gzip
+if settings.response_gzip_min_bytes > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.response_gzip_min_bytes)
+
+
+# Slowest profiled requests (X-Profile header), kept as folded stacks under profile_path
+profile_store = SlowestProfiles(settings.profile_path, settings.profile_keep_slowest)
+
+
+@app.on_event("startup")
+def start_kb_watcher():
+    """Start background KB hot reload when enabled."""
+    if settings.kb_watch_enabled:
+        kb_watcher.start()
+
+
+@app.on_event("shutdown")
+def stop_kb_watcher():
+    kb_watcher.stop()
+
+
+@app.on_event("startup")
+def start_results_sink():
+    """Start the background flush of triage results when enabled."""
+    if settings.results_enabled:
+        results_sink.start()
+
+
+@app.on_event("shutdown")
+def stop_results_sink():
+    results_sink.stop()
+
 
 @app.get("/")
 def root():
@@ -41,46 +82,222 @@ def health():
     return {"status": "healthy"}
 
 
-@app.post("/triage", response_model=TriageResponse)
-def triage_ticket_endpoint(request: TicketThreadRequest):
+def _resolve_tenant(name: Optional[str], ready: bool = True):
+    """
+    Load (and if ready, start indexing on first use) a tenant; 400 for invalid names,
+    404 for unknown tenants, 503 while a tenant's first index is being built.
+    """
+    try:
+        return get_ready_tenant(name) if ready else tenant_registry.get(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except TenantIndexing as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+
+
+@app.get("/kb/status")
+def kb_status(tenant: Optional[str] = None):
+    """Current KB index version and last reload timing (default tenant unless ?tenant=)."""
+    found = _resolve_tenant(tenant, ready=False)
+    return {**found.status, "tenant": found.name, "watching": settings.kb_watch_enabled}
+
+
+@app.get("/tenants")
+def tenants():
+    """Known tenants and which ones are loaded."""
+    loaded = {t.name: t.status.get("version") for t in tenant_registry.loaded()}
+    return {
+        "default": tenant_registry.default.name,
+        "tenants": [
+            {"name": name, "loaded": name in loaded, "version": loaded.get(name)}
+            for name in tenant_registry.names()
+        ],
+    }
+
+
+@app.get("/incidents")
+def incidents(min_size: Optional[int] = None):
+    """Live clusters of near-identical tickets from the last DEDUP_WINDOW_MINUTES, largest first."""
+    return {
+        "window_minutes": settings.dedup_window_minutes,
+        "incidents": ticket_deduplicator.incidents(min_size or settings.dedup_min_incident_size),
+    }
+
+
+@app.get("/results/summary")
+def results_summary(hours: Optional[float] = None, tenant: Optional[str] = None):
+    """Aggregates over stored triage results (last `hours`, optionally one tenant)."""
+    since = time.time() - hours * 3600 if hours else None
+    return results_store.summary(since=since, tenant=tenant)
+
+
+@app.get("/results/timeseries")
+def results_timeseries(bucket_minutes: float = 60, hours: Optional[float] = None, tenant: Optional[str] = None):
+    """Per-bucket ticket volume, critical share, escalations, latency and tokens."""
+    if bucket_minutes <= 0:
+        raise HTTPException(status_code=400, detail="bucket_minutes must be positive")
+    since = time.time() - hours * 3600 if hours else None
+    return results_store.timeseries(bucket_minutes * 60, since=since, tenant=tenant)
+
+
+@app.get("/speculation")
+def speculation():
+    """Speculative KB search / profile lookup outcomes since startup, with the hit rate."""
+    return {"enabled": settings.speculation_enabled, **speculation_stats.snapshot()}
+
+
+@app.get("/profiles")
+def profiles():
+    """Summaries of the slowest profiled requests, slowest first (404 unless PROFILE_HEADER_ENABLED)."""
+    if not settings.profile_header_enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (PROFILE_HEADER_ENABLED=false)")
+    return profile_store.report()
+
+
+TRIAGE_FIELDS = ("classification", "knowledge_base", "customer_profile", "next_action")
+
+
+def build_triage_payload(
+    output: AgentOutput,
+    fields: Optional[Sequence[str]] = None,
+    include_snippets: bool = True,
+) -> Dict[str, Any]:
+    """
+    Build the /triage JSON body straight from the agent dataclasses.
+    
+    Same shape as TriageResponse, without the dataclasses.asdict copy and the
+    Pydantic re-validation of values the agent already normalized.
+    
+    Args:
+        output: Agent output
+        fields: Top-level keys to include (default: all of TRIAGE_FIELDS)
+        include_snippets: If False, KB results carry id/title/score only
+    """
+    wanted = fields or TRIAGE_FIELDS
+    payload: Dict[str, Any] = {}
+    if "classification" in wanted:
+        c = output.classification
+        payload["classification"] = {
+            "urgency": c.urgency,
+            "product": c.product,
+            "issue_type": c.issue_type,
+            "sentiment": c.sentiment,
+            "short_summary": c.short_summary,
+        }
+    if "knowledge_base" in wanted:
+        payload["knowledge_base"] = [
+            {"id": r.id, "title": r.title, "snippet": r.snippet, "score": r.score}
+            if include_snippets else
+            {"id": r.id, "title": r.title, "score": r.score}
+            for r in output.kb_results
+        ]
+    if "customer_profile" in wanted:
+        payload["customer_profile"] = output.customer_profile
+    if "next_action" in wanted:
+        na = output.next_action
+        payload["next_action"] = {
+            "action": na.action,
+            "target_queue": na.target_queue,
+            "auto_reply": na.auto_reply,
+        }
+    return payload
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in TRIAGE_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(TRIAGE_FIELDS)}",
+        )
+    return requested
+
+
+@app.post("/triage", response_model=TriageResponse, response_class=ORJSONResponse)
+def triage_ticket_endpoint(
+    request: TicketThreadRequest,
+    fields: Optional[str] = None,
+    include_snippets: bool = True,
+    x_profile: Optional[str] = Header(None),
+    x_tenant: Optional[str] = Header(None),
+):
     """
     Triage a support ticket thread.
     
     Args:
         request: Ticket thread with customer info and messages
+        fields: Comma-separated top-level keys to return (e.g. "classification,next_action")
+        include_snippets: Set false to drop KB snippet text from knowledge_base results
+        x_profile: Any non-empty X-Profile header profiles the request (Server-Timing header
+            on the response; kept under profile_path if among the slowest)
+        x_tenant: KB tenant (the request's "tenant" field takes precedence)
     
     Returns:
         Triage response with classification, KB results, and next action
     """
+    wanted = _parse_fields(fields)
+    tenant = _resolve_tenant(request.tenant or x_tenant).name
+    if not (x_profile and settings.profile_header_enabled):
+        # Traced so token counts and LLM time reach the results store
+        with traced():
+            return _triage(request, wanted, include_snippets, tenant)
+
+    with profile_request("POST /triage", settings.profile_sample_interval_ms / 1000) as profile:
+        response = _triage(request, wanted, include_snippets, tenant)
+    response.headers["Server-Timing"] = profile.server_timing()
+    profile_id = profile_store.add(profile)
+    if profile_id:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+def _triage(
+    request: TicketThreadRequest,
+    wanted: Optional[List[str]],
+    include_snippets: bool,
+    tenant: str,
+) -> ORJSONResponse:
+    started = time.perf_counter()
     try:
         # Convert request to internal models
-        customer = CustomerInfo(
-            plan=request.customer.plan,
-            region=request.customer.region,
-            tenure_months=request.customer.tenure_months,
-            prior_tickets=request.customer.prior_tickets,
-        )
-        
-        messages = [
-            TicketMessage(
-                timestamp=msg.timestamp,
-                text=msg.text,
+        with stage("request_convert"):
+            customer = CustomerInfo(
+                plan=request.customer.plan,
+                region=request.customer.region,
+                tenure_months=request.customer.tenure_months,
+                prior_tickets=request.customer.prior_tickets,
             )
-            for msg in request.messages
-        ]
-        
-        thread = TicketThread(customer=customer, messages=messages)
+            
+            messages = [
+                TicketMessage(
+                    timestamp=msg.timestamp,
+                    text=msg.text,
+                )
+                for msg in request.messages
+            ]
+            
+            thread = TicketThread(customer=customer, messages=messages, tenant=tenant)
         
-        # Run triage agent
-        output = triage_ticket(thread)
+        # Run triage agent (near-duplicates of a recent ticket reuse its decision)
+        incident = None
+        if settings.dedup_enabled:
+            output, incident = ticket_deduplicator.triage(thread, triage_ticket)
+        else:
+            output = triage_ticket(thread)
         
-        # Convert dataclasses to Pydantic response models
-        return TriageResponse(
-            classification=ClassificationResponse(**dataclasses.asdict(output.classification)),
-            knowledge_base=[KBResultResponse(**dataclasses.asdict(r)) for r in output.kb_results],
-            customer_profile=output.customer_profile,
-            next_action=NextActionResponse(**dataclasses.asdict(output.next_action)),
-        )
+        # Returning a Response skips response_model validation; the payload already matches it
+        with stage("response_encode"):
+            response = ORJSONResponse(build_triage_payload(output, wanted, include_snippets))
+        if incident is not None and incident.size > 1:
+            response.headers["X-Incident-Id"] = incident.id
+        if settings.results_enabled:
+            results_sink.record(thread, output, (time.perf_counter() - started) * 1000, current_trace())
+        return response
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing ticket: {str(e)}")
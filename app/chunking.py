@@ -0,0 +1,160 @@
+"""Streaming, markdown-aware KB chunker with token budgets and section paths."""
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_LIST_ITEM_RE = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+_SENTENCE_RE = re.compile(r"[^.!?。\n]+(?:[.!?。]+|$)")
+# Rough BPE proxy: words and individual punctuation marks
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+# Block kinds
+_PARAGRAPH, _LIST_ITEM, _HEADING = "paragraph", "list_item", "heading"
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count (words + punctuation)."""
+    return len(_TOKEN_RE.findall(text))
+
+
+def _iter_blocks(lines: Iterable[str]) -> Iterator[Tuple[str, str, int]]:
+    """Yield (kind, text, heading_level) blocks: headings, list items and paragraphs."""
+    buf: List[str] = []
+    kind = _PARAGRAPH
+    for raw in lines:
+        line = raw.rstrip("\n").rstrip()
+        heading = _HEADING_RE.match(line)
+        starts_item = bool(_LIST_ITEM_RE.match(line))
+        if not line or heading or starts_item:
+            if buf:
+                yield kind, "\n".join(buf), 0
+                buf = []
+            if heading:
+                yield _HEADING, line, len(heading.group(1))
+                continue
+            if starts_item:
+                buf, kind = [line], _LIST_ITEM
+            continue
+        if not buf:
+            kind = _PARAGRAPH
+        # Continuation of the current paragraph or list item
+        buf.append(line)
+    if buf:
+        yield kind, "\n".join(buf), 0
+
+
+def _split_long(text: str, max_tokens: int) -> Iterator[str]:
+    """Split an oversized block on sentence boundaries, then on words."""
+    parts: List[str] = []
+    tokens = 0
+    for sentence in _SENTENCE_RE.findall(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        n = count_tokens(sentence)
+        if n > max_tokens:
+            if parts:
+                yield " ".join(parts)
+                parts, tokens = [], 0
+            words = sentence.split()
+            for i in range(0, len(words), max_tokens):
+                yield " ".join(words[i:i + max_tokens])
+            continue
+        if parts and tokens + n > max_tokens:
+            yield " ".join(parts)
+            parts, tokens = [], 0
+        parts.append(sentence)
+        tokens += n
+    if parts:
+        yield " ".join(parts)
+
+
+def _overlap_tail(text: str, overlap_tokens: int) -> str:
+    """Trailing whole sentences (or whole words) of text within overlap_tokens."""
+    if overlap_tokens <= 0:
+        return ""
+    tail: List[str] = []
+    tokens = 0
+    for sentence in reversed(_SENTENCE_RE.findall(text)):
+        sentence = sentence.strip()
+        n = count_tokens(sentence)
+        if tokens + n > overlap_tokens:
+            break
+        tail.append(sentence)
+        tokens += n
+    if tail:
+        return " ".join(reversed(tail))
+    words = text.split()
+    return " ".join(words[-overlap_tokens:]) if words else ""
+
+
+def iter_chunks(
+    source: Union[str, Iterable[str]],
+    max_tokens: int = 120,
+    overlap_tokens: int = 12,
+    title: Optional[str] = None,
+) -> Iterator[Dict[str, str]]:
+    """
+    Chunk markdown into dicts with 'text' and 'section' keys.
+
+    Chunks never span headings; within a section, list items and paragraphs
+    are packed up to max_tokens, and a new chunk repeats up to overlap_tokens
+    of whole sentences from the previous one. Works in one pass over the lines.
+
+    Args:
+        source: Markdown text or an iterable of lines (e.g. an open file)
+        max_tokens: Approximate token budget per chunk
+        overlap_tokens: Approximate overlap carried into the next chunk of the same section
+        title: Document title used when text precedes the first heading
+
+    Returns:
+        Iterator of {"text": ..., "section": "Heading > Subheading"}
+    """
+    lines = source.splitlines() if isinstance(source, str) else source
+    path: List[Tuple[int, str]] = []
+    parts: List[Tuple[str, str]] = []
+    tokens = 0
+    has_body = False  # parts holds more than a heading
+
+    def section() -> str:
+        names = [name for _, name in path]
+        if title and (not names or names[0] != title):
+            names.insert(0, title)
+        return " > ".join(names)
+
+    def emit() -> Dict[str, str]:
+        pieces: List[str] = []
+        prev_kind = None
+        for kind, text in parts:
+            if pieces:
+                pieces.append("\n" if kind == prev_kind == _LIST_ITEM else "\n\n")
+            pieces.append(text)
+            prev_kind = kind
+        return {"text": "".join(pieces), "section": section()}
+
+    for kind, text, level in _iter_blocks(lines):
+        if kind == _HEADING:
+            if has_body:
+                yield emit()
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, _HEADING_RE.match(text).group(2)))
+            parts, tokens, has_body = [(_HEADING, text)], count_tokens(text), False
+            continue
+
+        pieces = [text] if count_tokens(text) <= max_tokens else list(_split_long(text, max_tokens))
+        for piece in pieces:
+            n = count_tokens(piece)
+            if has_body and tokens + n > max_tokens:
+                yield emit()
+                last_kind, last_text = parts[-1]
+                tail = _overlap_tail(last_text, overlap_tokens)
+                tail_kind = last_kind if tail == last_text.strip() else _PARAGRAPH
+                parts = [(tail_kind, tail)] if tail else []
+                tokens = count_tokens(tail)
+            parts.append((kind, piece))
+            tokens += n
+            has_body = True
+
+    if has_body:
+        yield emit()
@@ -17,14 +17,118 @@ class Settings(BaseSettings):
     # Embeddings "jina" (default) or "openai" (if there is one or reviewers use thier own open ai keys)
     embedding_provider: str = "jina"
     openai_embedding_api_key: Optional[str] = None  # When openai: uses this or openai_api_key
+    openai_embedding_base_url: Optional[str] = None  # OpenAI-compatible embedding endpoint (e.g. a local fake)
     openai_embedding_model: str = "text-embedding-3-small"
     jina_embedding_api_key: Optional[str] = None
     jina_embedding_model: str = "jina-embeddings-v3"
+    # EMBEDDING_PROVIDER=local: ONNX model dir (model*.onnx + tokenizer.json), CPU threads (0 = all), tokens per text
+    local_embedding_model_path: str = "./models/all-MiniLM-L6-v2"
+    local_embedding_threads: int = 0
+    local_embedding_max_length: int = 256
+
+    # Shortened embedding output (Matryoshka); None = model default. Changing it forces a reindex.
+    embedding_dimensions: Optional[int] = None
+
+    # Compact KB index: quantized codes ("none", "int8", "binary") and/or a shorter
+    # search_dimensions prefix pick candidates; top k * factor are re-ranked at full size.
+    # The index then holds the only copy of the vectors (floats memory-mapped from disk); Chroma keeps
+    # documents and metadata. Changing these rebuilds the index by copying vectors, without re-embedding
+    embedding_quantization: str = "none"
+    search_dimensions: Optional[int] = None
+    quantization_rerank_factor: int = 4
+
+    # KB chunking (approximate tokens per chunk / overlap within a section)
+    chunk_max_tokens: int = 120
+    chunk_overlap_tokens: int = 12
+
+    # KB search: fetch top_k * factor chunks, keep top_k diverse ones (MMR weight on relevance,
+    # max chunks per file with 0 = no limit, term-overlap above which a chunk is a duplicate)
+    # and trim snippets to the query-relevant sentences within snippet_max_chars
+    kb_overfetch_factor: int = 3
+    kb_mmr_lambda: float = 0.7
+    kb_max_chunks_per_file: int = 2
+    kb_duplicate_threshold: float = 0.6
+    kb_snippet_max_chars: int = 320
+
+    # Agent tool loop budgets per ticket (0 = no time/token limit; the time budget also bounds each
+    # LLM call, final decision included) and the query-term overlap at which a repeated KB search
+    # is answered from the ticket's memo
+    agent_max_iterations: int = 5
+    agent_time_budget_seconds: float = 30.0
+    agent_token_budget: int = 16000
+    agent_tool_memo_threshold: float = 0.7
+
+    # Speculative KB search (latest customer message) + profile lookup during the first LLM turn;
+    # served when at least speculation_match_threshold of the model's query terms are in that message
+    speculation_enabled: bool = True
+    speculation_top_k: int = 3  # only a model search with this top_k is served
+    speculation_match_threshold: float = 0.6
+    speculation_workers: int = 8
+    speculation_wait_seconds: float = 2.0  # max wait for a running speculation before running the tool inline
+
+    # Near-duplicate tickets (MinHash/LSH over the last dedup_window_minutes) join an incident and
+    # reuse its decision (routing only) for the same plan / VIP / at-risk customers; duplicates of an
+    # in-flight ticket wait up to dedup_wait_seconds. Off by default: reused tickets get no auto-reply
+    dedup_enabled: bool = False
+    dedup_window_minutes: float = 15.0
+    dedup_similarity: float = 0.8
+    dedup_num_perm: int = 64
+    dedup_bands: int = 16
+    dedup_wait_seconds: float = 30.0
+    dedup_min_incident_size: int = 3
+
+    # Triage results log: columnar NumPy segments under results_path, flushed off the request path
+    # every results_flush_seconds / results_flush_rows; small segments merged up to results_segment_rows
+    results_enabled: bool = True
+    results_path: str = "./data/results"
+    results_flush_seconds: float = 5.0
+    results_flush_rows: int = 2000
+    results_segment_rows: int = 1_000_000
+    results_compact_segments: int = 32
+
+    # Sharded KB search: vector_shards > 1 splits each collection by file hash across that many local
+    # shard processes (under chroma_db_path/shards-<N>), queried in parallel; connections per shard.
+    # Off by default: measured so far it only speeds up reindexing and makes queries slower (see README)
+    vector_shards: int = 1
+    vector_shard_connections: int = 4
+
+    # KB ingestion: parser processes (0 = CPU count) and chunks per embedding request
+    ingest_workers: int = 0
+    embedding_batch_size: int = 32
+
+    # Record/replay LLM + embedding calls: "off", "record" or "replay" (fixtures as JSONL)
+    llm_record_mode: str = "off"
+    llm_fixtures_path: str = "./data/llm_fixtures"
+
+    # Opt-in profiling (X-Profile request header / --profile CLI flag): the slowest
+    # profile_keep_slowest requests are kept under profile_path as folded stacks + JSON.
+    # The header and GET /profiles are off unless profile_header_enabled (any client could trigger them)
+    profile_header_enabled: bool = False
+    profile_path: str = "./data/profiles"
+    profile_keep_slowest: int = 10
+    profile_sample_interval_ms: float = 5.0
 
     # Vector DB and KB paths
     chroma_db_path: str = "./chroma_db"
     kb_path: str = "./data/kb"
 
+    # Tenants: kb_path is the default tenant's KB; tenant X reads tenant_kb_root/X and gets its own
+    # collections. At most max_loaded_tenants non-default tenants stay loaded (LRU)
+    default_tenant: str = "default"
+    tenant_kb_root: str = "./data/tenants"
+    max_loaded_tenants: int = 8
+
+    # Hot reload: poll kb_path and reindex changed files in the background (API server only)
+    kb_watch_enabled: bool = False
+    kb_watch_interval_seconds: float = 2.0
+    kb_watch_debounce_seconds: float = 1.0
+
+    # gzip API responses at least this large (0 = off)
+    response_gzip_min_bytes: int = 1024
+
+    # Columnar customer store (.npy columns, built with `python -m app.customer_store`)
+    customer_store_path: str = "./data/customer_store"
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
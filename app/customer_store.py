@@ -0,0 +1,186 @@
+"""Columnar customer profile store with vectorized batch enrichment."""
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from app.agent.models import CustomerInfo
+from app.config import settings
+from app.tools.customer_profile import PLAN_MRR
+
+# Plan codes (case-insensitive); anything not listed maps to UNKNOWN_PLAN (MRR 0, VIP only by tenure)
+PLANS = ("free", "pro", "enterprise")
+UNKNOWN_PLAN = len(PLANS)
+_PLAN_CODES = {plan: code for code, plan in enumerate(PLANS)}
+_MRR_BY_CODE = np.array([PLAN_MRR[p] for p in PLANS] + [0], dtype=np.float64)
+
+_FREE, _PRO, _ENTERPRISE = (_PLAN_CODES[p] for p in PLANS)
+
+# Column files of the on-disk format (one .npy per column, loadable with mmap)
+COLUMNS = ("ids", "plan", "tenure_months", "prior_tickets", "region")
+
+
+def encode_plans(plans: Iterable[Optional[str]]) -> np.ndarray:
+    """Map plan names to int8 plan codes."""
+    return np.fromiter(
+        (_PLAN_CODES.get((p or "").lower(), UNKNOWN_PLAN) for p in plans),
+        dtype=np.int8,
+    )
+
+
+def decode_plan(code: int) -> Optional[str]:
+    """Plan name for a plan code (None for UNKNOWN_PLAN: the original name isn't stored)."""
+    return PLANS[code] if 0 <= code < UNKNOWN_PLAN else None
+
+
+def compute_profile_flags(plan_codes: np.ndarray, tenure_months: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Vectorized version of the rules in get_customer_profile.
+
+    Returns:
+        Dict with 'is_vip', 'mrr_dollars', 'at_risk' arrays aligned with the inputs
+    """
+    plan_codes = np.asarray(plan_codes)
+    tenure = np.asarray(tenure_months)
+    is_vip = (
+        (plan_codes == _ENTERPRISE)
+        | (tenure >= 12)
+        | ((plan_codes == _PRO) & (tenure >= 6))
+    )
+    at_risk = (plan_codes == _FREE) & (tenure >= 6) & (tenure <= 8)
+    return {
+        "is_vip": is_vip,
+        "mrr_dollars": _MRR_BY_CODE[plan_codes],
+        "at_risk": at_risk,
+    }
+
+
+class CustomerStore:
+    """
+    Customer records held as NumPy columns with an id -> row index.
+
+    Columns can be loaded from JSON (e.g. data/mock_customers.json) or from the
+    .npy directory format written by save(), which is memory-mapped on load.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        plan: np.ndarray,
+        tenure_months: np.ndarray,
+        prior_tickets: np.ndarray,
+        region: np.ndarray,
+    ):
+        self.ids = ids
+        self.plan = plan
+        self.tenure_months = tenure_months
+        self.prior_tickets = prior_tickets
+        self.region = region
+        self._index = {str(cid): row for row, cid in enumerate(ids.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict]) -> "CustomerStore":
+        """Build a store from dicts with id/plan/tenure_months/prior_tickets/region keys."""
+        return cls(
+            ids=np.array([str(r["id"]) for r in records], dtype=str),
+            plan=encode_plans(r.get("plan") for r in records),
+            tenure_months=np.array([r.get("tenure_months", 0) for r in records], dtype=np.int32),
+            prior_tickets=np.array([r.get("prior_tickets", 0) for r in records], dtype=np.int32),
+            region=np.array([r.get("region") or "" for r in records], dtype=str),
+        )
+
+    @classmethod
+    def from_json(cls, path: Union[str, Path]) -> "CustomerStore":
+        """Load records from a JSON list or a {"customers": [...]} document."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        records = data.get("customers", []) if isinstance(data, dict) else data
+        return cls.from_records(records)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write each column as a .npy file under path."""
+        out = Path(path)
+        out.mkdir(parents=True, exist_ok=True)
+        for name in COLUMNS:
+            np.save(out / f"{name}.npy", getattr(self, name))
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "CustomerStore":
+        """Load a store written by save(); columns are memory-mapped unless mmap=False."""
+        src = Path(path)
+        mode = "r" if mmap else None
+        return cls(**{name: np.load(src / f"{name}.npy", mmap_mode=mode) for name in COLUMNS})
+
+    def rows_for(self, customer_ids: Iterable[str]) -> np.ndarray:
+        """Row positions for the given ids (-1 for unknown ids)."""
+        get = self._index.get
+        return np.fromiter((get(str(cid), -1) for cid in customer_ids), dtype=np.int64)
+
+    def enrich(self, customer_ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """
+        Batch lookup: columns plus computed flags for every id, in one vectorized pass.
+
+        Returns:
+            Dict of arrays aligned with customer_ids; 'row' is -1 and 'found' False for unknown ids
+        """
+        rows = self.rows_for(customer_ids)
+        found = rows >= 0
+        plan = np.full(len(rows), UNKNOWN_PLAN, dtype=np.int8)
+        tenure = np.zeros(len(rows), dtype=np.int32)
+        if found.any():
+            plan[found] = self.plan[rows[found]]
+            tenure[found] = self.tenure_months[rows[found]]
+        columns = {
+            "row": rows,
+            "found": found,
+            "plan": plan,
+            "tenure_months": tenure,
+        }
+        columns.update(compute_profile_flags(plan, tenure))
+        return columns
+
+    def profiles(self, customer_ids: Sequence[str]) -> List[Optional[dict]]:
+        """Batch lookup returning get_customer_profile-shaped dicts (None for unknown ids)."""
+        cols = self.enrich(customer_ids)
+        out: List[Optional[dict]] = []
+        for i, row in enumerate(cols["row"].tolist()):
+            if row < 0:
+                out.append(None)
+                continue
+            region = str(self.region[row])
+            out.append({
+                "plan": decode_plan(int(cols["plan"][i])),
+                "tenure_months": int(cols["tenure_months"][i]),
+                "region": region or None,
+                "is_vip": bool(cols["is_vip"][i]),
+                "mrr_dollars": float(cols["mrr_dollars"][i]),
+                "at_risk": bool(cols["at_risk"][i]),
+            })
+        return out
+
+
+def enrich_customers(customers: Sequence[CustomerInfo]) -> Dict[str, np.ndarray]:
+    """Flags for a batch of tickets' CustomerInfo (no store lookup), in one vectorized pass."""
+    plan = encode_plans(c.plan for c in customers)
+    tenure = np.fromiter((c.tenure_months for c in customers), dtype=np.int32, count=len(customers))
+    return compute_profile_flags(plan, tenure)
+
+
+def load_customer_store(path: Optional[str] = None) -> CustomerStore:
+    """Open the store at path (default settings.customer_store_path), memory-mapped."""
+    return CustomerStore.load(path or settings.customer_store_path)
+
+
+if __name__ == "__main__":
+    # Convert a customers JSON file into the memory-mapped .npy format
+    # Usage: python -m app.customer_store [source.json] [out_dir]
+    import sys
+    src = sys.argv[1] if len(sys.argv) > 1 else "data/mock_customers.json"
+    dst = sys.argv[2] if len(sys.argv) > 2 else settings.customer_store_path
+    store = CustomerStore.from_json(src)
+    store.save(dst)
+    print(f"Wrote {len(store)} customers to {dst}")
@@ -0,0 +1,265 @@
+"""Near-duplicate ticket detection: MinHash/LSH over recent tickets, clustered into incidents that share decisions."""
+import hashlib
+import itertools
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.agent.models import AgentOutput, NextAction, TicketThread
+from app.config import settings
+from app.kb_metadata import PRODUCT_AREAS
+from app.tools.customer_profile import get_customer_profile
+from app.tracing import count
+
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32; (a * x + b) stays below 2**64
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+# Function words that vary between otherwise identical reports ("site is down" / "site down")
+_STOPWORDS = frozenset("a an the is are was it its i im my me we our to of in on at for and or so this that".split())
+# Words that flip a request ("delete my account" / "don't delete my account")
+_NEGATIONS = frozenset(
+    "not no never nothing none nor neither without cannot cant dont doesnt didnt isnt arent wasnt werent wont shouldnt".split()
+)
+SHINGLE_SIZE = 4
+
+
+def _normalize(text: str) -> str:
+    text = text.lower().replace("'", "").replace("\u2019", "")
+    return " ".join(w for w in _WORD_RE.findall(text) if w not in _STOPWORDS)
+
+
+# Product keywords (as normalized text, matched as word prefixes)
+_PRODUCT_RE = re.compile(
+    r"\b(?:" + "|".join(sorted({re.escape(_normalize(k)) for keys in PRODUCT_AREAS.values() for k in keys})) + ")"
+)
+
+
+def ticket_text(thread: TicketThread) -> str:
+    """Normalized text of all messages: lowercase content words (apostrophes dropped) separated by spaces."""
+    return _normalize(" ".join(msg.text for msg in thread.messages))
+
+
+def guard_tokens(text: str) -> frozenset:
+    """Negations, numbers and product keywords in normalized text; tickets in one incident agree on all of them."""
+    found = {w for w in text.split() if w in _NEGATIONS or any(c.isdigit() for c in w)}
+    found.update(_PRODUCT_RE.findall(text))
+    return frozenset(found)
+
+
+def decision_key(profile: Dict[str, Any]) -> Tuple[str, bool, bool]:
+    """The profile inputs a triage decision depends on: plan (KB results are plan filtered), VIP and at-risk."""
+    return str(profile["plan"]).lower(), bool(profile["is_vip"]), bool(profile["at_risk"])
+
+
+def reused_output(shared: AgentOutput, profile: Dict[str, Any]) -> AgentOutput:
+    """
+    A duplicate's copy of its incident's decision: classification, KB results and routing only.
+
+    The leader's auto_reply and summary were written for another customer (and may
+    quote their details), so they are dropped and an auto_respond becomes a routing.
+    """
+    action = shared.next_action
+    if action.action == "auto_respond":
+        next_action = NextAction("route_to_specialist", action.target_queue or "general_support")
+    else:
+        next_action = NextAction(action.action, action.target_queue)
+    return replace(
+        shared,
+        classification=replace(shared.classification, short_summary=""),
+        customer_profile=profile,
+        next_action=next_action,
+        iterations=0,
+        stop_reason="duplicate",
+    )
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """CRC32 hashes of the text's character size-grams (short texts are one shingle)."""
+    grams = {text[i : i + size] for i in range(max(1, len(text) - size + 1))}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """MinHash signatures from num_perm universal hash functions (a * x + b) mod p."""
+
+    def __init__(self, num_perm: int, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2**32, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, 2**32, size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        return ((self.a * hashes[None, :] + self.b) % _PRIME).min(axis=1)
+
+
+@dataclass
+class Incident:
+    """A cluster of near-identical recent tickets and the decisions made for it (one per decision_key)."""
+    id: str
+    tenant: str
+    sample: str
+    first_seen: float
+    last_seen: float
+    size: int = 0
+    decisions: Dict[Tuple[str, bool, bool], Future] = field(default_factory=dict)
+    triage_runs: int = 0
+    plans: Set[str] = field(default_factory=set)
+
+    def summary(self) -> Dict[str, Any]:
+        decided = [f.result() for f in self.decisions.values() if f.done() and not f.exception()]
+        return {
+            "id": self.id,
+            "tenant": self.tenant,
+            "size": self.size,
+            "triage_runs": self.triage_runs,
+            "reused": self.size - self.triage_runs,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "plans": sorted(self.plans),
+            "sample": self.sample[:200],
+            "urgency": decided[0].classification.urgency if decided else None,
+            "action": decided[0].next_action.action if decided else None,
+        }
+
+
+@dataclass
+class _Entry:
+    signature: np.ndarray
+    guard: frozenset
+    buckets: List[Tuple[str, int, bytes]]
+    incident: Incident
+    seen: float
+
+
+class TicketDeduplicator:
+    """
+    Clusters tickets against the last DEDUP_WINDOW_MINUTES of traffic.
+
+    Each ticket's MinHash signature is split into bands; tickets sharing a
+    band bucket (same tenant) are candidates, kept when their estimated
+    Jaccard similarity is at least DEDUP_SIMILARITY and they agree on every
+    negation, number and product keyword (guard_tokens). A ticket joining an
+    incident reuses the decision made for customers with the same plan, VIP
+    and at-risk flags (decision_key), as routing only (reused_output); the
+    first such ticket runs the agent while concurrent duplicates wait for it.
+    """
+
+    def __init__(
+        self,
+        window_minutes: Optional[float] = None,
+        similarity: Optional[float] = None,
+        num_perm: Optional[int] = None,
+        bands: Optional[int] = None,
+    ):
+        self.window_seconds = (window_minutes or settings.dedup_window_minutes) * 60
+        self.similarity = similarity or settings.dedup_similarity
+        num_perm = num_perm or settings.dedup_num_perm
+        self.bands = bands or settings.dedup_bands
+        if num_perm % self.bands:
+            raise ValueError("DEDUP_NUM_PERM must be a multiple of DEDUP_BANDS")
+        self.hasher = MinHasher(num_perm)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, bytes], Set[int]] = {}
+        self._incidents: Dict[str, Incident] = {}
+        self._ids = itertools.count(1)
+
+    def _expire(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if entry.seen >= cutoff:
+                break
+            del self._entries[entry_id]
+            for key in entry.buckets:
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(entry_id)
+                    if not bucket:
+                        del self._buckets[key]
+        for incident_id in [i for i, inc in self._incidents.items() if inc.last_seen < cutoff]:
+            del self._incidents[incident_id]
+
+    def assign(self, thread: TicketThread) -> Incident:
+        """Add the ticket to the most similar recent incident, or start a new one."""
+        text = ticket_text(thread)
+        signature = self.hasher.signature(shingles(text))
+        guard = guard_tokens(text)
+        tenant = thread.tenant or settings.default_tenant
+        rows = len(signature) // self.bands
+        buckets = [(tenant, band, signature[band * rows : (band + 1) * rows].tobytes()) for band in range(self.bands)]
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            candidates = set().union(*(self._buckets.get(key, ()) for key in buckets))
+            best, best_similarity = None, self.similarity
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if entry.guard != guard:
+                    continue
+                similarity = float(np.mean(entry.signature == signature))
+                if similarity >= best_similarity:
+                    best, best_similarity = entry.incident, similarity
+            if best is None:
+                incident_id = hashlib.sha1(f"{tenant}:{text}:{now}".encode("utf-8")).hexdigest()[:12]
+                best = Incident(id=incident_id, tenant=tenant, sample=text, first_seen=now, last_seen=now)
+                self._incidents[incident_id] = best
+            best.size += 1
+            best.last_seen = now
+            best.plans.add(thread.customer.plan)
+            entry_id = next(self._ids)
+            self._entries[entry_id] = _Entry(signature, guard, buckets, best, now)
+            for key in buckets:
+                self._buckets.setdefault(key, set()).add(entry_id)
+        return best
+
+    def triage(self, thread: TicketThread, run: Callable[[TicketThread], AgentOutput]) -> Tuple[AgentOutput, Incident]:
+        """
+        Triage a ticket, reusing its incident's decision for the same decision_key when there is one.
+
+        Args:
+            run: The full triage (e.g. triage_ticket), called when no decision can be reused
+        """
+        incident = self.assign(thread)
+        profile = get_customer_profile(thread.customer.plan, thread.customer.tenure_months, thread.customer.region)
+        key = decision_key(profile)
+        with self._lock:
+            future = incident.decisions.get(key)
+            leader = future is None
+            if leader:
+                future = incident.decisions[key] = Future()
+                incident.triage_runs += 1
+        if leader:
+            try:
+                output = run(thread)
+            except Exception as e:
+                with self._lock:
+                    incident.decisions.pop(key, None)
+                future.set_exception(e)
+                raise
+            future.set_result(output)
+            return output, incident
+        try:
+            shared = future.result(timeout=settings.dedup_wait_seconds)
+        except Exception:
+            # Leader failed or is too slow: triage this one on its own
+            with self._lock:
+                incident.triage_runs += 1
+            return run(thread), incident
+        count("dedup_reused")
+        return reused_output(shared, profile), incident
+
+    def incidents(self, min_size: int = 1) -> List[Dict[str, Any]]:
+        """Live incidents with at least min_size tickets, largest first."""
+        with self._lock:
+            self._expire(time.time())
+            live = [i for i in self._incidents.values() if i.size >= min_size]
+        return [i.summary() for i in sorted(live, key=lambda i: (-i.size, -i.last_seen))]
+
+
+ticket_deduplicator = TicketDeduplicator()
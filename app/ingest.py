@@ -0,0 +1,299 @@
+"""KB ingestion pipeline - recursive discovery, pluggable parsers, parallel chunking, batched embedding."""
+import hashlib
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.chunking import iter_chunks
+from app.kb_metadata import chunk_metadata, detect_language
+
+# A parser turns one file into documents: dicts with 'title', 'content' and 'key'
+# ('key' is unique per document and stable across runs; used for chunk ids), plus an
+# optional 'metadata' dict of explicit product_area / plans / language values
+Parser = Callable[[Path, str], Iterator[Dict[str, str]]]
+
+# (chunk ids, texts, metadatas) for one file
+FileChunks = Tuple[List[str], List[str], List[Dict[str, Any]]]
+
+# (start byte, end byte, first line number) of a run of whole lines in a JSONL file
+LineRange = Tuple[int, int, int]
+
+# JSONL files larger than this are chunked as several line ranges, in parallel
+JSONL_PART_BYTES = 4 * 1024 * 1024
+
+PARSERS: Dict[str, Parser] = {}
+
+
+def register_parser(*extensions: str):
+    """Register a parser function for one or more file extensions (e.g. ".md")."""
+    def decorator(fn: Parser) -> Parser:
+        for ext in extensions:
+            PARSERS[ext.lower()] = fn
+        return fn
+    return decorator
+
+
+def _markdown_title(content: str, fallback: str) -> str:
+    first = content.lstrip().split("\n", 1)[0]
+    return first.strip("# ").strip() if first.startswith("#") else fallback
+
+
+@register_parser(".md", ".markdown")
+def parse_markdown(path: Path, rel: str) -> Iterator[Dict[str, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    yield {"title": _markdown_title(content, path.stem), "content": content, "key": rel}
+
+
+class _HTMLToMarkdown(HTMLParser):
+    """Minimal HTML -> markdown-ish text: headings, list items and paragraphs."""
+
+    _BLOCKS = {"p", "div", "section", "article", "br", "tr", "table", "ul", "ol", "pre", "blockquote"}
+    _SKIP = {"script", "style", "head", "nav", "footer"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.title = ""
+        self._skip_depth = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        if tag in self._SKIP:
+            self._skip_depth += 1
+        elif tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self.parts.append("\n\n" + "#" * int(tag[1]) + " ")
+        elif tag == "li":
+            self.parts.append("\n- ")
+        elif tag in self._BLOCKS:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        if tag in self._SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in ("h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol"):
+            self.parts.append("\n\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self.parts.append(re.sub(r"\s+", " ", data))
+
+
+@register_parser(".html", ".htm")
+def parse_html(path: Path, rel: str) -> Iterator[Dict[str, str]]:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        html = f.read()
+    converter = _HTMLToMarkdown()
+    converter.feed(html)
+    content = "\n".join(line.strip() for line in "".join(converter.parts).splitlines()).strip()
+    title = converter.title.strip() or _markdown_title(content, path.stem)
+    yield {"title": title, "content": content, "key": rel}
+
+
+@register_parser(".jsonl")
+def parse_jsonl(path: Path, rel: str, lines: Optional[LineRange] = None) -> Iterator[Dict[str, str]]:
+    """
+    One article per line: {"title", "content"|"body"|"text", optional "id", "product_area", "plans", "language"}.
+
+    Args:
+        lines: Only parse this range of the file (see split_jsonl)
+    """
+    start, end, first_line = lines or (0, None, 1)
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = start
+        for line_no, raw in enumerate(iter(f.readline, b""), first_line):
+            if end is not None and position >= end:
+                break
+            position += len(raw)
+            line = raw.decode("utf-8").strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping invalid JSON at {rel}:{line_no}")
+                continue
+            content = record.get("content") or record.get("body") or record.get("text") or ""
+            if not content:
+                continue
+            # The line number keeps keys unique when records share an id (ranges are parsed apart)
+            key = f"{rel}#{record['id']}@{line_no}" if "id" in record else f"{rel}#{line_no}"
+            yield {
+                "title": record.get("title") or _markdown_title(content, f"{path.stem} #{line_no}"),
+                "content": content,
+                "key": key,
+                "metadata": {k: record[k] for k in ("product_area", "plans", "language") if record.get(k)},
+            }
+
+
+def split_jsonl(path: Path, part_bytes: int = JSONL_PART_BYTES) -> List[LineRange]:
+    """Whole-line ranges of about part_bytes each (one sequential read; line numbers keep chunk ids stable)."""
+    parts: List[LineRange] = []
+    start, line_no = 0, 1
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(part_bytes)
+            if not block:
+                break
+            if not block.endswith(b"\n"):
+                block += f.readline()
+            parts.append((start, start + len(block), line_no))
+            start += len(block)
+            line_no += block.count(b"\n")
+    return parts
+
+
+def discover_files(kb_path: Path) -> Dict[str, Path]:
+    """All files with a registered parser under kb_path (recursive), keyed by relative posix path."""
+    if not kb_path.exists():
+        return {}
+    return {
+        path.relative_to(kb_path).as_posix(): path
+        for path in sorted(kb_path.rglob("*"))
+        if path.suffix.lower() in PARSERS and path.is_file()
+    }
+
+
+def parse_file(path: Path, rel: str) -> Iterator[Dict[str, str]]:
+    """Documents of one file, via the parser registered for its extension."""
+    return PARSERS[path.suffix.lower()](path, rel)
+
+
+def chunk_file(
+    path: str, rel: str, max_tokens: int, overlap_tokens: int, lines: Optional[LineRange] = None
+) -> Tuple[int, FileChunks]:
+    """
+    Parse and chunk one file, or one line range of a JSONL file (runs in worker processes).
+
+    Returns:
+        (number of documents, (chunk ids, texts, metadatas))
+    """
+    ids: List[str] = []
+    texts: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    n_docs = 0
+    docs = parse_jsonl(Path(path), rel, lines) if lines else parse_file(Path(path), rel)
+    for doc in docs:
+        n_docs += 1
+        language = detect_language(doc["content"])
+        for i, chunk in enumerate(iter_chunks(doc["content"], max_tokens, overlap_tokens, title=doc["title"])):
+            ids.append(hashlib.md5(f"{doc['key']}_{i}".encode()).hexdigest())
+            texts.append(chunk["text"])
+            metadatas.append({
+                "title": doc["title"],
+                "file": rel,
+                "chunk_index": i,
+                "section": chunk["section"],
+                **chunk_metadata(doc["title"], chunk["section"], chunk["text"], language, doc.get("metadata")),
+            })
+    return n_docs, (ids, texts, metadatas)
+
+
+def _iter_chunked_files(
+    files: Dict[str, Path],
+    max_tokens: int,
+    overlap_tokens: int,
+    workers: int,
+) -> Iterator[Tuple[int, FileChunks]]:
+    """
+    Chunk files in a process pool, keeping at most 2 * workers results in flight.
+
+    Results are yielded in file order, so embedding batches are the same on
+    every run (fixture record/replay depends on it). Large JSONL files are
+    split into line ranges, so one export is chunked in parallel and never
+    held in memory whole.
+    """
+    units: List[Tuple[str, str, Optional[LineRange]]] = []
+    for rel, path in files.items():
+        if path.suffix.lower() == ".jsonl" and path.stat().st_size > JSONL_PART_BYTES:
+            units.extend((str(path), rel, lines) for lines in split_jsonl(path))
+        else:
+            units.append((str(path), rel, None))
+    if workers <= 1 or (len(units) <= workers and len(units) == len(files)):
+        for path, rel, lines in units:
+            yield chunk_file(path, rel, max_tokens, overlap_tokens, lines)
+        return
+    pending = deque()
+    items = iter(units)
+    with ProcessPoolExecutor(max_workers=min(workers, len(units))) as pool:
+        while True:
+            while len(pending) < workers * 2:
+                item = next(items, None)
+                if item is None:
+                    break
+                path, rel, lines = item
+                pending.append(pool.submit(chunk_file, path, rel, max_tokens, overlap_tokens, lines))
+            if not pending:
+                return
+            yield pending.popleft().result()
+
+
+def run_pipeline(
+    files: Dict[str, Path],
+    embed_batch: Callable[[List[str]], List[List[float]]],
+    add_batch: Callable[[List[str], List[str], List[List[float]], List[Dict[str, Any]]], None],
+    max_tokens: int,
+    overlap_tokens: int,
+    workers: Optional[int] = None,
+    batch_size: int = 32,
+) -> Dict[str, Any]:
+    """
+    Parse/chunk files in parallel and stream chunks into embedding and insertion batches.
+
+    Memory stays bounded: only the in-flight files (or JSONL line ranges) and one embedding batch are held.
+
+    Args:
+        files: {relative path: path} to ingest
+        embed_batch: Embeds a list of texts (one call per batch)
+        add_batch: Inserts (ids, texts, embeddings, metadatas) into the index
+        workers: Parser processes (default: CPU count)
+        batch_size: Chunks per embedding/insert batch
+
+    Returns:
+        Stats dict: files, documents, chunks, seconds, docs_per_second
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    ids: List[str] = []
+    texts: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    n_docs = n_chunks = 0
+
+    def flush():
+        nonlocal ids, texts, metadatas, n_chunks
+        if ids:
+            add_batch(ids, texts, embed_batch(texts), metadatas)
+            n_chunks += len(ids)
+            ids, texts, metadatas = [], [], []
+
+    for docs_in_file, (file_ids, file_texts, file_metas) in _iter_chunked_files(files, max_tokens, overlap_tokens, workers):
+        n_docs += docs_in_file
+        for chunk_id, text, metadata in zip(file_ids, file_texts, file_metas):
+            ids.append(chunk_id)
+            texts.append(text)
+            metadatas.append(metadata)
+            if len(ids) >= batch_size:
+                flush()
+    flush()
+
+    seconds = time.perf_counter() - started
+    return {
+        "files": len(files),
+        "documents": n_docs,
+        "chunks": n_chunks,
+        "seconds": round(seconds, 3),
+        "docs_per_second": round(n_docs / seconds, 1) if seconds > 0 else None,
+    }
@@ -1,102 +1,60 @@
 """Knowledge base loader - loads and indexes KB documents into Chroma."""
 import json
 import os
+import threading
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-import hashlib
+from typing import List, Dict, Any, Optional, Set
+import time
+from datetime import datetime, timezone
 
 from app.config import settings
-from app.vector_store import vector_store
+from app.ingest import discover_files, run_pipeline
+from app.kb_metadata import METADATA_VERSION
+from app.vector_store import IndexVersion, vector_layout
 from app.llm_client import llm_client
+from app.tenants import Tenant, tenant_registry
 
-MANIFEST_FILENAME = "kb_manifest.json"
 
-
-def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-    """
-    Simple text chunking by paragraphs and sentences.
-    
-    Args:
-        text: Text to chunk
-        chunk_size: Target chunk size in characters
-        overlap: Overlap between chunks
-    
-    Returns:
-        List of text chunks
-    """
-    # Split by double newlines (paragraphs)
-    paragraphs = text.split("\n\n")
-    chunks = []
-    current_chunk = ""
-    
-    for para in paragraphs:
-        para = para.strip()
-        if not para:
-            continue
-        
-        # If adding this paragraph would exceed chunk size, save current chunk
-        if current_chunk and len(current_chunk) + len(para) > chunk_size:
-            chunks.append(current_chunk.strip())
-            # Start new chunk with overlap
-            overlap_text = current_chunk[-overlap:] if len(current_chunk) > overlap else current_chunk
-            current_chunk = overlap_text + "\n\n" + para
-        else:
-            if current_chunk:
-                current_chunk += "\n\n" + para
-            else:
-                current_chunk = para
-    
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    
-    return chunks
+def _current_kb_files(tenant: Tenant) -> Dict[str, float]:
+    """Return {relative path: mtime} for each supported file under the tenant's kb_path."""
+    return {
+        rel: path.stat().st_mtime
+        for rel, path in discover_files(Path(tenant.kb_path)).items()
+    }
 
 
-def load_kb_documents() -> List[Dict[str, Any]]:
-    """
-    Load all KB documents from the KB directory.
-    
-    Returns:
-        List of dicts with 'title', 'content', 'file' keys
-    """
-    kb_path = Path(settings.kb_path)
-    if not kb_path.exists():
-        return []
-    
-    documents = []
-    
-    # Load markdown files
-    for md_file in kb_path.glob("*.md"):
-        with open(md_file, "r", encoding="utf-8") as f:
-            content = f.read()
-        
-        # Extract title from first line or filename
-        lines = content.split("\n")
-        title = lines[0].strip("# ").strip() if lines and lines[0].startswith("#") else md_file.stem
-        
-        documents.append({
-            "title": title,
-            "content": content,
-            "file": md_file.name,
-        })
-    
-    return documents
+def _embedding_signature() -> Dict[str, Any]:
+    """Embedding settings the stored vectors depend on; a change forces a reindex."""
+    local = llm_client.local_embedder
+    return {
+        "provider": llm_client.embedding_provider,
+        "model": local.model_name if local else llm_client.default_embedding_model,
+        "dimensions": settings.embedding_dimensions,
+    }
 
 
-def _current_kb_manifest() -> Dict[str, float]:
-    """Return a manifest of KB files: {filename: mtime} for each .md in kb_path."""
-    kb_path = Path(settings.kb_path)
-    if not kb_path.exists():
-        return {}
-    return {
-        f.name: f.stat().st_mtime
-        for f in kb_path.glob("*.md")
+def _current_kb_manifest(tenant: Tenant) -> Dict[str, Any]:
+    """Return a manifest of KB files plus the embedding/chunking settings used to index them."""
+    manifest = {
+        "files": _current_kb_files(tenant),
+        "embedding": _embedding_signature(),
+        "chunking": {
+            "max_tokens": settings.chunk_max_tokens,
+            "overlap_tokens": settings.chunk_overlap_tokens,
+            "metadata_version": METADATA_VERSION,
+        },
     }
+    if settings.vector_shards > 1:
+        # Chunks live in the shard their file hashes to; a new shard count starts from scratch
+        manifest["index"] = {"shards": settings.vector_shards}
+    # Chroma or the compact index; a change rebuilds the index, copying vectors across instead of re-embedding
+    manifest["vectors"] = vector_layout()
+    return manifest
 
 
-def _load_manifest() -> Optional[Dict[str, float]]:
-    """Load saved manifest from chroma_db dir, or None if missing/invalid."""
-    manifest_path = Path(settings.chroma_db_path) / MANIFEST_FILENAME
+def _load_manifest(tenant: Tenant) -> Optional[Dict[str, Any]]:
+    """Load the tenant's saved manifest from chroma_db dir, or None if missing/invalid."""
+    manifest_path = tenant.manifest_path
     if not manifest_path.exists():
         return None
     try:
@@ -106,95 +64,201 @@ def _load_manifest() -> Optional[Dict[str, float]]:
         return None
 
 
-def _save_manifest(manifest: Dict[str, float]) -> None:
+def _save_manifest(manifest: Dict[str, Any], tenant: Tenant) -> None:
     """Save manifest next to Chroma DB so we know when KB has changed."""
-    Path(settings.chroma_db_path).mkdir(parents=True, exist_ok=True)
-    manifest_path = Path(settings.chroma_db_path) / MANIFEST_FILENAME
-    with open(manifest_path, "w", encoding="utf-8") as f:
+    tenant.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(tenant.manifest_path, "w", encoding="utf-8") as f:
         json.dump(manifest, f, sort_keys=True)
 
 
-def _kb_changed() -> bool:
-    """True if KB files were added, removed, or modified since last index."""
-    current = _current_kb_manifest()
-    saved = _load_manifest()
+def _kb_changed(tenant: Optional[Tenant] = None) -> bool:
+    """True if KB files were added, removed, or modified (or embedding/chunking settings changed) since last index."""
+    tenant = tenant or tenant_registry.default
+    current = _current_kb_manifest(tenant)
+    saved = _load_manifest(tenant)
     if saved is None:
         return True
     return current != saved
 
 
-def index_knowledge_base(force_reindex: bool = False):
+def _reusable_files(saved: Optional[Dict[str, Any]], current: Dict[str, Any]) -> List[str]:
+    """Files unchanged since the saved manifest, whose chunks/embeddings can be copied over."""
+    if not saved or any(saved.get(key) != current.get(key) for key in ("embedding", "chunking", "index")):
+        return []
+    old_files = saved.get("files", {})
+    return [name for name, mtime in current["files"].items() if old_files.get(name) == mtime]
+
+
+def _copy_file_chunks(files: List[str], staged: IndexVersion, tenant: Tenant) -> int:
+    """Copy stored chunks of unchanged files from the active collection into the staged one."""
+    return tenant.store.copy_files(files, staged)
+
+
+def index_knowledge_base(force_reindex: bool = False, tenant: Optional[Tenant] = None) -> bool:
     """
     Load KB documents, chunk them, embed, and index into Chroma.
-    Reindex automatically when KB files are added, removed, or modified.
+    Reindex automatically when KB files are added, removed, or modified,
+    or when the embedding provider/model/dimensions, chunk sizes or metadata rules change.
     
-    Args:
-        force_reindex: If True, clear existing index and reindex
-    """
-    # Reindex if KB files changed (new, removed, or edited) or if user asked for --force
-    if not force_reindex and vector_store.collection.count() > 0 and not _kb_changed():
-        print(f"Knowledge base already indexed ({vector_store.collection.count()} documents). Skipping.")
-        return
-    
-    if not force_reindex and vector_store.collection.count() > 0 and _kb_changed():
-        print("Knowledge base files changed. Reindexing...")
-        force_reindex = True
-    
-    print("Loading knowledge base documents...")
-    documents = load_kb_documents()
+    Only changed files are re-embedded; chunks of unchanged files are copied
+    from the current index. The new index is built as a separate version and
+    swapped in once complete, so concurrent searches never see a partial index.
+    Copying re-inserts every unchanged chunk, so even a one-file reload costs
+    time proportional to the whole KB (with VECTOR_SHARDS, to one shard's share).
     
-    if not documents:
-        print(f"No KB documents found in {settings.kb_path}")
-        return
+    Each tenant has its own lock, so one tenant's reindex never blocks
+    another tenant's indexing or queries.
     
-    print(f"Found {len(documents)} KB documents. Chunking and indexing...")
+    Args:
+        force_reindex: If True, re-embed every document
+        tenant: Tenant to index (default tenant when None)
     
-    all_chunks = []
-    all_metadatas = []
-    all_ids = []
+    Returns:
+        True if a new index version was activated
+    """
+    tenant = tenant or tenant_registry.default
+    with tenant.lock:
+        activated = _index_knowledge_base(force_reindex, tenant)
+        tenant.ready = True
+        return activated
+
+
+class TenantIndexing(Exception):
+    """The tenant has no index yet; one is being built in the background."""
+
+
+_background_lock = threading.Lock()
+_background: Set[str] = set()
+
+
+def index_in_background(tenant: Tenant) -> bool:
+    """Index tenant on a daemon thread unless that is already happening; True if started."""
+    with _background_lock:
+        if tenant.name in _background:
+            return False
+        _background.add(tenant.name)
     
-    for doc in documents:
-        chunks = chunk_text(doc["content"])
-        
-        for i, chunk in enumerate(chunks):
-            chunk_id = hashlib.md5(f"{doc['file']}_{i}".encode()).hexdigest()
-            all_chunks.append(chunk)
-            all_metadatas.append({
-                "title": doc["title"],
-                "file": doc["file"],
-                "chunk_index": i,
-            })
-            all_ids.append(chunk_id)
+    def run():
+        try:
+            index_knowledge_base(tenant=tenant)
+        except Exception as e:
+            print(f"Indexing tenant {tenant.name} failed: {e}")
+        finally:
+            with _background_lock:
+                _background.discard(tenant.name)
     
-    print(f"Generated {len(all_chunks)} chunks. Generating embeddings...")
+    threading.Thread(target=run, name=f"index-{tenant.name}", daemon=True).start()
+    return True
+
+
+def get_ready_tenant(name: Optional[str] = None) -> Tenant:
+    """
+    The tenant called name, checked against its manifest (and reindexed if needed) in the
+    background on first use after loading. Its existing index, a complete version, serves
+    queries meanwhile.
     
-    # Generate embeddings in batches
-    batch_size = 10
-    embeddings = []
-    for i in range(0, len(all_chunks), batch_size):
-        batch = all_chunks[i:i + batch_size]
-        batch_embeddings = [llm_client.embed_text(chunk) for chunk in batch]
-        embeddings.extend(batch_embeddings)
-        print(f"Embedded {min(i + batch_size, len(all_chunks))}/{len(all_chunks)} chunks...")
+    Raises:
+        ValueError: Invalid tenant name
+        LookupError: Unknown tenant
+        TenantIndexing: The tenant has no index yet (its first build is running)
+    """
+    tenant = tenant_registry.get(name)
+    if not tenant.ready:
+        index_in_background(tenant)
+        if tenant.store.count() == 0:
+            raise TenantIndexing(f"Tenant {tenant.name!r} is being indexed; retry shortly")
+    return tenant
+
+
+def _index_knowledge_base(force_reindex: bool, tenant: Tenant) -> bool:
+    store = tenant.store
+    status = tenant.status
+    current = _current_kb_manifest(tenant)
+    saved = _load_manifest(tenant)
     
-    # Clear if force reindex
-    if force_reindex:
-        vector_store.clear()
+    # Reindex if KB files changed (new, removed, or edited) or if user asked for --force
+    if not force_reindex and store.count() > 0 and saved == current:
+        print(f"Knowledge base already indexed ({store.count()} documents). Skipping.")
+        if store.compact_enabled and store.compact_index is None:
+            store.build_compact_index()
+            print("Built compact search index.")
+        return False
     
-    # Add to vector store
-    vector_store.add_documents(
-        ids=all_ids,
-        texts=all_chunks,
-        embeddings=embeddings,
-        metadatas=all_metadatas,
-    )
+    if not force_reindex and store.count() > 0:
+        print("Knowledge base files or index settings changed. Reindexing...")
     
-    _save_manifest(_current_kb_manifest())
-    print(f"Indexed {len(all_chunks)} chunks into vector store.")
+    started = time.perf_counter()
+    status["reindexing"] = True
+    try:
+        files = discover_files(Path(tenant.kb_path))
+        
+        if not files:
+            print(f"No KB documents found in {tenant.kb_path}")
+            return False
+        
+        reused = [] if force_reindex or store.count() == 0 else _reusable_files(saved, current)
+        reused_set = set(reused)
+        changed = {rel: path for rel, path in files.items() if rel not in reused_set}
+        print(f"Found {len(files)} KB files ({len(reused)} unchanged). Chunking and indexing...")
+        
+        staged = store.new_version()
+        _copy_file_chunks(reused, staged, tenant)
+        
+        embedded = [0]
+        
+        def add_batch(ids, texts, embeddings, metadatas):
+            store.add_documents(ids=ids, texts=texts, embeddings=embeddings, metadatas=metadatas, target=staged)
+            embedded[0] += len(ids)
+            print(f"Embedded {embedded[0]} chunks...")
+        
+        stats = run_pipeline(
+            changed,
+            embed_batch=llm_client.embed_texts,
+            add_batch=add_batch,
+            max_tokens=settings.chunk_max_tokens,
+            overlap_tokens=settings.chunk_overlap_tokens,
+            workers=settings.ingest_workers or None,
+            batch_size=settings.embedding_batch_size,
+        )
+        if changed:
+            print(
+                f"Ingested {stats['documents']} documents / {stats['chunks']} chunks from {stats['files']} files "
+                f"in {stats['seconds']:.1f}s ({stats['docs_per_second']} docs/sec)."
+            )
+        
+        store.build_compact_index(staged)
+        store.activate(staged)
+        _save_manifest(current, tenant)
+        # Sharded stores only rebuild some shards, so count rather than add up copied + new
+        chunks = store.count()
+        
+        elapsed = time.perf_counter() - started
+        status.update({
+            "version": staged.version,
+            "chunks": chunks,
+            "last_reload_at": datetime.now(timezone.utc).isoformat(),
+            "last_reload_seconds": round(elapsed, 3),
+            "embedded_files": len(changed),
+            "reused_files": len(reused),
+            "docs_per_second": stats["docs_per_second"],
+        })
+        print(f"Indexed {chunks} chunks into vector store (version {staged.version}, {elapsed:.1f}s).")
+        return True
+    finally:
+        status["reindexing"] = False
 
 
 if __name__ == "__main__":
-    # Force reindex (use after adding or editing KB docs in data/kb/)
+    # Force reindex (use after adding or editing KB docs in data/kb/); --tenant NAME or --all-tenants
     import sys
     force = "--force" in sys.argv or "-f" in sys.argv
-    index_knowledge_base(force_reindex=force)
+    if "--all-tenants" in sys.argv:
+        names = tenant_registry.names()
+    elif "--tenant" in sys.argv:
+        names = [sys.argv[sys.argv.index("--tenant") + 1]]
+    else:
+        names = [None]
+    for name in names:
+        if name:
+            print(f"Tenant {name}:")
+        index_knowledge_base(force_reindex=force, tenant=tenant_registry.get(name))
@@ -0,0 +1,130 @@
+"""Structured KB chunk metadata (product area, plan applicability, language) and ticket language detection."""
+import re
+from typing import Any, Dict, List, Optional
+
+from app.customer_store import PLANS
+
+# Bump when derivation rules change; stored in the KB manifest so old indexes are rebuilt
+METADATA_VERSION = 1
+
+PRODUCT_AREAS: Dict[str, tuple] = {
+    "billing": ("billing", "payment", "charge", "invoice", "refund", "card", "subscription"),
+    "account": ("account", "plan", "upgrade", "downgrade", "tenure", "profile"),
+    "login": ("login", "log in", "sign in", "password", "sso", "authentication"),
+    "export": ("export", "pdf", "high-res", "download"),
+    "ui": ("dark mode", "theme", "appearance", "interface"),
+    "performance": ("slow", "performance", "loading", "latency", "timeout"),
+    "status": ("status page", "outage", "incident", "maintenance", "degraded"),
+}
+DEFAULT_PRODUCT_AREA = "general"
+
+# Metadata fields search filters on (kept as in-memory columns by the compact index)
+FILTER_FIELDS = ("file", "product_area", "language") + tuple(f"plan_{plan}" for plan in PLANS)
+
+# Small stopword lists; enough to tell support text apart, not a general-purpose detector
+_STOPWORDS: Dict[str, frozenset] = {
+    "en": frozenset("the and is are to of my i you it not can this that with for have was".split()),
+    "es": frozenset("el la los las es y de que no mi con para por una un pero está".split()),
+    "fr": frozenset("le la les est et de que je ne pas mon avec pour une un mais dans".split()),
+    "de": frozenset("der die das ist und nicht ich mein mit für ein eine aber zu auf".split()),
+    "pt": frozenset("o a os as é e de que não meu com para uma um mas está".split()),
+    "it": frozenset("il la gli le è e di che non mio con per una un ma sono".split()),
+    "nl": frozenset("de het een is en niet ik mijn met voor maar op van dat".split()),
+}
+
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+_PLAN_RE = {
+    "free": re.compile(r"\bfree\s+(?:plan|tier|users?|accounts?)\b", re.I),
+    "pro": re.compile(r"\bpro\b", re.I),
+    "enterprise": re.compile(r"\benterprise\b", re.I),
+}
+_PAID_ONLY_RE = re.compile(r"\b(?:pro|enterprise)\b[^.\n]{0,40}\bonly\b", re.I)
+# "(Pro / Enterprise)", "Pro Features", "Enterprise only" in a heading mark a restricted section;
+# a plain "Pro Plan" heading describes the plan and stays visible to everyone
+_RESTRICTED_HEADING_RE = re.compile(
+    r"\([^)]*\b(?:pro|enterprise)\b[^)]*\)|\b(?:pro|enterprise)\s+(?:features?|only)\b", re.I
+)
+
+
+def detect_language(text: str, min_hits: int = 2) -> Optional[str]:
+    """
+    Guess the language of text from stopword hits.
+
+    Returns:
+        ISO 639-1 code, or None when there is too little signal
+    """
+    counts = {lang: 0 for lang in _STOPWORDS}
+    for word in _WORD_RE.findall(text.lower()):
+        for lang, words in _STOPWORDS.items():
+            if word in words:
+                counts[lang] += 1
+    best = max(counts, key=counts.get)
+    return best if counts[best] >= min_hits else None
+
+
+def product_area(title: str, section: str, text: str) -> str:
+    """Best-matching PRODUCT_AREAS key; heading matches outweigh body text."""
+    title, section, text = title.lower(), section.lower(), text.lower()
+    scores = {
+        area: sum(3 * title.count(k) + 2 * section.count(k) + text.count(k) for k in keywords)
+        for area, keywords in PRODUCT_AREAS.items()
+    }
+    best = max(scores, key=scores.get)
+    return best if scores[best] else DEFAULT_PRODUCT_AREA
+
+
+def _named_plans(text: str) -> set:
+    return {plan for plan, pattern in _PLAN_RE.items() if pattern.search(text)}
+
+
+def applicable_plans(section: str, text: str) -> List[str]:
+    """
+    Plans a chunk applies to.
+
+    A chunk is restricted to paid plans when its heading path marks it
+    ("How to Export (Pro / Enterprise)", "Pro Features") or its text says
+    "... only", unless it also talks about the free plan (e.g. "Free plan does
+    not include export"), which is exactly what a free customer needs to read.
+    Enterprise includes Pro.
+    """
+    named = _named_plans(section) | _named_plans(text)
+    restricted = bool(_RESTRICTED_HEADING_RE.search(section) or _PAID_ONLY_RE.search(text))
+    if not restricted or "free" in named:
+        return list(PLANS)
+    if "pro" in named:
+        named.add("enterprise")
+    return [plan for plan in PLANS if plan in named]
+
+
+def chunk_metadata(
+    title: str,
+    section: str,
+    text: str,
+    language: Optional[str] = None,
+    overrides: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Filterable metadata for one chunk: product_area, plan_<plan> flags and language.
+
+    Chroma metadata values must be scalars, so plan applicability is stored as
+    one boolean per plan (filter with {"plan_pro": True}).
+
+    Args:
+        language: Language of the whole document (more reliable than per chunk)
+        overrides: Explicit "product_area", "plans" (list) and/or "language" from the source
+    """
+    overrides = overrides or {}
+    plans = overrides.get("plans") or applicable_plans(section, text)
+    metadata: Dict[str, Any] = {
+        "product_area": overrides.get("product_area") or product_area(title, section, text),
+        "language": overrides.get("language") or language or detect_language(text) or "en",
+    }
+    for plan in PLANS:
+        metadata[f"plan_{plan}"] = plan in plans
+    return metadata
+
+
+def plan_filter(plan: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Chroma where clause for chunks applicable to plan (None for unknown plans)."""
+    plan = (plan or "").lower()
+    return {f"plan_{plan}": True} if plan in PLANS else None
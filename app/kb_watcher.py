@@ -0,0 +1,70 @@
+"""Background KB watcher - reindexes a tenant when files under its KB directory change."""
+import threading
+from typing import Dict, Optional
+
+from app.config import settings
+from app.kb_loader import _current_kb_files, _kb_changed, index_knowledge_base
+from app.tenants import Tenant, tenant_registry
+
+
+class KBWatcher:
+    """
+    Polls the KB directory of each loaded tenant for added, removed or modified
+    files and reindexes that tenant off the request path.
+
+    Polling (mtime snapshots) keeps this dependency-free and works on bind
+    mounts where inotify events are not delivered. A change is only acted on
+    once the snapshot has been stable for debounce_seconds, so a bulk copy
+    triggers one reindex instead of many.
+    """
+
+    def __init__(self, interval_seconds: Optional[float] = None, debounce_seconds: Optional[float] = None):
+        self.interval_seconds = interval_seconds or settings.kb_watch_interval_seconds
+        self.debounce_seconds = debounce_seconds if debounce_seconds is not None else settings.kb_watch_debounce_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval_seconds + 1)
+
+    def _wait_until_stable(self, tenant: Tenant, snapshot: Dict[str, float]) -> Dict[str, float]:
+        """Return the file snapshot once it stops changing for debounce_seconds."""
+        while not self._stop.wait(self.debounce_seconds):
+            latest = _current_kb_files(tenant)
+            if latest == snapshot:
+                break
+            snapshot = latest
+        return snapshot
+
+    def _run(self):
+        # Last snapshot per tenant; a tenant loaded later starts from its first poll
+        last = {tenant.name: _current_kb_files(tenant) for tenant in tenant_registry.loaded()}
+        while not self._stop.wait(self.interval_seconds):
+            for tenant in tenant_registry.loaded():
+                if self._stop.is_set():
+                    break
+                try:
+                    current = _current_kb_files(tenant)
+                    if current == last.setdefault(tenant.name, current):
+                        continue
+                    last[tenant.name] = self._wait_until_stable(tenant, current)
+                    if self._stop.is_set():
+                        break
+                    if _kb_changed(tenant):
+                        print(f"KB change detected for tenant {tenant.name}. Reindexing in background...")
+                        index_knowledge_base(tenant=tenant)
+                except Exception as e:
+                    # Keep serving the current index; retry on the next change
+                    print(f"KB reindex failed for tenant {tenant.name}: {e}")
+
+
+kb_watcher = KBWatcher()
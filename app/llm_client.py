@@ -1,19 +1,32 @@
-"""LLM: Groq or OpenAI (OpenAI-compatible). Embeddings: Jina or OpenAI."""
+"""LLM: Groq or OpenAI (OpenAI-compatible). Embeddings: Jina, OpenAI or a local ONNX model."""
 from typing import List, Dict, Optional, Any
-from openai import OpenAI
+from openai import APITimeoutError, OpenAI
 
 from app.config import settings
+from app.llm_recorder import LLMRecorder
+from app.local_embeddings import LocalEmbedder
+from app.tracing import count, stage
 
 
 class LLMClient:
     """
     Chat: Groq (GROQ_API_KEY) or OpenAI (OPENAI_API_KEY for reviewers).
-    Embeddings: Jina (default) or OpenAI (reviewers use their key).
+    Embeddings: Jina (default), OpenAI (reviewers use their key) or local (ONNX model on CPU).
+    LLM_RECORD_MODE=record|replay saves/serves calls as fixtures (see app.llm_recorder);
+    in replay mode no provider client is created and API keys may be dummies.
     """
 
     def __init__(self):
-        # Groq if GROQ_API_KEY set
-        if settings.groq_api_key:
+        self.recorder = LLMRecorder((settings.llm_record_mode or "off").lower(), settings.llm_fixtures_path)
+        replay = self.recorder.mode == "replay"
+        self.client = None
+        self.embedding_client = None
+        self.local_embedder = None
+
+        # Replay needs no provider client; otherwise Groq if GROQ_API_KEY set
+        if replay:
+            self.default_model = settings.groq_model if settings.groq_api_key else settings.openai_model
+        elif settings.groq_api_key:
             self.client = OpenAI(
                 api_key=settings.groq_api_key,
                 base_url=settings.groq_base_url,
@@ -30,9 +43,23 @@ class LLMClient:
 
         # embedding choosing 
         self.embedding_provider = (settings.embedding_provider or "jina").lower()
-        if self.embedding_provider not in ("jina", "openai"):
-            raise ValueError("EMBEDDING_PROVIDER must be 'jina' or 'openai'")
-        if self.embedding_provider == "jina":
+        if self.embedding_provider not in ("jina", "openai", "local"):
+            raise ValueError("EMBEDDING_PROVIDER must be 'jina', 'openai' or 'local'")
+        if self.embedding_provider == "local":
+            # Model name in fixtures / the KB manifest is the configured path, so replay needs no model files
+            self.default_embedding_model = f"local:{settings.local_embedding_model_path}"
+            if not replay:
+                self.local_embedder = LocalEmbedder(
+                    settings.local_embedding_model_path,
+                    threads=settings.local_embedding_threads,
+                    max_length=settings.local_embedding_max_length,
+                    batch_size=settings.embedding_batch_size,
+                )
+        elif replay:
+            self.default_embedding_model = (
+                settings.jina_embedding_model if self.embedding_provider == "jina" else settings.openai_embedding_model
+            )
+        elif self.embedding_provider == "jina":
             if not settings.jina_embedding_api_key:
                 raise ValueError("JINA_EMBEDDING_API_KEY is required when EMBEDDING_PROVIDER=jina")
             self.embedding_client = OpenAI(
@@ -42,7 +69,8 @@ class LLMClient:
             self.default_embedding_model = settings.jina_embedding_model
         else:
             self.embedding_client = OpenAI(
-                api_key=settings.openai_embedding_api_key or settings.openai_api_key
+                api_key=settings.openai_embedding_api_key or settings.openai_api_key,
+                base_url=settings.openai_embedding_base_url or None,
             )
             self.default_embedding_model = settings.openai_embedding_model
 
@@ -54,7 +82,17 @@ class LLMClient:
         tool_choice: Optional[str] = None,
         response_format: Optional[Dict[str, str]] = None,
         temperature: float = 0.7,
+        timeout: Optional[float] = None,
     ) -> Dict[str, Any]:
+        """
+        One chat completion (recorded/replayed per LLM_RECORD_MODE).
+
+        Args:
+            timeout: Seconds for the whole call, with no retries (None = client default)
+
+        Raises:
+            TimeoutError: The call took longer than timeout
+        """
         kwargs = {
             "model": model or self.default_model,
             "messages": messages,
@@ -66,10 +104,29 @@ class LLMClient:
         if response_format:
             kwargs["response_format"] = response_format
 
-        response = self.client.chat.completions.create(**kwargs)
+        with stage("llm"):
+            result = self.recorder.call("chat", kwargs, lambda: self._create_chat_completion(kwargs, timeout))
+        count("llm_calls")
+        usage = result.get("usage") or {}
+        count("prompt_tokens", usage.get("prompt_tokens", 0))
+        count("completion_tokens", usage.get("completion_tokens", 0))
+        return result
+
+    def _create_chat_completion(self, kwargs: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        # A retry would restart the clock, so a bounded call gets none
+        client = self.client if timeout is None else self.client.with_options(timeout=timeout, max_retries=0)
+        try:
+            response = client.chat.completions.create(**kwargs)
+        except APITimeoutError as e:
+            raise TimeoutError(f"LLM call timed out (timeout={timeout})") from e
         message = response.choices[0].message
 
-        result = {"content": message.content, "tool_calls": None}
+        result = {"content": message.content, "tool_calls": None, "usage": None}
+        if response.usage:
+            result["usage"] = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+            }
         if message.tool_calls:
             result["tool_calls"] = [
                 {
@@ -85,12 +142,42 @@ class LLMClient:
         return result
 
     def embed_text(self, text: str, model: Optional[str] = None) -> List[float]:
-        """Embeddings: Jina or OpenAI (OpenAI client for both)."""
-        response = self.embedding_client.embeddings.create(
-            model=model or self.default_embedding_model,
-            input=text,
-        )
-        return response.data[0].embedding
+        """Embeddings: Jina or OpenAI (OpenAI client for both), or the local model."""
+        kwargs = {
+            "model": model or self.default_embedding_model,
+            "input": text,
+        }
+        if settings.embedding_dimensions:
+            kwargs["dimensions"] = settings.embedding_dimensions
+        if self.embedding_provider == "local":
+            with stage("embed"):
+                return self.recorder.call(
+                    "embedding", kwargs, lambda: self.local_embedder.embed([text], settings.embedding_dimensions)[0]
+                )
+        with stage("embed"):
+            return self.recorder.call(
+                "embedding", kwargs, lambda: self.embedding_client.embeddings.create(**kwargs).data[0].embedding
+            )
+
+    def embed_texts(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """Embed a batch of texts in one request; results keep the input order."""
+        if not texts:
+            return []
+        kwargs = {
+            "model": model or self.default_embedding_model,
+            "input": texts,
+        }
+        if settings.embedding_dimensions:
+            kwargs["dimensions"] = settings.embedding_dimensions
+
+        def send() -> List[List[float]]:
+            if self.embedding_provider == "local":
+                return self.local_embedder.embed(texts, settings.embedding_dimensions)
+            response = self.embedding_client.embeddings.create(**kwargs)
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+        with stage("embed"):
+            return self.recorder.call("embedding", kwargs, send)
 
 
 llm_client = LLMClient()
@@ -0,0 +1,76 @@
+"""Record/replay of LLM and embedding calls as JSONL fixtures (offline regression runs)."""
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from app.tracing import count
+
+RECORD_MODES = ("off", "record", "replay")
+
+
+def request_key(kind: str, request: Dict[str, Any]) -> str:
+    """Stable hash of a request (kind + canonical JSON of its arguments)."""
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{kind}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+class LLMRecorder:
+    """
+    Wraps provider calls: "record" saves request/response pairs, "replay" serves them.
+
+    Fixtures are appended to <path>/<kind>.jsonl (one JSON object per line with
+    key, request, response and the recorded latency), so runs can be diffed
+    and checked into a test-data repo.
+    """
+
+    def __init__(self, mode: str, path: str):
+        if mode not in RECORD_MODES:
+            raise ValueError(f"LLM_RECORD_MODE must be one of {', '.join(RECORD_MODES)}")
+        self.mode = mode
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._fixtures: Dict[str, Dict[str, Any]] = {}
+        if mode != "off" and self.path.exists():
+            for fixture_file in self.path.glob("*.jsonl"):
+                with open(fixture_file, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._fixtures[entry["key"]] = entry
+
+    def call(self, kind: str, request: Dict[str, Any], send: Callable[[], Any]) -> Any:
+        """
+        Return the response for request, from fixtures (replay) or by calling send().
+
+        Raises:
+            LookupError: In replay mode when no fixture matches the request
+        """
+        if self.mode == "off":
+            return send()
+        key = request_key(kind, request)
+        if self.mode == "replay":
+            entry = self._fixtures.get(key)
+            if entry is None:
+                raise LookupError(f"No recorded {kind} response for request {key[:12]} in {self.path}")
+            # Lets offline runs report the provider latency seen when recording
+            count(f"{kind}_recorded_ms", entry.get("elapsed_ms", 0))
+            return entry["response"]
+        started = time.perf_counter()
+        response = send()
+        entry = {
+            "key": key,
+            "kind": kind,
+            "request": request,
+            "response": response,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        with self._lock:
+            if key not in self._fixtures:
+                self._fixtures[key] = entry
+                self.path.mkdir(parents=True, exist_ok=True)
+                with open(self.path / f"{kind}.jsonl", "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return response
@@ -0,0 +1,123 @@
+"""Local CPU sentence embeddings: an ONNX model run with ONNX Runtime (EMBEDDING_PROVIDER=local)."""
+import hashlib
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+# Looked up in order inside the model directory (Hugging Face / Optimum export layouts)
+MODEL_FILES = (
+    "model_quantized.onnx",
+    "model.onnx",
+    "onnx/model_quantized.onnx",
+    "onnx/model.onnx",
+)
+TOKENIZER_FILE = "tokenizer.json"
+
+
+def _fingerprint(*files: Path) -> str:
+    """Short content hash of the model files, so swapping them changes the model name."""
+    digest = hashlib.sha256()
+    for file in files:
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+class LocalEmbedder:
+    """
+    Sentence-embedding model loaded once per process and run on CPU.
+
+    Expects a directory holding an ONNX export of a BERT-style encoder
+    (e.g. all-MiniLM-L6-v2; the quantized file is preferred when present) and
+    its tokenizer.json. Token embeddings are mean-pooled over the attention
+    mask and L2-normalized. Batches are sorted by length before padding, so a
+    mix of short and long chunks doesn't pad everything to the longest one.
+    """
+
+    def __init__(self, model_path: str, threads: int = 0, max_length: int = 256, batch_size: int = 32):
+        """
+        Args:
+            model_path: Model directory, or a .onnx file next to tokenizer.json
+            threads: ONNX Runtime intra-op threads (0 = all CPUs)
+            max_length: Tokens kept per text
+            batch_size: Texts per inference call
+
+        Raises:
+            ValueError: onnxruntime / tokenizers not installed, or model files missing
+        """
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ValueError(
+                "EMBEDDING_PROVIDER=local needs onnxruntime and tokenizers (pip install onnxruntime tokenizers)"
+            ) from e
+
+        path = Path(model_path)
+        if path.suffix == ".onnx":
+            model_file, model_dir = path, path.parent
+        else:
+            model_file = next((path / name for name in MODEL_FILES if (path / name).is_file()), None)
+            model_dir = path
+        if model_file is None or not model_file.is_file():
+            raise ValueError(f"No ONNX model found at {model_path} (looked for {', '.join(MODEL_FILES)})")
+        if not (model_dir / TOKENIZER_FILE).is_file():
+            raise ValueError(f"No {TOKENIZER_FILE} in {model_dir}")
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads or os.cpu_count() or 1
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            str(model_file), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.no_padding()
+        self.batch_size = batch_size
+        # Identity recorded in the KB manifest: a different model file forces a reindex
+        self.model_name = f"local:{model_dir.name}/{model_file.name}@{_fingerprint(model_file, model_dir / TOKENIZER_FILE)}"
+
+    def _run(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        width = max(len(e.ids) for e in encodings)
+        input_ids = np.zeros((len(texts), width), dtype=np.int64)
+        attention_mask = np.zeros((len(texts), width), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, : len(encoding.ids)] = encoding.ids
+            attention_mask[row, : len(encoding.ids)] = 1
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.zeros_like(input_ids)
+        output = self.session.run(None, {k: v for k, v in feed.items() if k in self.input_names})[0]
+        if output.ndim == 3:
+            # Mean over real tokens (last_hidden_state); 2-D outputs are already pooled
+            mask = attention_mask[:, :, None].astype(np.float32)
+            output = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return output.astype(np.float32)
+
+    def embed(self, texts: List[str], dimensions: Optional[int] = None) -> List[List[float]]:
+        """
+        Embed texts in input order.
+
+        Args:
+            dimensions: Keep only the first N dimensions (Matryoshka-style), renormalized
+        """
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start : start + self.batch_size]
+            for i, vector in zip(batch, self._run([texts[i] for i in batch])):
+                vectors[i] = vector
+        matrix = np.stack(vectors)
+        if dimensions:
+            matrix = matrix[:, :dimensions]
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return matrix.tolist()
@@ -0,0 +1,192 @@
+"""Opt-in request profiling: sampled stacks, stage breakdown, allocations; keeps the slowest N."""
+import gc
+import heapq
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.tracing import Trace, traced
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack every interval_seconds from a background thread.
+
+    Stacks are counted in folded form ("root;...;leaf"), which flamegraph.pl,
+    speedscope and inferno read directly.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval_seconds: float = 0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        names = []
+        while frame is not None:
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        if names:
+            self.stacks[";".join(reversed(names))] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self._sample()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+@dataclass
+class RequestProfile:
+    """Everything captured for one profiled request."""
+    label: str
+    wall_ms: float = 0.0
+    cpu_ms: float = 0.0
+    allocated_blocks: int = 0
+    gc_collections: int = 0
+    samples: int = 0
+    trace: Trace = field(default_factory=Trace)
+    folded: str = ""
+
+    @property
+    def llm_iterations(self) -> int:
+        return int(self.trace.counters.get("llm_iterations", 0))
+
+    def summary(self) -> dict:
+        return {
+            "label": self.label,
+            "wall_ms": round(self.wall_ms, 3),
+            "cpu_ms": round(self.cpu_ms, 3),
+            "allocated_blocks": self.allocated_blocks,
+            "gc_collections": self.gc_collections,
+            "samples": self.samples,
+            "llm_iterations": self.llm_iterations,
+            **self.trace.to_dict(),
+        }
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (per-stage wall ms, plus the total)."""
+        parts = [
+            f'{name.replace(":", "-")};dur={s.wall_seconds * 1000:.2f}'
+            for name, s in self.trace.stages.items()
+        ]
+        parts.append(f"total;dur={self.wall_ms:.2f}")
+        return ", ".join(parts)
+
+
+@contextmanager
+def profile_request(label: str, interval_seconds: float = 0.005) -> Iterator[RequestProfile]:
+    """
+    Profile the block on the current thread.
+
+    Stage/counter tracing is active for the block; a StackSampler records the
+    stacks; wall, thread CPU, net allocated blocks and GC runs are measured.
+    """
+    profile = RequestProfile(label=label)
+    sampler = StackSampler(interval_seconds=interval_seconds)
+    gc_before = sum(s["collections"] for s in gc.get_stats())
+    blocks_before = sys.getallocatedblocks()
+    wall, cpu = time.perf_counter(), time.thread_time()
+    sampler.start()
+    try:
+        with traced(profile.trace):
+            yield profile
+    finally:
+        sampler.stop()
+        profile.wall_ms = (time.perf_counter() - wall) * 1000
+        profile.cpu_ms = (time.thread_time() - cpu) * 1000
+        profile.allocated_blocks = sys.getallocatedblocks() - blocks_before
+        profile.gc_collections = sum(s["collections"] for s in gc.get_stats()) - gc_before
+        profile.samples = sum(sampler.stacks.values())
+        profile.folded = sampler.folded()
+
+
+class SlowestProfiles:
+    """
+    Keeps the slowest keep profiles on disk under path.
+
+    Each kept request gets <id>.folded (flamegraph input) and <id>.json (summary);
+    files of profiles pushed out by slower ones are removed. index.json lists
+    the kept profiles, slowest first.
+    """
+
+    def __init__(self, path: str, keep: int = 10):
+        self.path = Path(path)
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[float, str, dict]] = []
+        self._ids = itertools.count(1)
+
+    def add(self, profile: RequestProfile) -> Optional[str]:
+        """Store profile if it is among the slowest; returns its id, or None when not kept."""
+        with self._lock:
+            if len(self._heap) >= self.keep and profile.wall_ms <= self._heap[0][0]:
+                return None
+            profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self._ids):04d}"
+            self.path.mkdir(parents=True, exist_ok=True)
+            (self.path / f"{profile_id}.folded").write_text(profile.folded, encoding="utf-8")
+            summary = profile.summary()
+            (self.path / f"{profile_id}.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+            entry = (profile.wall_ms, profile_id, summary)
+            if len(self._heap) < self.keep:
+                heapq.heappush(self._heap, entry)
+            else:
+                _, evicted, _ = heapq.heapreplace(self._heap, entry)
+                for suffix in (".folded", ".json"):
+                    (self.path / f"{evicted}{suffix}").unlink(missing_ok=True)
+            index = [
+                {"id": pid, "label": s["label"], "wall_ms": s["wall_ms"]}
+                for _, pid, s in sorted(self._heap, reverse=True)
+            ]
+            (self.path / "index.json").write_text(json.dumps(index, indent=2), encoding="utf-8")
+            return profile_id
+
+    def report(self) -> Dict[str, dict]:
+        """Summaries of the kept profiles, slowest first."""
+        with self._lock:
+            return {pid: s for _, pid, s in sorted(self._heap, reverse=True)}
+
+
+def print_profile(profile: RequestProfile, top: int = 8) -> None:
+    """Print a stage breakdown and the hottest sampled leaf frames."""
+    print(f"\n--- Profile: {profile.label} ---")
+    print(f"  wall {profile.wall_ms:.1f} ms | cpu {profile.cpu_ms:.1f} ms | "
+          f"llm iterations {profile.llm_iterations} | "
+          f"allocated blocks {profile.allocated_blocks:+d} | gc runs {profile.gc_collections}")
+    for name, s in sorted(profile.trace.stages.items(), key=lambda kv: -kv[1].wall_seconds):
+        print(f"  {name:<32} wall {s.wall_seconds * 1000:>9.2f} ms  cpu {s.cpu_seconds * 1000:>8.2f} ms  x{s.calls}")
+    leaves: Counter = Counter()
+    for line in profile.folded.splitlines():
+        stack, n = line.rsplit(" ", 1)
+        leaves[stack.rsplit(";", 1)[-1]] += int(n)
+    if leaves:
+        print(f"  hottest frames ({profile.samples} samples):")
+        for frame, n in leaves.most_common(top):
+            print(f"    {n / profile.samples:>5.0%}  {frame}")
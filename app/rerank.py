@@ -0,0 +1,109 @@
+"""Post-retrieval reranking: MMR diversity, same-file / near-duplicate collapsing, query-focused snippets."""
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Sequence
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Sentence ends after a word, so list markers like "1. " stay attached to their item
+_SENTENCE_RE = re.compile(r"(?<=[^\W\d_][.!?])\s+")
+_STOPWORDS = frozenset(
+    "a an the and or but if of to in on at for with by from is are was were be been it its this that "
+    "i my me we our you your they them can cannot not no do does did have has had how what when why "
+    "will would should could please".split()
+)
+
+
+def terms(text: str) -> FrozenSet[str]:
+    """Content-word stems (6-char prefixes, so export/exporting/exported match)."""
+    return frozenset(t[:6] for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+@dataclass
+class Candidate:
+    """One retrieved chunk going into the rerank stage."""
+    id: str
+    text: str
+    metadata: Dict[str, Any]
+    score: float  # similarity to the query (1 - cosine distance)
+
+
+def mmr_select(
+    candidates: Sequence[Candidate],
+    k: int,
+    lambda_: float = 0.7,
+    max_per_file: int = 2,
+    duplicate_threshold: float = 0.6,
+) -> List[Candidate]:
+    """
+    Pick k diverse candidates by maximal marginal relevance.
+
+    Redundancy is lexical overlap (Jaccard of content terms) with the already
+    selected chunks, so overlapping chunks of one section count as near
+    duplicates. Candidates above duplicate_threshold are dropped outright, as
+    are chunks beyond max_per_file from the same file (0 = no limit).
+    """
+    remaining = list(candidates)
+    term_sets = {c.id: terms(c.text) for c in remaining}
+    selected: List[Candidate] = []
+    per_file: Dict[str, int] = {}
+    while remaining and len(selected) < k:
+        best, best_value = None, None
+        for c in remaining:
+            redundancy = max((jaccard(term_sets[c.id], term_sets[s.id]) for s in selected), default=0.0)
+            if redundancy >= duplicate_threshold:
+                continue
+            if max_per_file and per_file.get(c.metadata.get("file"), 0) >= max_per_file:
+                continue
+            value = lambda_ * c.score - (1 - lambda_) * redundancy
+            if best_value is None or value > best_value:
+                best, best_value = c, value
+        if best is None:
+            break
+        selected.append(best)
+        remaining.remove(best)
+        per_file[best.metadata.get("file")] = per_file.get(best.metadata.get("file"), 0) + 1
+    return selected
+
+
+def trim_snippet(text: str, query: str, max_chars: int = 320) -> str:
+    """
+    Keep the sentences / list items most relevant to the query, in their original order.
+
+    A leading heading line is always kept, and single skipped units between
+    kept ones are filled in when they fit. Falls back to the start of the text,
+    cut at a word boundary with an ellipsis, when nothing overlaps the query.
+    """
+    if len(text) <= max_chars:
+        return text
+    lines = text.splitlines()
+    heading = lines[0] if lines and lines[0].startswith("#") else ""
+    units = [
+        sentence.strip()
+        for line in (lines[1:] if heading else lines)
+        for sentence in _SENTENCE_RE.split(line)
+        if sentence.strip()
+    ]
+    query_terms = terms(query)
+    overlap = [len(terms(unit) & query_terms) for unit in units]
+    relevant = sorted((i for i in range(len(units)) if overlap[i]), key=lambda i: (-overlap[i], i))
+    budget = max_chars - len(heading)
+    keep = set()
+    for i in relevant:
+        if len(units[i]) + 1 <= budget:
+            keep.add(i)
+            budget -= len(units[i]) + 1
+    if not keep:
+        cut = text[: max_chars - 1]
+        space = cut.rfind(" ")
+        return (cut[:space] if space > 0 else cut).rstrip() + "\u2026"
+    # Fill one-unit gaps (e.g. step 4 between kept steps 3 and 5) while the budget allows
+    for i in range(1, len(units) - 1):
+        if i not in keep and i - 1 in keep and i + 1 in keep and len(units[i]) + 1 <= budget:
+            keep.add(i)
+            budget -= len(units[i]) + 1
+    body = "\n".join(units[i] for i in sorted(keep))
+    return f"{heading}\n{body}" if heading else body
@@ -0,0 +1,466 @@
+"""Append-only columnar store of triage results: NumPy segments written off the request path, fast aggregates."""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.agent.models import AgentOutput, TicketThread
+from app.config import settings
+from app.customer_store import PLANS, UNKNOWN_PLAN, encode_plans
+from app.tracing import Trace
+
+URGENCIES = ("critical", "high", "medium", "low")
+SENTIMENTS = ("very_negative", "negative", "neutral", "positive")
+ACTIONS = ("auto_respond", "route_to_specialist", "escalate_to_human")
+KB_SLOTS = 3
+
+# Column files of a segment (one .npy each, memory-mapped on read). Free-text values are
+# dictionary-encoded through dictionary.json (-1 = None); kb_ids holds KB_SLOTS codes per row.
+COLUMNS: Dict[str, Any] = {
+    "ts": np.float64,
+    "tenant": np.int16,
+    "plan": np.int8,
+    "urgency": np.int8,
+    "sentiment": np.int8,
+    "action": np.int8,
+    "target_queue": np.int16,
+    "product": np.int32,
+    "issue_type": np.int32,
+    "kb_ids": np.int32,
+    "latency_ms": np.float32,
+    "llm_ms": np.float32,
+    "prompt_tokens": np.int32,
+    "completion_tokens": np.int32,
+    "iterations": np.int8,
+    "reused": np.bool_,
+}
+DICTIONARY_FIELDS = ("tenant", "target_queue", "product", "issue_type", "kb_id")
+# Free-text LLM labels are lowercased and truncated; values past the limit share the OTHER_VALUE code
+# (which also keeps target_queue codes inside its int16 column)
+DICTIONARY_LIMITS = {"target_queue": 1000, "product": 1000, "issue_type": 1000}
+FREE_TEXT_MAX_CHARS = 64
+OTHER_VALUE = "(other)"
+DICTIONARY_FILE = "dictionary.json"
+SEGMENT_PREFIX = "seg-"
+
+
+def _code(values: Sequence[str], value: Optional[str]) -> int:
+    return values.index(value) if value in values else -1
+
+
+class ResultsStore:
+    """
+    Triage results as immutable segment directories under path.
+
+    Each flush writes a new segment (seg-<first>-<last>/<column>.npy plus
+    meta.json with row count and time range) to a temporary directory and
+    renames it into place, so readers never see partial segments. compact()
+    merges runs of small segments; when a merged segment and its sources are
+    briefly both present, readers skip the sources (their sequence range is
+    covered).
+    """
+
+    def __init__(self, path: Union[str, Path, None] = None):
+        self.path = Path(path or settings.results_path)
+        self._lock = threading.Lock()  # one writer (flush / compaction) at a time
+        self.dictionary: Dict[str, List[str]] = {name: [] for name in DICTIONARY_FIELDS}
+        self._codes: Dict[str, Dict[str, int]] = {name: {} for name in DICTIONARY_FIELDS}
+        self._dictionary_changed = False
+        self._load_dictionary()
+
+    # ----- dictionary -----
+
+    def _load_dictionary(self):
+        file = self.path / DICTIONARY_FILE
+        if file.exists():
+            with open(file, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            for name in DICTIONARY_FIELDS:
+                self.dictionary[name] = list(stored.get(name, []))
+                self._codes[name] = {value: code for code, value in enumerate(self.dictionary[name])}
+
+    def _save_dictionary(self):
+        if not self._dictionary_changed and (self.path / DICTIONARY_FILE).exists():
+            return
+        tmp = self.path / f".{DICTIONARY_FILE}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.dictionary, f, ensure_ascii=False)
+        os.replace(tmp, self.path / DICTIONARY_FILE)
+        self._dictionary_changed = False
+
+    def encode(self, field: str, values: Sequence[Optional[str]]) -> np.ndarray:
+        """Dictionary codes for values, adding new ones (None -> -1; see DICTIONARY_LIMITS)."""
+        codes = self._codes[field]
+        limit = DICTIONARY_LIMITS.get(field)
+        out = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            if limit and value is not None:
+                value = value.strip().lower()[:FREE_TEXT_MAX_CHARS] or None
+            if value is None:
+                out[i] = -1
+                continue
+            code = codes.get(value)
+            if code is None:
+                if limit and len(self.dictionary[field]) >= limit:
+                    value = OTHER_VALUE
+                    code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(self.dictionary[field])
+                self.dictionary[field].append(value)
+                self._dictionary_changed = True
+            out[i] = code
+        return out
+
+    def decode(self, field: str, code: int) -> Optional[str]:
+        return self.dictionary[field][code] if code >= 0 else None
+
+    # ----- segments -----
+
+    def _segments(self) -> List[Tuple[int, int, Path]]:
+        """Live segments as (first, last, dir), oldest first, without ones covered by a merged segment."""
+        if not self.path.is_dir():
+            return []
+        found = []
+        for p in self.path.iterdir():
+            if p.is_dir() and p.name.startswith(SEGMENT_PREFIX):
+                first, last = p.name[len(SEGMENT_PREFIX):].split("-")
+                found.append((int(first), int(last), p))
+        found.sort()
+        return [
+            s for s in found
+            if not any(o is not s and o[0] <= s[0] and s[1] <= o[1] and o[1] - o[0] > s[1] - s[0] for o in found)
+        ]
+
+    def write_segment(self, columns: Dict[str, np.ndarray], sequence: Optional[Tuple[int, int]] = None) -> Path:
+        """
+        Write encoded columns (see COLUMNS) as a new segment.
+
+        Args:
+            sequence: (first, last) range for a merged segment; default is the next number
+        """
+        with self._lock:
+            return self._write_segment(columns, sequence)
+
+    def _write_segment(self, columns: Dict[str, np.ndarray], sequence: Optional[Tuple[int, int]] = None) -> Path:
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._save_dictionary()  # before the segment, so every code in it can be decoded
+        if sequence is None:
+            segments = self._segments()
+            number = (max(s[1] for s in segments) if segments else 0) + 1
+            sequence = (number, number)
+        name = f"{SEGMENT_PREFIX}{sequence[0]:010d}-{sequence[1]:010d}"
+        tmp = self.path / f".{name}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        for column, dtype in COLUMNS.items():
+            np.save(tmp / f"{column}.npy", np.ascontiguousarray(columns[column], dtype=dtype))
+        ts = columns["ts"]
+        meta = {"rows": int(len(ts)), "ts_min": float(ts.min()) if len(ts) else None, "ts_max": float(ts.max()) if len(ts) else None}
+        with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.path / name)
+        return self.path / name
+
+    def compact(self, max_rows: Optional[int] = None) -> int:
+        """
+        Merge runs of consecutive segments into segments of up to max_rows.
+
+        Returns:
+            Number of segments removed
+        """
+        max_rows = max_rows or settings.results_segment_rows
+        removed = 0
+        with self._lock:
+            groups: List[List[Tuple[int, int, Path]]] = [[]]
+            rows = 0
+            for segment in self._segments():
+                segment_rows = self._meta(segment[2])["rows"]
+                if groups[-1] and rows + segment_rows > max_rows:
+                    groups.append([])
+                    rows = 0
+                groups[-1].append(segment)
+                rows += segment_rows
+            for group in groups:
+                if len(group) < 2:
+                    continue
+                merged = {
+                    column: np.concatenate([np.load(s[2] / f"{column}.npy") for s in group])
+                    for column in COLUMNS
+                }
+                self._write_segment(merged, (group[0][0], group[-1][1]))
+                for segment in group:
+                    shutil.rmtree(segment[2], ignore_errors=True)
+                removed += len(group) - 1
+        return removed
+
+    @staticmethod
+    def _meta(segment: Path) -> Dict[str, Any]:
+        with open(segment / "meta.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def segment_count(self) -> int:
+        return len(self._segments())
+
+    # ----- queries -----
+
+    def columns(
+        self,
+        names: Optional[Sequence[str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        tenant: Optional[str] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Columns of all results in [since, until) (epoch seconds), optionally for one tenant.
+
+        Segments outside the time range are skipped using their meta.json; the
+        rest are memory-mapped and concatenated.
+        """
+        names = list(names or COLUMNS)
+        wanted = set(names) | {"ts"} | ({"tenant"} if tenant else set())
+        parts = self._load_segments(wanted, since, until)
+        if parts is None:
+            # A compaction removed a listed segment, and its merged segment wasn't listed:
+            # read again under the writer lock, where no compaction can run
+            with self._lock:
+                parts = self._load_segments(wanted, since, until)
+        with self._lock:
+            # After mapping the segments (the dictionary is saved before each segment, so it
+            # decodes all of them) and under the writer lock (it then matches the in-memory one)
+            self._load_dictionary()
+        out = {
+            name: np.concatenate(parts[name]) if parts[name] else np.empty((0, KB_SLOTS) if name == "kb_ids" else 0, dtype=COLUMNS[name])
+            for name in wanted
+        }
+        mask = np.ones(len(out["ts"]), dtype=bool)
+        if since:
+            mask &= out["ts"] >= since
+        if until:
+            mask &= out["ts"] < until
+        if tenant:
+            mask &= out["tenant"] == _code(self.dictionary["tenant"], tenant)
+        if not mask.all():
+            out = {name: values[mask] for name, values in out.items()}
+        return {name: out[name] for name in names}
+
+    def _load_segments(self, wanted: set, since: Optional[float], until: Optional[float]) -> Optional[Dict[str, List[np.ndarray]]]:
+        """Memory-mapped columns of the live segments in range; None if a listed segment disappeared."""
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in wanted}
+        for _, _, segment in self._segments():
+            try:
+                meta = self._meta(segment)
+                if not meta["rows"] or (since and meta["ts_max"] < since) or (until and meta["ts_min"] >= until):
+                    continue
+                loaded = {name: np.load(segment / f"{name}.npy", mmap_mode="r") for name in wanted}
+            except FileNotFoundError:
+                return None
+            for name in wanted:
+                parts[name].append(loaded[name])
+        return parts
+
+    def _counts(self, codes: np.ndarray, labels: Sequence[str]) -> Dict[str, int]:
+        counts = np.bincount(codes.astype(np.int64) + 1, minlength=len(labels) + 1)
+        result = {label: int(counts[i + 1]) for i, label in enumerate(labels) if counts[i + 1]}
+        if counts[0]:
+            result["none"] = int(counts[0])
+        return result
+
+    def summary(self, since: Optional[float] = None, until: Optional[float] = None, tenant: Optional[str] = None, top: int = 5) -> Dict[str, Any]:
+        """Counts per urgency / action / queue / plan, latency percentiles, token totals and top KB articles."""
+        c = self.columns(since=since, until=until, tenant=tenant)
+        n = len(c["ts"])
+        if not n:
+            return {"records": 0}
+        latency = np.percentile(c["latency_ms"], [50, 90, 99])
+        kb = c["kb_ids"][c["kb_ids"] >= 0]
+        kb_codes, kb_counts = np.unique(kb, return_counts=True)
+        order = np.argsort(-kb_counts)[:top]
+        return {
+            "records": n,
+            "from": float(c["ts"].min()),
+            "to": float(c["ts"].max()),
+            "urgency": self._counts(c["urgency"], URGENCIES),
+            "action": self._counts(c["action"], ACTIONS),
+            "target_queue": self._counts(c["target_queue"], self.dictionary["target_queue"]),
+            "plan": self._counts(np.where(c["plan"] == UNKNOWN_PLAN, -1, c["plan"]), PLANS),
+            "sentiment": self._counts(c["sentiment"], SENTIMENTS),
+            "latency_ms": {"p50": round(float(latency[0]), 1), "p90": round(float(latency[1]), 1), "p99": round(float(latency[2]), 1)},
+            "llm_ms_mean": round(float(c["llm_ms"].mean()), 1),
+            "prompt_tokens": int(c["prompt_tokens"].sum(dtype=np.int64)),
+            "completion_tokens": int(c["completion_tokens"].sum(dtype=np.int64)),
+            "tokens_per_ticket": round(float((c["prompt_tokens"].sum(dtype=np.int64) + c["completion_tokens"].sum(dtype=np.int64)) / n), 1),
+            "iterations_mean": round(float(c["iterations"].mean()), 2),
+            "reused_share": round(float(c["reused"].mean()), 4),
+            "top_kb": [{"id": self.decode("kb_id", int(kb_codes[i])), "count": int(kb_counts[i])} for i in order],
+        }
+
+    def timeseries(self, bucket_seconds: float = 3600, since: Optional[float] = None, until: Optional[float] = None, tenant: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Per time bucket: tickets, critical share, escalations, mean and p95 latency, tokens per ticket."""
+        c = self.columns(["ts", "urgency", "action", "latency_ms", "prompt_tokens", "completion_tokens"], since, until, tenant)
+        if not len(c["ts"]):
+            return []
+        start = np.floor(c["ts"].min() / bucket_seconds) * bucket_seconds
+        bucket = ((c["ts"] - start) // bucket_seconds).astype(np.int64)
+        counts = np.bincount(bucket)
+        present = np.nonzero(counts)[0]
+        tokens = c["prompt_tokens"].astype(np.int64) + c["completion_tokens"]
+        critical = np.bincount(bucket, weights=c["urgency"] == URGENCIES.index("critical"))
+        escalated = np.bincount(bucket, weights=c["action"] == ACTIONS.index("escalate_to_human"))
+        latency_sum = np.bincount(bucket, weights=c["latency_ms"])
+        token_sum = np.bincount(bucket, weights=tokens)
+        # Nearest-rank p95 per bucket in one sort: order by (bucket, latency), index into each bucket's run
+        ordered = c["latency_ms"][np.lexsort((c["latency_ms"], bucket))]
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        p95 = ordered[offsets[present] + np.ceil(counts[present] * 0.95).astype(np.int64) - 1]
+        return [
+            {
+                "start": float(start + b * bucket_seconds),
+                "tickets": int(counts[b]),
+                "critical_share": round(float(critical[b] / counts[b]), 4),
+                "escalated": int(escalated[b]),
+                "latency_ms_mean": round(float(latency_sum[b] / counts[b]), 1),
+                "latency_ms_p95": round(float(p), 1),
+                "tokens_per_ticket": round(float(token_sum[b] / counts[b]), 1),
+            }
+            for b, p in zip(present.tolist(), p95.tolist())
+        ]
+
+
+class ResultsSink:
+    """
+    Buffers triage results in memory and flushes them to a ResultsStore from
+    a background thread, every flush_seconds or once flush_rows are waiting.
+    record() only appends a tuple, so the request path never touches disk.
+    """
+
+    def __init__(self, store: ResultsStore, flush_seconds: Optional[float] = None, flush_rows: Optional[int] = None):
+        self.store = store
+        self.flush_seconds = flush_seconds or settings.results_flush_seconds
+        self.flush_rows = flush_rows or settings.results_flush_rows
+        self._buffer: List[tuple] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, thread: TicketThread, output: AgentOutput, latency_ms: float, trace: Optional[Trace] = None):
+        counters = trace.counters if trace else {}
+        llm = trace.stages.get("llm") if trace else None
+        row = (
+            time.time(),
+            thread.tenant or settings.default_tenant,
+            thread.customer.plan,
+            output.classification.urgency,
+            output.classification.sentiment,
+            output.next_action.action,
+            output.next_action.target_queue,
+            output.classification.product,
+            output.classification.issue_type,
+            [r.id for r in output.kb_results[:KB_SLOTS]],
+            latency_ms,
+            llm.wall_seconds * 1000 if llm else 0.0,
+            int(counters.get("prompt_tokens", 0)),
+            int(counters.get("completion_tokens", 0)),
+            output.iterations,
+            output.stop_reason == "duplicate",
+        )
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.flush_rows
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Encode and write buffered rows as one segment; returns the row count."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        (ts, tenant, plan, urgency, sentiment, action, queue, product, issue_type,
+         kb_ids, latency, llm_ms, prompt_tokens, completion_tokens, iterations, reused) = zip(*rows)
+        store = self.store
+        with store._lock:
+            kb = np.full((len(rows), KB_SLOTS), -1, dtype=np.int32)
+            for i, ids in enumerate(kb_ids):
+                kb[i, : len(ids)] = store.encode("kb_id", ids)
+            columns = {
+                "ts": np.array(ts),
+                "tenant": store.encode("tenant", tenant),
+                "plan": encode_plans(plan),
+                "urgency": np.array([_code(URGENCIES, u) for u in urgency]),
+                "sentiment": np.array([_code(SENTIMENTS, s) for s in sentiment]),
+                "action": np.array([_code(ACTIONS, a) for a in action]),
+                "target_queue": store.encode("target_queue", queue),
+                "product": store.encode("product", product),
+                "issue_type": store.encode("issue_type", issue_type),
+                "kb_ids": kb,
+                "latency_ms": np.array(latency),
+                "llm_ms": np.array(llm_ms),
+                "prompt_tokens": np.array(prompt_tokens),
+                "completion_tokens": np.array(completion_tokens),
+                "iterations": np.array(iterations),
+                "reused": np.array(reused),
+            }
+            store._write_segment(columns)
+        return len(rows)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="results-sink", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_seconds + 5)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+                if self.store.segment_count() >= settings.results_compact_segments:
+                    self.store.compact()
+            except Exception as e:
+                print(f"Results flush failed: {e}")
+
+
+results_store = ResultsStore()
+results_sink = ResultsSink(results_store)
+
+
+if __name__ == "__main__":
+    # Usage: python -m app.results_store summary|timeseries|compact [--hours H] [--tenant T] [--bucket-minutes M]
+    parser = argparse.ArgumentParser(description="Query or compact the triage results store")
+    parser.add_argument("command", choices=("summary", "timeseries", "compact"))
+    parser.add_argument("--path", default=settings.results_path)
+    parser.add_argument("--hours", type=float, default=None, help="Only the last H hours")
+    parser.add_argument("--tenant", default=None)
+    parser.add_argument("--bucket-minutes", type=float, default=60)
+    args = parser.parse_args()
+
+    store = ResultsStore(args.path)
+    since = time.time() - args.hours * 3600 if args.hours else None
+    started = time.perf_counter()
+    if args.command == "compact":
+        removed = store.compact()
+        print(f"Merged {removed} segments; {store.segment_count()} left")
+    elif args.command == "summary":
+        result = store.summary(since=since, tenant=args.tenant)
+        print(json.dumps(result, indent=2))
+        print(f"Aggregated {result['records']} records in {(time.perf_counter() - started) * 1000:.0f} ms")
+    else:
+        result = store.timeseries(args.bucket_minutes * 60, since=since, tenant=args.tenant)
+        print(json.dumps(result, indent=2))
+        print(f"{len(result)} buckets in {(time.perf_counter() - started) * 1000:.0f} ms")
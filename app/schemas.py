@@ -22,6 +22,7 @@ class TicketThreadRequest(BaseModel):
     """Complete ticket thread request."""
     customer: CustomerInfoRequest
     messages: List[TicketMessageRequest]
+    tenant: Optional[str] = None  # KB tenant (overrides the X-Tenant header)
 
 
 class ClassificationResponse(BaseModel):
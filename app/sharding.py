@@ -0,0 +1,364 @@
+"""Sharded KB vector search: chunks partitioned by file hash across local shard processes, queried scatter/gather."""
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import queue
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from app.config import settings
+
+SHARDS_FILENAME = "shards.json"
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances")
+
+
+def shard_for(file: Optional[str], shards: int) -> int:
+    """Shard a KB file's chunks live in (stable across processes and restarts)."""
+    digest = hashlib.md5((file or "").encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % shards
+
+
+class ShardPool:
+    """
+    Shard server processes (python -m app.sharding --serve), one Chroma
+    directory each under root/shard-<i>, connected back to this process over
+    authenticated localhost sockets. Each shard opens `connections`
+    connections, served by one thread each, so concurrent queries to a shard
+    don't queue behind one another.
+    """
+
+    def __init__(self, shards: int, root: Path, connections: Optional[int] = None, start_timeout: float = 120.0):
+        """
+        Raises:
+            RuntimeError: A shard process exited or didn't connect within start_timeout
+        """
+        self.shards = shards
+        self.root = Path(root)
+        self.connections = connections or settings.vector_shard_connections
+        self._free: List["queue.Queue[Connection]"] = [queue.Queue() for _ in range(shards)]
+        self._processes: List[subprocess.Popen] = []
+        self._executor = ThreadPoolExecutor(max_workers=shards * self.connections, thread_name_prefix="shard-scatter")
+        self._start(start_timeout)
+        atexit.register(self.close)
+
+    def _start(self, timeout: float):
+        authkey = secrets.token_bytes(16)
+        listener = Listener(("127.0.0.1", 0), authkey=authkey)
+        host, port = listener.address
+        for shard in range(self.shards):
+            env = {
+                **os.environ,
+                "CHROMA_DB_PATH": str(self.root / f"shard-{shard}"),
+                "VECTOR_SHARDS": "1",
+                "SHARD_AUTHKEY": authkey.hex(),
+            }
+            self._processes.append(subprocess.Popen(
+                [sys.executable, "-m", "app.sharding", "--serve", str(shard), f"{host}:{port}", str(self.connections)],
+                cwd=PROJECT_ROOT,
+                env=env,
+            ))
+
+        expected = self.shards * self.connections
+        accepted = []
+
+        def accept():
+            try:
+                while len(accepted) < expected:
+                    conn = listener.accept()
+                    self._free[conn.recv()].put(conn)
+                    accepted.append(conn)
+            except OSError:
+                pass  # listener closed after a failed start
+
+        acceptor = threading.Thread(target=accept, daemon=True)
+        acceptor.start()
+        deadline = time.monotonic() + timeout
+        while acceptor.is_alive():
+            acceptor.join(0.2)
+            failed = [i for i, p in enumerate(self._processes) if p.poll() is not None]
+            if failed or time.monotonic() > deadline:
+                listener.close()
+                self.close()
+                raise RuntimeError(f"Shard processes failed to start (exited: {failed or 'none'}, timeout {timeout}s)")
+        listener.close()
+
+    def call(self, shard: int, op: str, *args) -> Any:
+        """
+        Run op on one shard and return its result.
+
+        Raises:
+            RuntimeError: The shard failed the op or is unreachable
+        """
+        conn = self._free[shard].get()
+        try:
+            conn.send((op, args))
+            status, result = conn.recv()
+        except (EOFError, OSError) as e:
+            raise RuntimeError(f"Shard {shard} is not responding: {e}") from e
+        finally:
+            self._free[shard].put(conn)
+        if status == "error":
+            raise RuntimeError(f"Shard {shard} {op} failed: {result}")
+        return result
+
+    def scatter(self, op: str, args_by_shard: Dict[int, tuple]) -> Dict[int, Any]:
+        """Run op on several shards in parallel, with per-shard arguments."""
+        futures = {shard: self._executor.submit(self.call, shard, op, *args) for shard, args in args_by_shard.items()}
+        return {shard: future.result() for shard, future in futures.items()}
+
+    def broadcast(self, op: str, *args) -> List[Any]:
+        """Run op with the same arguments on every shard; results in shard order."""
+        results = self.scatter(op, {shard: args for shard in range(self.shards)})
+        return [results[shard] for shard in range(self.shards)]
+
+    def close(self):
+        for process in self._processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in self._processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self._processes = []
+
+
+_pool: Optional[ShardPool] = None
+_pool_lock = threading.Lock()
+
+
+def shard_pool() -> ShardPool:
+    """The process-wide pool of VECTOR_SHARDS shards, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            root = Path(settings.chroma_db_path) / f"shards-{settings.vector_shards}"
+            _pool = ShardPool(settings.vector_shards, root)
+        return _pool
+
+
+class ShardedStaging:
+    """A reindex in progress: unchanged files to carry over and the shards being rebuilt."""
+
+    def __init__(self, version: int, shards: int):
+        self.version = version
+        self.reused: Dict[int, List[str]] = {shard: [] for shard in range(shards)}
+        self.added_files: Dict[int, Set[str]] = {shard: set() for shard in range(shards)}
+        self.started: Set[int] = set()
+
+
+class ShardedVectorStore:
+    """
+    VectorStore interface over a ShardPool, the KB split across shards by file hash.
+
+    A reindex only rebuilds shards that own a changed, added or removed file:
+    each builds a new version inside its process (unchanged files' chunks are
+    copied there, new chunks streamed to it) and swaps it in, while the other
+    shards keep serving their current version. Queries go to every shard in
+    parallel and the per-shard top n are merged by distance.
+    """
+
+    # Each shard keeps its own compact index when EMBEDDING_QUANTIZATION / SEARCH_DIMENSIONS are set
+    compact_enabled = False
+    compact_index = None
+
+    def __init__(self, collection_name: str = "knowledge_base", pool: Optional[ShardPool] = None):
+        self.collection_name = collection_name
+        self.pool = pool or shard_pool()
+        self.shards = self.pool.shards
+        self._state_path = self.pool.root / f"{collection_name}_{SHARDS_FILENAME}"
+        state = self._read_state()
+        self.version: int = state.get("version", 0)
+        saved_files = state.get("files") or []
+        self._files: List[Set[str]] = [
+            set(saved_files[shard]) if shard < len(saved_files) else set() for shard in range(self.shards)
+        ]
+
+    def _read_state(self) -> Dict[str, Any]:
+        try:
+            with open(self._state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_state(self):
+        self._state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._state_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "files": [sorted(files) for files in self._files]}, f)
+        os.replace(tmp_path, self._state_path)
+
+    def count(self) -> int:
+        return sum(self.pool.broadcast("count", self.collection_name))
+
+    def release(self):
+        """Drop this collection's store and cached Chroma segments in every shard process."""
+        self.pool.broadcast("release", self.collection_name)
+
+    def new_version(self) -> ShardedStaging:
+        return ShardedStaging(self.version + 1, self.shards)
+
+    def _stage(self, target: ShardedStaging, shards: Set[int]) -> int:
+        # New version per shard, with its unchanged files' chunks copied inside the shard process
+        todo = {shard: (self.collection_name, target.reused[shard]) for shard in shards - target.started}
+        target.started |= set(todo)
+        return sum(self.pool.scatter("stage", todo).values())
+
+    def copy_files(self, files: List[str], target: ShardedStaging) -> int:
+        """
+        Carry unchanged files over; shards that lost or changed files are rebuilt now,
+        the others only if new chunks arrive for them.
+        """
+        for file in files:
+            target.reused[shard_for(file, self.shards)].append(file)
+        changed = {shard for shard in range(self.shards) if set(target.reused[shard]) != self._files[shard]}
+        return self._stage(target, changed)
+
+    def add_documents(
+        self,
+        ids: List[str],
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        target: Optional[ShardedStaging] = None,
+    ):
+        """Route chunks to their file's shard, staging it on its first new chunk."""
+        if target is None:
+            raise ValueError("Sharded stores only add documents to a staged version (new_version())")
+        metadatas = metadatas or [{}] * len(ids)
+        rows: Dict[int, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            file = (metadata or {}).get("file")
+            shard = shard_for(file, self.shards)
+            rows.setdefault(shard, []).append(i)
+            target.added_files[shard].add(file)
+        self._stage(target, set(rows))
+        self.pool.scatter("add", {
+            shard: (
+                self.collection_name,
+                [ids[i] for i in picked],
+                [texts[i] for i in picked],
+                [embeddings[i] for i in picked],
+                [metadatas[i] for i in picked],
+            )
+            for shard, picked in rows.items()
+        })
+
+    def build_compact_index(self, target: Optional[ShardedStaging] = None):
+        """No-op: shards build their compact index when they activate."""
+
+    def activate(self, staged: ShardedStaging):
+        """Swap in the rebuilt shards (in parallel); untouched shards keep their version."""
+        self.pool.scatter("activate", {shard: (self.collection_name,) for shard in staged.started})
+        for shard in staged.started:
+            self._files[shard] = set(staged.reused[shard]) | staged.added_files[shard]
+        self.version = staged.version
+        self._write_state()
+
+    def clear(self):
+        """Empty every shard."""
+        staged = self.new_version()
+        self._stage(staged, set(range(self.shards)))
+        self.activate(staged)
+
+    def query(
+        self,
+        query_embedding: List[float],
+        n_results: int = 3,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Top n_results over all shards, in VectorStore.query's result shape."""
+        results = self.pool.broadcast("query", self.collection_name, list(query_embedding), n_results, where)
+        hits = sorted(
+            (distance, shard, i)
+            for shard, result in enumerate(results)
+            if result["ids"]
+            for i, distance in enumerate(result["distances"][0])
+        )[:n_results]
+        return {key: [[results[shard][key][0][i] for _, shard, i in hits]] for key in RESULT_KEYS}
+
+
+def serve(shard: int, address: str, connections: int):
+    """Shard process: serve one VectorStore per collection under CHROMA_DB_PATH (set by the pool)."""
+    from app.vector_store import VectorStore, default_vector_store
+
+    stores: Dict[str, VectorStore] = {}
+    staged: Dict[str, Any] = {}
+    lock = threading.Lock()
+
+    def store_for(name: str) -> VectorStore:
+        with lock:
+            store = stores.get(name)
+            if store is None:
+                default = default_vector_store()
+                store = default if name == default.collection_name else VectorStore(name, client=default.client)
+                if store.compact_enabled and store.compact_index is None and store.count():
+                    store.build_compact_index()
+                stores[name] = store
+            return store
+
+    def handle(op: str, args: tuple) -> Any:
+        name, rest = args[0], args[1:]
+        if op == "release":
+            with lock:
+                released = stores.pop(name, None) if name not in staged else None
+            if released is not None:
+                released.release()
+            return released is not None
+        store = store_for(name)
+        if op == "query":
+            return store.query(*rest)
+        if op == "count":
+            return store.count()
+        if op == "stage":
+            target = staged[name] = store.new_version()
+            return store.copy_files(rest[0], target)
+        if op == "add":
+            store.add_documents(*rest, target=staged[name])
+            return len(rest[0])
+        if op == "activate":
+            target = staged.pop(name)
+            store.build_compact_index(target)
+            store.activate(target)
+            return target.version
+        raise ValueError(f"Unknown shard op {op!r}")
+
+    def worker(conn: Connection):
+        while True:
+            try:
+                op, args = conn.recv()
+            except (EOFError, OSError):
+                os._exit(0)  # the pool's process went away
+            try:
+                conn.send(("ok", handle(op, args)))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+
+    host, port = address.rsplit(":", 1)
+    authkey = bytes.fromhex(os.environ["SHARD_AUTHKEY"])
+    threads = []
+    for _ in range(connections):
+        conn = Client((host, int(port)), authkey=authkey)
+        conn.send(shard)
+        threads.append(threading.Thread(target=worker, args=(conn,), name=f"shard-{shard}"))
+        threads[-1].start()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    # Started by ShardPool: python -m app.sharding --serve SHARD HOST:PORT CONNECTIONS
+    parser = argparse.ArgumentParser(description="KB vector shard server (started by ShardPool)")
+    parser.add_argument("--serve", nargs=3, metavar=("SHARD", "ADDRESS", "CONNECTIONS"), required=True)
+    args = parser.parse_args()
+    serve(int(args.serve[0]), args.serve[1], int(args.serve[2]))
@@ -0,0 +1,186 @@
+"""Tenants: per-product-line KB directories and collections, loaded lazily with LRU eviction."""
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+
+from app.config import settings
+from app.vector_store import DEFAULT_COLLECTION, VectorStore, default_vector_store
+
+if TYPE_CHECKING:
+    from app.sharding import ShardedVectorStore
+
+# Either store implements the interface tenants and the loader use
+Store = Union[VectorStore, "ShardedVectorStore"]
+
+MANIFEST_FILENAME = "kb_manifest.json"
+
+# Lowercase letters, digits and dashes: valid inside Chroma collection names, and no "_"
+# so one tenant's versioned collections ("kb-x_v3") can never match another tenant's prefix
+TENANT_NAME_RE = re.compile(r"^[a-z0-9][a-z0-9-]{0,39}$")
+
+
+def _new_store(collection_name: str) -> Store:
+    """The collection's store: sharded across processes when VECTOR_SHARDS > 1."""
+    if settings.vector_shards > 1:
+        from app.sharding import ShardedVectorStore
+        return ShardedVectorStore(collection_name)
+    default = default_vector_store()
+    if collection_name == default.collection_name:
+        return default
+    return VectorStore(collection_name, client=default.client)
+
+
+def _new_status() -> Dict[str, Any]:
+    return {
+        "version": None,
+        "chunks": None,
+        "reindexing": False,
+        "last_reload_at": None,
+        "last_reload_seconds": None,
+        "embedded_files": None,
+        "reused_files": None,
+        "docs_per_second": None,
+    }
+
+
+@dataclass
+class Tenant:
+    """One tenant's KB directory, vector store, index manifest and indexing lock."""
+    name: str
+    kb_path: str
+    store: Store
+    manifest_path: Path
+    lock: threading.Lock
+    status: Dict[str, Any] = field(default_factory=_new_status)
+    last_used: float = field(default_factory=time.monotonic)
+    ready: bool = False  # index checked against the manifest since loading
+
+
+def validate_tenant_name(name: str) -> str:
+    """
+    Raises:
+        ValueError: Name is not a valid tenant name
+    """
+    if not TENANT_NAME_RE.match(name or ""):
+        raise ValueError(f"Invalid tenant name {name!r}: use 1-40 lowercase letters, digits or dashes")
+    return name
+
+
+class TenantRegistry:
+    """
+    Loaded tenants, least recently used first.
+
+    The default tenant (KB_PATH, the "knowledge_base" collection) is always
+    loaded. Other tenants live under TENANT_KB_ROOT/<name> with collections
+    named "kb-<name>". They load on first use and, beyond MAX_LOADED_TENANTS,
+    the least recently used idle one is dropped, releasing its compact index,
+    metadata columns and the Chroma client's cached segments (in the shard
+    processes too when sharded). Indexing locks and status outlive eviction,
+    so a reindex in progress is never duplicated.
+    """
+
+    def __init__(self, max_loaded: Optional[int] = None):
+        self.max_loaded = max_loaded or settings.max_loaded_tenants
+        self._lock = threading.Lock()
+        self._loaded: "OrderedDict[str, Tenant]" = OrderedDict()
+        self._index_locks: Dict[str, threading.Lock] = {}
+        self._statuses: Dict[str, Dict[str, Any]] = {}
+        default = settings.default_tenant
+        store = _new_store(DEFAULT_COLLECTION)
+        self._default = Tenant(
+            name=default,
+            kb_path=settings.kb_path,
+            store=store,
+            manifest_path=Path(settings.chroma_db_path) / MANIFEST_FILENAME,
+            lock=self._index_lock(default),
+            status=self._status(default),
+        )
+        self._default.status["version"] = store.version
+
+    def _index_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            return self._index_locks.setdefault(name, threading.Lock())
+
+    def _status(self, name: str) -> Dict[str, Any]:
+        with self._lock:
+            return self._statuses.setdefault(name, _new_status())
+
+    @property
+    def default(self) -> Tenant:
+        return self._default
+
+    def kb_path(self, name: str) -> Path:
+        return Path(settings.tenant_kb_root) / name
+
+    def get(self, name: Optional[str] = None) -> Tenant:
+        """
+        The tenant called name (default tenant when None), loading it if needed.
+
+        Raises:
+            ValueError: Invalid name
+            LookupError: No KB directory for the tenant
+        """
+        if not name or name == self._default.name:
+            self._default.last_used = time.monotonic()
+            return self._default
+        validate_tenant_name(name)
+        with self._lock:
+            tenant = self._loaded.get(name)
+            if tenant is not None:
+                self._loaded.move_to_end(name)
+        if tenant is None:
+            # Opened outside the registry lock so a slow load doesn't hold up other tenants
+            loaded = self._load(name)
+            with self._lock:
+                tenant = self._loaded.setdefault(name, loaded)
+                self._loaded.move_to_end(name)
+                evicted = self._evict_idle(keep=name)
+            for old in evicted:
+                old.store.release()
+        tenant.last_used = time.monotonic()
+        return tenant
+
+    def _load(self, name: str) -> Tenant:
+        if not self.kb_path(name).is_dir():
+            raise LookupError(f"Unknown tenant {name!r}: no KB directory at {self.kb_path(name)}")
+        collection_name = f"kb-{name}"
+        store = _new_store(collection_name)
+        tenant = Tenant(
+            name=name,
+            kb_path=str(self.kb_path(name)),
+            store=store,
+            manifest_path=Path(settings.chroma_db_path) / f"{collection_name}_{MANIFEST_FILENAME}",
+            lock=self._index_lock(name),
+            status=self._status(name),
+        )
+        tenant.status["version"] = store.version
+        return tenant
+
+    def _evict_idle(self, keep: str) -> List[Tenant]:
+        # Skips tenants that are reindexing; queries already holding a Tenant keep using it
+        # (released segments reload from disk). The caller releases the evicted stores.
+        evicted = []
+        for name in list(self._loaded):
+            if len(self._loaded) <= self.max_loaded:
+                break
+            if name != keep and not self._loaded[name].lock.locked():
+                evicted.append(self._loaded.pop(name))
+        return evicted
+
+    def loaded(self) -> List[Tenant]:
+        """The default tenant plus the currently loaded ones."""
+        with self._lock:
+            return [self._default, *self._loaded.values()]
+
+    def names(self) -> List[str]:
+        """All known tenants: the default one plus every directory under TENANT_KB_ROOT."""
+        root = Path(settings.tenant_kb_root)
+        found = sorted(p.name for p in root.iterdir() if p.is_dir() and TENANT_NAME_RE.match(p.name)) if root.is_dir() else []
+        return [self._default.name, *[n for n in found if n != self._default.name]]
+
+
+tenant_registry = TenantRegistry()
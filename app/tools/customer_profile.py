@@ -1,6 +1,13 @@
 """Customer profile lookup tool."""
 from typing import Optional
 
+# Approximate MRR based on plan (shared with the columnar customer store)
+PLAN_MRR = {
+    "free": 0,
+    "pro": 29.99,
+    "enterprise": 299.99,
+}
+
 
 def get_customer_profile(
     customer_plan: str,
@@ -10,24 +17,19 @@ def get_customer_profile(
     """
     Get customer profile info (form mock data )
     """
-    # Mocked logic based on plan and tenure
+    # Mocked logic based on plan and tenure (plan names are case-insensitive, as in the customer store)
+    plan = (customer_plan or "").lower()
     is_vip = (
-        customer_plan == "enterprise" or
+        plan == "enterprise" or
         tenure_months >= 12 or
-        (customer_plan == "pro" and tenure_months >= 6)
+        (plan == "pro" and tenure_months >= 6)
     )
     
-    # Approximate MRR based on plan
-    mrr_map = {
-        "free": 0,
-        "pro": 29.99,
-        "enterprise": 299.99,
-    }
-    mrr = mrr_map.get(customer_plan.lower(), 0)
+    mrr = PLAN_MRR.get(plan, 0)
     
     # Risk indicators
     at_risk = (
-        customer_plan == "free" and tenure_months >= 6 and tenure_months <= 8
+        plan == "free" and tenure_months >= 6 and tenure_months <= 8
     )
     
     return {
@@ -1,22 +1,64 @@
 """Knowledge base search tool."""
-from typing import List
-from app.vector_store import vector_store
+from typing import Any, Dict, List, Optional
 from app.llm_client import llm_client
 from app.agent.models import KBResult
+from app.config import settings
+from app.kb_metadata import plan_filter
+from app.rerank import Candidate, mmr_select, trim_snippet
+from app.tenants import tenant_registry
+from app.tracing import count, stage
 
 
-def search_knowledge_base(query: str, top_k: int = 3) -> List[KBResult]:
+def _combine(*clauses: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    clauses = [c for c in clauses if c]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def search_knowledge_base(
+    query: str,
+    top_k: int = 3,
+    plan: Optional[str] = None,
+    language: Optional[str] = None,
+    tenant: Optional[str] = None,
+) -> List[KBResult]:
     """
     Search the knowledge base using RAG (embedding)
+    
+    Over-fetches top_k * KB_OVERFETCH_FACTOR chunks, then picks top_k diverse
+    ones (MMR, near-duplicate and same-file collapsing) and trims each snippet
+    to the sentences relevant to the query.
+    
+    Args:
+        query: Search query
+        top_k: Number of results
+        plan: Customer plan; only chunks that apply to it are searched
+        language: Ticket language; falls back to all languages when the KB has none in it
+        tenant: KB tenant to search (default tenant when None)
     """
+    store = tenant_registry.get(tenant).store
+    
     # Embed the query
     query_embedding = llm_client.embed_text(query)
     
+    # Pre-filter by plan and language, then by plan only if nothing matched the language
+    plan_where = plan_filter(plan)
+    filters = [_combine(plan_where, {"language": language} if language else None)]
+    if language:
+        filters.append(plan_where)
+    
     # Search vector store
-    results = vector_store.query(
-        query_embedding=query_embedding,
-        n_results=top_k,
-    )
+    with stage("vector_query"):
+        for attempt, where in enumerate(filters, 1):
+            results = store.query(
+                query_embedding=query_embedding,
+                n_results=top_k * max(1, settings.kb_overfetch_factor),
+                where=where,
+            )
+            if (results["ids"] and results["ids"][0]) or attempt == len(filters):
+                break
+            count("kb_filter_fallbacks")
     
     # Convert to KBResult objects
     kb_results = []
@@ -26,15 +68,33 @@ def search_knowledge_base(query: str, top_k: int = 3) -> List[KBResult]:
         metadatas = results["metadatas"][0]
         distances = results["distances"][0]
         
-        for i in range(len(ids)):
-            # Convert distance to similarity score 
-            score = 1.0 - distances[i] if distances[i] <= 1.0 else 0.0
-            
-            kb_results.append(KBResult(
+        # Convert distance to similarity score; rounded so float noise between index
+        # builds doesn't change the prompt (and break LLM fixture replay)
+        candidates = [
+            Candidate(
                 id=ids[i],
-                title=metadatas[i].get("title", "Untitled"),
-                snippet=documents[i][:500],  # Limit snippet length
-                score=score,
-            ))
+                text=documents[i],
+                metadata=metadatas[i] or {},
+                score=round(1.0 - distances[i], 4) if distances[i] <= 1.0 else 0.0,
+            )
+            for i in range(len(ids))
+        ]
+        
+        with stage("rerank"):
+            selected = mmr_select(
+                candidates,
+                top_k,
+                lambda_=settings.kb_mmr_lambda,
+                max_per_file=settings.kb_max_chunks_per_file,
+                duplicate_threshold=settings.kb_duplicate_threshold,
+            )
+            for c in selected:
+                kb_results.append(KBResult(
+                    id=c.id,
+                    title=c.metadata.get("title", "Untitled"),
+                    snippet=trim_snippet(c.text, query, settings.kb_snippet_max_chars),
+                    score=c.score,
+                ))
+        count("kb_candidates", len(candidates))
     
     return kb_results
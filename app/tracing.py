@@ -0,0 +1,86 @@
+"""Lightweight per-request tracing: stage wall/CPU time and counters."""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional
+
+
+@dataclass
+class StageStats:
+    """Accumulated timing for one named stage."""
+    calls: int = 0
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+
+
+@dataclass
+class Trace:
+    """Stages and counters recorded while a trace is active."""
+    stages: Dict[str, StageStats] = field(default_factory=dict)
+    counters: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "stages": {
+                name: {
+                    "calls": s.calls,
+                    "wall_ms": round(s.wall_seconds * 1000, 3),
+                    "cpu_ms": round(s.cpu_seconds * 1000, 3),
+                }
+                for name, s in self.stages.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+    def merge(self, other: "Trace") -> None:
+        """Add another trace's stages and counters to this one."""
+        for name, s in other.stages.items():
+            stats = self.stages.setdefault(name, StageStats())
+            stats.calls += s.calls
+            stats.wall_seconds += s.wall_seconds
+            stats.cpu_seconds += s.cpu_seconds
+        for name, value in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def traced(trace: Optional[Trace] = None) -> Iterator[Trace]:
+    """Make a trace active for the current context (thread / task)."""
+    trace = trace or Trace()
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as a named stage; no-op when no trace is active."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        stats = trace.stages.setdefault(name, StageStats())
+        stats.calls += 1
+        stats.wall_seconds += time.perf_counter() - wall
+        stats.cpu_seconds += time.thread_time() - cpu
+
+
+def count(name: str, value: float = 1) -> None:
+    """Add to a named counter of the active trace (no-op without one)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.counters[name] = trace.counters.get(name, 0) + value
@@ -0,0 +1,342 @@
+"""Compact (quantized and/or dimension-truncated) embedding index with exact float re-ranking."""
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+# Number of set bits for every byte value (popcount lookup for Hamming distance)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# Rows per block when an index is written from memory-mapped vectors
+BLOCK_ROWS = 65536
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so dot product equals cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per-dimension scalar quantization to int8.
+
+    Returns:
+        (codes, lo, step) where vectors ~= lo + (codes + 128) * step
+    """
+    lo = vectors.min(axis=0)
+    step = _int8_step(lo, vectors.max(axis=0))
+    return _int8_codes(vectors, lo, step), lo.astype(np.float32), step
+
+
+def _int8_step(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    step = (hi - lo) / 255.0
+    step[step == 0] = 1.0
+    return step.astype(np.float32)
+
+
+def _int8_codes(vectors: np.ndarray, lo: np.ndarray, step: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint((vectors - lo) / step) - 128, -128, 127).astype(np.int8)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Sign-bit quantization packed 8 dimensions per byte."""
+    return np.packbits(vectors > 0, axis=-1)
+
+
+def metadata_columns(metadatas: Sequence[Dict[str, Any]], fields: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Per-field value arrays (aligned with metadatas) for where_mask; missing values are None."""
+    return {
+        name: np.array([(m or {}).get(name) for m in metadatas], dtype=object)
+        for name in fields
+    }
+
+
+def where_mask(where: Dict[str, Any], columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Evaluate a Chroma-style where clause against metadata columns.
+
+    Supports {"field": value}, $eq / $ne / $in / $nin on a field, and $and / $or.
+
+    Raises:
+        KeyError: A field has no column (callers fall back to Chroma)
+        ValueError: Unsupported operator
+    """
+    masks = []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_mask(clause, columns) for clause in condition]
+            masks.append(np.logical_and.reduce(parts) if key == "$and" else np.logical_or.reduce(parts))
+            continue
+        column = columns[key]
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, value in condition.items():
+            if op == "$eq":
+                masks.append(column == value)
+            elif op == "$ne":
+                masks.append(column != value)
+            elif op in ("$in", "$nin"):
+                found = np.isin(column, list(value))
+                masks.append(found if op == "$in" else ~found)
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+    return np.logical_and.reduce(masks).astype(bool)
+
+
+class VectorWriter:
+    """
+    Appends normalized float32 rows to a raw file while a version is staged, so
+    building an index never holds the KB's float vectors in memory.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.ids: List[str] = []
+        self.dims: Optional[int] = None
+        self._file = open(path, "wb")
+        self._lock = threading.Lock()
+
+    def append(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]]) -> None:
+        """
+        Raises:
+            ValueError: Embedding size differs from earlier rows
+        """
+        vectors = normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        with self._lock:
+            if self.dims is None:
+                self.dims = vectors.shape[1]
+            elif vectors.shape[1] != self.dims:
+                raise ValueError(f"Embedding has {vectors.shape[1]} dimensions, expected {self.dims}")
+            self._file.write(vectors.tobytes())
+            self.ids.extend(ids)
+
+    def vectors(self) -> np.ndarray:
+        """The rows written so far, memory-mapped."""
+        with self._lock:
+            self._file.flush()
+            return np.memmap(self.path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dims or 0))
+
+    def discard(self) -> None:
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+
+class CompactIndex:
+    """
+    Compact codes for candidate selection plus float vectors for re-ranking.
+
+    Codes are built from the first candidate_dims dimensions (Matryoshka-style
+    prefix, re-normalized) and optionally quantized; mode "none" keeps the
+    prefix as float32. Only the codes are held in memory; the full float32
+    vectors are memory-mapped from disk once loaded, so re-ranking touches
+    just the candidate rows. When the VectorStore uses it, it is the only
+    copy of the vectors: Chroma keeps documents and metadata for lookups.
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        vectors: np.ndarray,
+        mode: str,
+        codes: np.ndarray,
+        lo: np.ndarray = None,
+        step: np.ndarray = None,
+        candidate_dims: Optional[int] = None,
+    ):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported quantization mode: {mode}")
+        self.ids = ids
+        self.vectors = vectors
+        self.mode = mode
+        self.codes = codes
+        self.lo = lo
+        self.step = step
+        self.candidate_dims = candidate_dims
+        self._row_of: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(
+        cls,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        mode: str,
+        candidate_dims: Optional[int] = None,
+    ) -> "CompactIndex":
+        """Build codes from normalized embeddings (Chroma's cosine space)."""
+        vectors = normalize(np.asarray(embeddings, dtype=np.float32))
+        if candidate_dims and vectors.ndim == 2 and candidate_dims >= vectors.shape[1]:
+            candidate_dims = None
+        prefix = normalize(vectors[:, :candidate_dims]) if candidate_dims else vectors
+        if mode == "int8":
+            codes, lo, step = quantize_int8(prefix)
+            return cls(list(ids), vectors, mode, codes, lo, step, candidate_dims)
+        if mode == "binary":
+            return cls(list(ids), vectors, mode, quantize_binary(prefix), candidate_dims=candidate_dims)
+        return cls(list(ids), vectors, mode, np.ascontiguousarray(prefix), candidate_dims=candidate_dims)
+
+    @classmethod
+    def write(
+        cls,
+        path: Union[str, Path],
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        mode: str,
+        candidate_dims: Optional[int] = None,
+    ) -> "CompactIndex":
+        """
+        Build the index on disk from (possibly memory-mapped) vectors, BLOCK_ROWS at a time, and load it.
+
+        Peak memory is the codes plus one block, so the full float vectors are never all in RAM.
+
+        Raises:
+            ValueError: Unsupported mode
+        """
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported quantization mode: {mode}")
+        out = Path(path)
+        out.mkdir(parents=True, exist_ok=True)
+        n, dims = vectors.shape
+        if candidate_dims and candidate_dims >= dims:
+            candidate_dims = None
+        code_dims = candidate_dims or dims
+        blocks = [slice(start, min(start + BLOCK_ROWS, n)) for start in range(0, n, BLOCK_ROWS)]
+
+        def rows(block: slice) -> Tuple[np.ndarray, np.ndarray]:
+            full = normalize(vectors[block])
+            return full, normalize(full[:, :candidate_dims]) if candidate_dims else full
+
+        lo = step = None
+        if mode == "int8":
+            lo = np.full(code_dims, np.inf, dtype=np.float32)
+            hi = np.full(code_dims, -np.inf, dtype=np.float32)
+            for block in blocks:
+                prefix = rows(block)[1]
+                lo, hi = np.minimum(lo, prefix.min(axis=0)), np.maximum(hi, prefix.max(axis=0))
+            step = _int8_step(lo, hi)
+            codes = np.empty((n, code_dims), dtype=np.int8)
+        elif mode == "binary":
+            codes = np.empty((n, (code_dims + 7) // 8), dtype=np.uint8)
+        else:
+            codes = np.empty((n, code_dims), dtype=np.float32)
+        full_out = np.lib.format.open_memmap(out / "vectors.npy", mode="w+", dtype=np.float32, shape=(n, dims))
+        for block in blocks:
+            full, prefix = rows(block)
+            full_out[block] = full
+            if mode == "int8":
+                codes[block] = _int8_codes(prefix, lo, step)
+            elif mode == "binary":
+                codes[block] = quantize_binary(prefix)
+            else:
+                codes[block] = prefix
+        full_out.flush()
+        del full_out
+        cls(list(ids), np.empty((0, dims), dtype=np.float32), mode, codes, lo, step, candidate_dims)._save_codes(out)
+        return cls.load(out)
+
+    def rows(self, ids: Sequence[str]) -> np.ndarray:
+        """
+        Row numbers of ids; the id -> row map is built on first use.
+
+        Raises:
+            KeyError: An id is not in the index
+        """
+        if self._row_of is None:
+            self._row_of = {cid: row for row, cid in enumerate(self.ids)}
+        return np.array([self._row_of[cid] for cid in ids], dtype=np.int64)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the in-memory part (codes and int8 calibration)."""
+        extra = 0 if self.lo is None else self.lo.nbytes + self.step.nbytes
+        return self.codes.nbytes + extra
+
+    def save(self, path: Union[str, Path]) -> None:
+        out = Path(path)
+        out.mkdir(parents=True, exist_ok=True)
+        np.save(out / "vectors.npy", self.vectors)
+        self._save_codes(out)
+
+    def _save_codes(self, out: Path) -> None:
+        np.save(out / "codes.npy", self.codes)
+        if self.mode == "int8":
+            np.save(out / "lo.npy", self.lo)
+            np.save(out / "step.npy", self.step)
+        with open(out / "index.json", "w", encoding="utf-8") as f:
+            json.dump({"mode": self.mode, "candidate_dims": self.candidate_dims, "ids": self.ids}, f)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "CompactIndex":
+        src = Path(path)
+        with open(src / "index.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        mode = meta["mode"]
+        lo = np.load(src / "lo.npy") if mode == "int8" else None
+        step = np.load(src / "step.npy") if mode == "int8" else None
+        return cls(
+            ids=meta["ids"],
+            vectors=np.load(src / "vectors.npy", mmap_mode="r"),
+            mode=mode,
+            codes=np.load(src / "codes.npy"),
+            lo=lo,
+            step=step,
+            candidate_dims=meta.get("candidate_dims"),
+        )
+
+    def candidate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate similarity of the (normalized) query to every row, from the codes only."""
+        if self.candidate_dims:
+            query = normalize(query[:self.candidate_dims])
+        if self.mode == "none":
+            return self.codes @ query
+        if self.mode == "int8":
+            # x ~= lo + (c + 128) * step  =>  x.q = lo.q + (c + 128).(step * q)
+            weighted = self.step * query
+            return self.codes.astype(np.float32) @ weighted + (self.lo @ query + 128.0 * weighted.sum())
+        bits = quantize_binary(query)
+        hamming = _POPCOUNT[np.bitwise_xor(self.codes, bits)].sum(axis=1, dtype=np.int32)
+        return -hamming.astype(np.float32)
+
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        k: int = 3,
+        rerank_factor: int = 4,
+        mask: Optional[np.ndarray] = None,
+    ) -> Tuple[List[str], List[float]]:
+        """
+        Top-k by compact score over k * rerank_factor candidates, re-ranked with full float vectors.
+
+        Args:
+            mask: Optional boolean array over rows; only True rows are considered (metadata pre-filter)
+
+        Returns:
+            (ids, cosine distances) best first, same distance convention as Chroma
+        """
+        allowed = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        if not len(allowed):
+            return [], []
+        query = normalize(np.asarray(query_embedding, dtype=np.float32))
+        k = min(k, len(allowed))
+        n_candidates = min(len(allowed), max(k, k * rerank_factor))
+        scores = self.candidate_scores(query)
+        if mask is not None:
+            scores = scores[allowed]
+        if n_candidates < len(allowed):
+            candidates = allowed[np.argpartition(-scores, n_candidates - 1)[:n_candidates]]
+        else:
+            candidates = allowed.copy()
+        candidates.sort()  # sequential reads from the memory-mapped vectors
+        exact = np.asarray(self.vectors[candidates]) @ query
+        order = np.argsort(-exact)[:k]
+        return [self.ids[i] for i in candidates[order]], (1.0 - exact[order]).tolist()
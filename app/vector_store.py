@@ -2,43 +2,332 @@
 import os
 # Silence Chroma telemetry (avoids "capture() takes 1 positional argument but 3 were given")
 os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+import json
+import shutil
+import threading
+from dataclasses import dataclass
+from pathlib import Path
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 from typing import List, Dict, Any, Optional
 
+import numpy as np
+
 from app.config import settings
+from app.kb_metadata import FILTER_FIELDS
+from app.vector_index import CompactIndex, QUANTIZATION_MODES, VectorWriter, metadata_columns, where_mask
+
+DEFAULT_COLLECTION = "knowledge_base"
+COMPACT_INDEX_DIRNAME = "compact_index"
+ACTIVE_INDEX_FILENAME = "active_index.json"
+STAGED_VECTORS_FILENAME = "staged_vectors.f32"
+
+# With a compact index the vectors live only there; Chroma rows get this 1-dimension stand-in, so
+# its HNSW graph and sqlite hold no float vectors. Collections built this way carry COMPACT_LAYOUT
+COMPACT_LAYOUT = {"vectors": "compact"}
+PLACEHOLDER_EMBEDDING = [1.0]
+
+
+def vector_layout() -> Dict[str, Any]:
+    """Where the configured store keeps vectors (recorded in the KB manifest; a change rebuilds the index)."""
+    quantization = (settings.embedding_quantization or "none").lower()
+    if quantization == "none" and not settings.search_dimensions:
+        return {"vectors": "chroma"}
+    return {**COMPACT_LAYOUT, "quantization": quantization, "search_dimensions": settings.search_dimensions or None}
+
+
+def release_collection(client, collection) -> bool:
+    """
+    Drop the Chroma client's cached segments for a collection (HNSW graph, metadata
+    reader) so their memory can be freed; they reload from disk on next use.
+
+    Relies on chromadb 0.4's LocalSegmentManager internals; returns False (nothing
+    released) when the client doesn't expose them.
+    """
+    try:
+        manager = client._server._manager
+        instances, segment_cache = manager._instances, manager._segment_cache
+    except AttributeError:
+        return False
+    with manager._lock:
+        scopes = segment_cache.pop(collection.id, {})
+        for segment in scopes.values():
+            instance = instances.pop(segment["id"], None)
+            if instance is None:
+                continue
+            instance.stop()  # unsubscribes from the embeddings queue; unpersisted writes replay on reload
+            if hasattr(instance, "close_persistent_index"):
+                instance.close_persistent_index()
+        handles = getattr(manager, "_vector_instances_file_handle_cache", None)
+        if handles is not None and collection.id in getattr(handles, "cache", {}):
+            del handles.cache[collection.id]
+    return True
+
+
+@dataclass
+class IndexVersion:
+    """One complete build of the KB index: a Chroma collection plus its compact index."""
+    version: int
+    collection: Any
+    compact_index: Optional[CompactIndex] = None
+    # FILTER_FIELDS values aligned with compact_index rows, for filtered compact queries
+    filter_columns: Optional[Dict[str, np.ndarray]] = None
+    # Vectors of a staged compact-layout version, spilled to disk until build_compact_index
+    writer: Optional[VectorWriter] = None
+
+    @property
+    def vectors_in_chroma(self) -> bool:
+        """False for compact-layout versions, whose Chroma rows hold only PLACEHOLDER_EMBEDDING."""
+        return (self.collection.metadata or {}).get("vectors") != COMPACT_LAYOUT["vectors"]
 
 
 class VectorStore:
-    """Wrapper around Chroma for vector storage and retrieval."""
-    
-    def __init__(self, collection_name: str = "knowledge_base"):
-        """Initialize Chroma client and collection."""
-        self.client = chromadb.PersistentClient(
+    """
+    Wrapper around Chroma for vector storage and retrieval.
+
+    Each (re)index builds a new versioned collection off to the side and then
+    swaps it in with a single reference assignment, so queries always run
+    against one complete version. The previous version is kept until the next
+    swap so in-flight queries can finish on it.
+
+    With EMBEDDING_QUANTIZATION / SEARCH_DIMENSIONS set, new versions keep
+    their vectors only in the compact index (codes in memory, float vectors
+    memory-mapped for re-ranking); Chroma stores documents and metadata.
+    """
+
+    def __init__(self, collection_name: str = DEFAULT_COLLECTION, client=None):
+        """Initialize Chroma client (or share an existing one) and the active collection."""
+        self.client = client or chromadb.PersistentClient(
             path=settings.chroma_db_path,
             settings=ChromaSettings(anonymized_telemetry=False)
         )
         self.collection_name = collection_name
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
-        )
-    
+        self.quantization = (settings.embedding_quantization or "none").lower()
+        if self.quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"EMBEDDING_QUANTIZATION must be one of {', '.join(QUANTIZATION_MODES)}")
+        self.search_dimensions = settings.search_dimensions or None
+        self._swap_lock = threading.Lock()
+        self._active = self._load_version(self._read_active_version())
+
+    @property
+    def collection(self):
+        return self._active.collection
+
+    @property
+    def compact_index(self) -> Optional[CompactIndex]:
+        return self._active.compact_index
+
+    @property
+    def version(self) -> int:
+        return self._active.version
+
+    @property
+    def compact_enabled(self) -> bool:
+        """True when queries go through the compact two-stage index instead of Chroma."""
+        return self.quantization != "none" or self.search_dimensions is not None
+
+    def _candidate_dims(self, full_dims: int) -> Optional[int]:
+        """Prefix length for candidate selection (None = full vector)."""
+        if self.search_dimensions and self.search_dimensions < full_dims:
+            return self.search_dimensions
+        return None
+
+    def _versioned_name(self, version: int) -> str:
+        # Version 0 is the unversioned collection from before hot reload existed
+        return self.collection_name if version == 0 else f"{self.collection_name}_v{version}"
+
+    def _compact_index_path(self, version: int) -> Path:
+        suffix = "" if version == 0 else f"_v{version}"
+        return Path(settings.chroma_db_path) / f"{self.collection_name}_{COMPACT_INDEX_DIRNAME}{suffix}"
+
+    @property
+    def _active_index_path(self) -> Path:
+        return Path(settings.chroma_db_path) / f"{self.collection_name}_{ACTIVE_INDEX_FILENAME}"
+
+    def _read_active_version(self) -> int:
+        try:
+            with open(self._active_index_path, "r", encoding="utf-8") as f:
+                return int(json.load(f)["version"])
+        except (OSError, ValueError, KeyError, json.JSONDecodeError):
+            return 0
+
+    def _load_version(self, version: int) -> IndexVersion:
+        name = self._versioned_name(version)
+        try:
+            # Not get_or_create_collection: passing metadata would overwrite the stored layout
+            collection = self.client.get_collection(name=name)
+        except ValueError:
+            collection = self.client.create_collection(name=name, metadata={"hnsw:space": "cosine"})
+        loaded = IndexVersion(version=version, collection=collection)
+        path = self._compact_index_path(version)
+        if (path / "index.json").exists() and (self.compact_enabled or not loaded.vectors_in_chroma):
+            index = CompactIndex.load(path)
+            # A compact-layout version is served by its index even under other settings (the
+            # manifest's vector layout changed, so a rebuild is on its way)
+            if not loaded.vectors_in_chroma or (
+                index.mode == self.quantization
+                and index.candidate_dims == self._candidate_dims(index.vectors.shape[-1])
+            ):
+                loaded.compact_index = index
+                loaded.filter_columns = self._filter_columns(collection, index.ids)
+        return loaded
+
+    @staticmethod
+    def _filter_columns(collection, ids: List[str]) -> Dict[str, np.ndarray]:
+        stored = collection.get(include=["metadatas"])
+        by_id = dict(zip(stored["ids"], stored["metadatas"]))
+        return metadata_columns([by_id.get(cid) for cid in ids], FILTER_FIELDS)
+
+    def new_version(self) -> IndexVersion:
+        """Create an empty collection for the next index version (not yet visible to queries)."""
+        version = max(self.version, self._read_active_version()) + 1
+        name = self._versioned_name(version)
+        try:
+            # Leftover from an interrupted build
+            self.client.delete_collection(name=name)
+        except ValueError:
+            pass
+        shutil.rmtree(self._compact_index_path(version), ignore_errors=True)
+        metadata = {"hnsw:space": "cosine", **(COMPACT_LAYOUT if self.compact_enabled else {})}
+        collection = self.client.create_collection(name=name, metadata=metadata)
+        return IndexVersion(version=version, collection=collection)
+
+    def activate(self, staged: IndexVersion):
+        """Atomically make a fully built version the one queries use; drop older versions."""
+        with self._swap_lock:
+            previous = self._active
+            self._active = staged
+            Path(settings.chroma_db_path).mkdir(parents=True, exist_ok=True)
+            tmp_path = self._active_index_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": staged.version}, f)
+            os.replace(tmp_path, self._active_index_path)
+            self._drop_versions_before(previous.version)
+
+    def _drop_versions_before(self, keep_from: int):
+        for collection in self.client.list_collections():
+            name = collection.name
+            if name == self.collection_name:
+                version = 0
+            elif name.startswith(f"{self.collection_name}_v") and name.rsplit("_v", 1)[1].isdigit():
+                version = int(name.rsplit("_v", 1)[1])
+            else:
+                continue
+            if version < keep_from:
+                self.client.delete_collection(name=name)
+                shutil.rmtree(self._compact_index_path(version), ignore_errors=True)
+
+    def build_compact_index(self, target: Optional[IndexVersion] = None):
+        """
+        Build the compact index: from the vectors spilled while a compact-layout version
+        was staged, or for an older version that keeps its vectors in Chroma, from those.
+        """
+        target = target or self._active
+        if not self.compact_enabled:
+            return
+        path = self._compact_index_path(target.version)
+        writer, target.writer = target.writer, None
+        if writer is not None and writer.ids:
+            vectors = writer.vectors()
+            index = CompactIndex.write(
+                path, writer.ids, vectors, self.quantization, self._candidate_dims(vectors.shape[1])
+            )
+            del vectors
+            writer.discard()
+        elif writer is None and target.vectors_in_chroma:
+            stored = target.collection.get(include=["embeddings"])
+            embeddings = np.asarray(stored["embeddings"] or [], dtype=np.float32)
+            if not len(embeddings):
+                self._drop_compact_index(target)
+                return
+            index = CompactIndex.write(
+                path, stored["ids"], embeddings, self.quantization, self._candidate_dims(embeddings.shape[1])
+            )
+        else:
+            # Nothing staged, or a compact-layout version whose index already holds its vectors
+            if writer is not None:
+                writer.discard()
+            if target.compact_index is None:
+                self._drop_compact_index(target)
+            return
+        target.filter_columns = self._filter_columns(target.collection, index.ids)
+        target.compact_index = index
+
+    def _drop_compact_index(self, target: IndexVersion):
+        target.compact_index = None
+        target.filter_columns = None
+        shutil.rmtree(self._compact_index_path(target.version), ignore_errors=True)
+
+    def release(self):
+        """Free the active version's cached Chroma segments (e.g. when its tenant is evicted)."""
+        with self._swap_lock:
+            release_collection(self.client, self._active.collection)
+
+    def count(self) -> int:
+        """Chunks in the active version."""
+        return self._active.collection.count()
+
+    def copy_files(self, files: List[str], target: IndexVersion) -> int:
+        """Copy stored chunks of the given KB files from the active version into a staged one."""
+        copied = 0
+        active = self._active
+        # A slice of files at a time keeps memory bounded for large KBs
+        for i in range(0, len(files), 100):
+            stored = active.collection.get(
+                where={"file": {"$in": files[i:i + 100]}},
+                include=["documents", "metadatas"] + (["embeddings"] if active.vectors_in_chroma else []),
+            )
+            if not stored["ids"]:
+                continue
+            if active.vectors_in_chroma:
+                embeddings = stored["embeddings"]
+            else:
+                index = active.compact_index
+                embeddings = np.asarray(index.vectors[index.rows(stored["ids"])])
+            self.add_documents(
+                ids=stored["ids"],
+                texts=stored["documents"],
+                embeddings=embeddings,
+                metadatas=stored["metadatas"],
+                target=target,
+            )
+            copied += len(stored["ids"])
+        return copied
+
     def add_documents(
         self,
         ids: List[str],
         texts: List[str],
         embeddings: List[List[float]],
         metadatas: Optional[List[Dict[str, Any]]] = None,
+        target: Optional[IndexVersion] = None,
     ):
-        """Add documents to the collection."""
-        self.collection.add(
+        """
+        Add documents to the active collection, or to a staged version.
+
+        Raises:
+            ValueError: The version keeps its vectors in a compact index that is already built
+                (add to a staged version from new_version instead)
+        """
+        target = target or self._active
+        if not target.vectors_in_chroma:
+            if target.writer is None:
+                if target.compact_index is not None:
+                    raise ValueError("Compact-layout versions are built once; add to a staged version")
+                target.writer = VectorWriter(
+                    self._compact_index_path(target.version) / STAGED_VECTORS_FILENAME
+                )
+            target.writer.append(ids, embeddings)
+            embeddings = [PLACEHOLDER_EMBEDDING] * len(ids)
+        elif isinstance(embeddings, np.ndarray):
+            embeddings = embeddings.tolist()
+        target.collection.add(
             ids=ids,
             documents=texts,
             embeddings=embeddings,
             metadatas=metadatas or [{}] * len(ids),
         )
-    
+
     def query(
         self,
         query_embedding: List[float],
@@ -47,30 +336,81 @@ class VectorStore:
     ) -> Dict[str, Any]:
         """
         Query the collection for similar documents.
-        
+
         Args:
             query_embedding: Query embedding vector
             n_results: Number of results to return
             where: Optional metadata filter
-        
+
         Returns:
             Dict with 'ids', 'documents', 'metadatas', 'distances'
         """
-        results = self.collection.query(
+        # One read of the active version; a concurrent swap can't mix two versions
+        active = self._active
+        if active.compact_index is not None:
+            if not where:
+                return self._query_compact(active, query_embedding, n_results)
+            try:
+                mask = where_mask(where, active.filter_columns or {})
+            except (KeyError, ValueError):
+                mask = None  # filter on a field without a column: let Chroma evaluate it
+            if mask is None and not active.vectors_in_chroma:
+                # Chroma only has placeholders to rank by, so it just selects the rows
+                mask = np.zeros(len(active.compact_index), dtype=bool)
+                mask[active.compact_index.rows(active.collection.get(where=where, include=[])["ids"])] = True
+            if mask is not None:
+                return self._query_compact(active, query_embedding, n_results, mask)
+        elif not active.vectors_in_chroma:
+            return {key: [[]] for key in ("ids", "documents", "metadatas", "distances")}
+        results = active.collection.query(
             query_embeddings=[query_embedding],
             n_results=n_results,
             where=where,
         )
         return results
-    
-    def clear(self):
-        """Clear all documents from the collection."""
-        self.client.delete_collection(name=self.collection_name)
-        self.collection = self.client.get_or_create_collection(
-            name=self.collection_name,
-            metadata={"hnsw:space": "cosine"}
+
+    def _query_compact(
+        self,
+        active: IndexVersion,
+        query_embedding: List[float],
+        n_results: int,
+        mask: Optional[np.ndarray] = None,
+    ) -> Dict[str, Any]:
+        """Search the compact index (optionally pre-filtered), then fetch documents/metadata for the hits from Chroma."""
+        ids, distances = active.compact_index.search(
+            query_embedding, k=n_results, rerank_factor=settings.quantization_rerank_factor, mask=mask
         )
+        found = active.collection.get(ids=ids, include=["documents", "metadatas"]) if ids else {"ids": []}
+        by_id = {
+            cid: (found["documents"][i], found["metadatas"][i])
+            for i, cid in enumerate(found["ids"])
+        }
+        hits = [(cid, dist) for cid, dist in zip(ids, distances) if cid in by_id]
+        return {
+            "ids": [[cid for cid, _ in hits]],
+            "documents": [[by_id[cid][0] for cid, _ in hits]],
+            "metadatas": [[by_id[cid][1] for cid, _ in hits]],
+            "distances": [[dist for _, dist in hits]],
+        }
+
+    def clear(self):
+        """Clear all documents (swaps in a new, empty version)."""
+        self.activate(self.new_version())
+
+
+_default_store: Optional[VectorStore] = None
+_default_lock = threading.Lock()
+
 
+def default_vector_store() -> VectorStore:
+    """
+    The default collection's store on CHROMA_DB_PATH, opened on first use.
 
-# Global vector store instance
-vector_store = VectorStore()
+    Lazy so a sharded parent (VECTOR_SHARDS > 1), whose collections all live
+    in the shard processes, never opens a Chroma client of its own.
+    """
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = VectorStore()
+        return _default_store
@@ -0,0 +1,23 @@
+"""Helpers shared by the KB embedding benchmarks (quantization_report.py, dimension_benchmark.py)."""
+import sys
+
+import numpy as np
+
+
+def load_kb_embeddings() -> np.ndarray:
+    """The default KB's stored embeddings; exits when it hasn't been indexed."""
+    from app.vector_store import default_vector_store
+    store = default_vector_store()
+    if store.compact_index is not None:
+        # Compact-layout KBs keep their vectors only in the compact index
+        return np.asarray(store.compact_index.vectors, dtype=np.float32)
+    stored = store.collection.get(include=["embeddings"])
+    if not stored["ids"]:
+        print("Knowledge base is empty; run `python -m app.kb_loader` or use --synthetic.")
+        sys.exit(1)
+    return np.asarray(stored["embeddings"], dtype=np.float32)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    """Mean share of each query's true top-k found."""
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark batch customer-profile enrichment.
+
+Compares calling get_customer_profile once per ticket with CustomerStore.enrich
+on a synthetic store, both from memory and memory-mapped from disk.
+
+Usage: python benchmarks/customer_enrichment.py [--customers 100000] [--tickets 100000]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.customer_store import PLANS, CustomerStore
+from app.tools.customer_profile import get_customer_profile
+
+
+def synthetic_records(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    plans = rng.choice(PLANS, size=n, p=[0.7, 0.25, 0.05])
+    tenure = rng.integers(0, 48, size=n)
+    regions = rng.choice(["", "us", "eu", "asia"], size=n)
+    return [
+        {
+            "id": f"cust_{i}",
+            "plan": str(plans[i]),
+            "tenure_months": int(tenure[i]),
+            "prior_tickets": 0,
+            "region": str(regions[i]) or None,
+        }
+        for i in range(n)
+    ]
+
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--tickets", type=int, default=100_000)
+    args = parser.parse_args()
+
+    records = synthetic_records(args.customers)
+    store = CustomerStore.from_records(records)
+    rng = np.random.default_rng(1)
+    ticket_ids = [f"cust_{i}" for i in rng.integers(0, args.customers, size=args.tickets)]
+    by_id = {r["id"]: r for r in records}
+
+    def per_ticket():
+        for cid in ticket_ids:
+            r = by_id[cid]
+            get_customer_profile(r["plan"], r["tenure_months"], r["region"])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store.save(tmp)
+        mapped = CustomerStore.load(tmp)
+        print(f"{args.tickets} tickets against {args.customers} customers")
+        print(f"  per-ticket get_customer_profile: {timed(per_ticket, repeat=1):8.1f} ms")
+        print(f"  CustomerStore.enrich (memory):   {timed(lambda: store.enrich(ticket_ids)):8.1f} ms")
+        print(f"  CustomerStore.enrich (mmap):     {timed(lambda: mapped.enrich(ticket_ids)):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
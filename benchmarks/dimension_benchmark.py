@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Query latency and recall at several embedding dimensions.
+
+For each prefix length, compares single-stage search on truncated vectors
+with the two-stage search used by the compact index (short prefix for
+candidates, full vectors for re-ranking). Truncating and re-normalizing a
+Matryoshka embedding matches what the API returns for a shorter `dimensions`.
+
+Uses the embeddings stored in Chroma, or a synthetic corpus with --synthetic
+(a decaying variance spectrum, so leading dimensions carry the most signal).
+
+Usage:
+  python benchmarks/dimension_benchmark.py [--dims 64,128,256,512]
+  python benchmarks/dimension_benchmark.py --synthetic 200000 --dim 1024
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.vector_index import CompactIndex, normalize
+from benchmarks._common import load_kb_embeddings, recall
+
+
+def synthetic(n: int, dim: int, rng) -> np.ndarray:
+    scale = 1.0 / np.sqrt(1.0 + np.arange(dim, dtype=np.float32) / 16.0)
+    return rng.standard_normal((n, dim), dtype=np.float32) * scale
+
+
+def run(index: CompactIndex, queries: np.ndarray, k: int, rerank_factor: int):
+    found = []
+    start = time.perf_counter()
+    for q in queries:
+        found.append([int(i) for i in index.search(q, k=k, rerank_factor=rerank_factor)[0]])
+    elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    return found, elapsed_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency/recall vs embedding dimension")
+    parser.add_argument("--dims", default="64,128,256,512")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic vectors instead of the KB")
+    parser.add_argument("--dim", type=int, default=1024)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = synthetic(args.synthetic, args.dim, rng) if args.synthetic else load_kb_embeddings()
+    vectors = normalize(vectors)
+    n, full = vectors.shape
+    k = min(args.k, n)
+    picks = rng.integers(0, n, size=args.queries)
+    queries = normalize(vectors[picks] + rng.normal(0, 0.5 / np.sqrt(full), size=(args.queries, full)))
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+    ids = [str(i) for i in range(n)]
+
+    print(f"{n} vectors x {full} dims, {args.queries} queries, recall@{k}, re-rank x{args.rerank_factor}")
+    print(f"{'dims':>6}{'1-stage ms':>12}{'recall':>8}{'2-stage ms':>12}{'recall':>8}")
+    dims = [int(d) for d in args.dims.split(",") if 0 < int(d) < full] + [full]
+    for d in dims:
+        index = CompactIndex.build(ids, vectors, "none", candidate_dims=d)
+        one, one_ms = run(index, queries, k, rerank_factor=1)
+        two, two_ms = run(index, queries, k, rerank_factor=args.rerank_factor)
+        print(f"{d:>6}{one_ms:>12.3f}{recall(one, truth):>8.3f}{two_ms:>12.3f}{recall(two, truth):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
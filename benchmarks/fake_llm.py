@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Local fake of the OpenAI-compatible chat + embeddings API, for load tests.
+
+Answers like a well-behaved model would, with configurable latency, so the
+API server can be driven at high rates without provider cost or rate limits:
+the first tool-enabled call asks for both tools, the next one finishes, and
+the JSON-mode call returns a keyword-based triage decision. Embeddings are
+deterministic hashed bag-of-words vectors, so similar texts stay close.
+
+Usage:
+  python benchmarks/fake_llm.py [--port 9100] [--latency-ms 400] [--jitter-ms 200]
+
+Point the app at it:
+  OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:9100/v1
+  EMBEDDING_PROVIDER=openai OPENAI_EMBEDDING_BASE_URL=http://127.0.0.1:9100/v1
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+
+app = FastAPI(title="Fake LLM")
+config = {"latency_ms": 400.0, "jitter_ms": 200.0, "embed_latency_ms": 30.0, "dims": 256}
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# (keywords, urgency, queue) checked in order against the conversation
+RULES = [
+    (("outage", "down", "500", "nobody can", "all users"), "critical", "infra"),
+    (("charge", "refund", "payment", "invoice", "billing"), "high", "billing"),
+    (("export", "dark mode", "feature"), "medium", "product"),
+]
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _usage(prompt: str, completion: str) -> dict:
+    p, c = _tokens(prompt), _tokens(completion)
+    return {"prompt_tokens": p, "completion_tokens": c, "total_tokens": p + c}
+
+
+def embed(text: str, dims: int) -> list:
+    vector = np.zeros(dims, dtype=np.float32)
+    for word in WORD_RE.findall(text.lower()):
+        vector[int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % dims] += 1.0
+    norm = float(np.linalg.norm(vector)) or 1.0
+    return (vector / norm).tolist()
+
+
+def _conversation(messages: list) -> str:
+    return "\n".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+
+
+def _decision(conversation: str) -> dict:
+    text = conversation.lower()
+    urgency, queue = "low", None
+    for keywords, rule_urgency, rule_queue in RULES:
+        if any(k in text for k in keywords):
+            urgency, queue = rule_urgency, rule_queue
+            break
+    action = {"critical": "escalate_to_human", "high": "route_to_specialist"}.get(urgency, "auto_respond")
+    return {
+        "classification": {
+            "urgency": urgency,
+            "product": queue,
+            "issue_type": None,
+            "sentiment": "negative" if "!" in conversation or "??" in conversation else "neutral",
+            "short_summary": "Synthetic triage decision from the fake LLM.",
+        },
+        "next_action": {
+            "action": action,
+            "target_queue": queue if action != "auto_respond" else None,
+            "auto_reply": "Thanks for reaching out, we're looking into this.",
+        },
+    }
+
+
+def _tool_calls(messages: list) -> list:
+    prompt = _conversation(messages[:2])
+    plan = re.search(r"Plan: (\w+)", prompt)
+    tenure = re.search(r"Tenure: (\d+)", prompt)
+    # Conversation lines look like "[2026-02-13 08:00] text"; search on the latest one
+    ticket_lines = [line.split("] ", 1)[-1] for line in prompt.splitlines() if line.startswith("[")]
+    query = " ".join(WORD_RE.findall(ticket_lines[-1] if ticket_lines else prompt)[:16]) or "help"
+    return [
+        {"id": "call_kb", "type": "function",
+         "function": {"name": "search_knowledge_base", "arguments": json.dumps({"query": query, "top_k": 3})}},
+        {"id": "call_profile", "type": "function",
+         "function": {"name": "get_customer_profile", "arguments": json.dumps({
+             "customer_plan": plan.group(1) if plan else "free",
+             "tenure_months": int(tenure.group(1)) if tenure else 0,
+         })}},
+    ]
+
+
+async def _sleep(base_ms: float, jitter_ms: float) -> None:
+    await asyncio.sleep(max(0.0, base_ms + random.uniform(-1, 1) * jitter_ms) / 1000)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    await _sleep(config["latency_ms"], config["jitter_ms"])
+    prompt = json.dumps(messages)
+    message = {"role": "assistant", "content": None}
+    if body.get("response_format", {}).get("type") == "json_object":
+        message["content"] = json.dumps(_decision(_conversation(messages[:2])))
+    elif body.get("tools") and not any(m.get("role") == "tool" for m in messages):
+        message["tool_calls"] = _tool_calls(messages)
+    else:
+        message["content"] = "I have what I need."
+    return {
+        "id": f"chatcmpl-fake-{random.getrandbits(32):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if "tool_calls" in message else "stop"}],
+        "usage": _usage(prompt, message["content"] or json.dumps(message.get("tool_calls"))),
+    }
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    dims = body.get("dimensions") or config["dims"]
+    await _sleep(config["embed_latency_ms"], config["embed_latency_ms"] / 2)
+    return {
+        "object": "list",
+        "data": [{"object": "embedding", "index": i, "embedding": embed(text, dims)} for i, text in enumerate(inputs)],
+        "model": body.get("model", "fake"),
+        "usage": {"prompt_tokens": sum(_tokens(t) for t in inputs), "total_tokens": sum(_tokens(t) for t in inputs)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"], help="Mean chat completion latency")
+    parser.add_argument("--jitter-ms", type=float, default=config["jitter_ms"], help="Uniform +/- jitter")
+    parser.add_argument("--embed-latency-ms", type=float, default=config["embed_latency_ms"])
+    parser.add_argument("--dims", type=int, default=config["dims"], help="Embedding size when not requested")
+    args = parser.parse_args()
+    config.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                  embed_latency_ms=args.embed_latency_ms, dims=args.dims)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+KB ingestion throughput (documents/sec) on a synthetic nested multi-format KB.
+
+Generates markdown, HTML and JSONL articles in nested folders, then runs the
+ingestion pipeline with 1..N parser processes. Embedding is replaced by a
+deterministic local stand-in (so network speed doesn't dominate); chunks
+are inserted into a throwaway Chroma collection unless --no-store is given.
+
+Usage: python benchmarks/ingest_throughput.py [--docs 5000] [--workers 1,2,4,8]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.ingest import discover_files, run_pipeline
+
+WORDS = (
+    "account billing payment export login error dashboard plan upgrade refund invoice "
+    "browser cache reset password region status outage settings theme report team"
+).split()
+
+
+def paragraph(rng: random.Random, n: int = 60) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def article_md(rng: random.Random, i: int) -> str:
+    sections = [f"## Section {s}\n\n{paragraph(rng)}\n\n- {paragraph(rng, 12)}\n- {paragraph(rng, 12)}" for s in range(4)]
+    return f"# Article {i}\n\n{paragraph(rng)}\n\n" + "\n\n".join(sections) + "\n"
+
+
+def article_html(rng: random.Random, i: int) -> str:
+    sections = "".join(f"<h2>Section {s}</h2><p>{paragraph(rng)}</p><ul><li>{paragraph(rng, 12)}</li></ul>" for s in range(4))
+    return f"<html><head><title>Article {i}</title></head><body><h1>Article {i}</h1><p>{paragraph(rng)}</p>{sections}</body></html>"
+
+
+def build_corpus(root: Path, n_docs: int) -> None:
+    rng = random.Random(0)
+    i = 0
+    while i < n_docs:
+        folder = root / f"area_{i % 10}" / f"topic_{(i // 10) % 20}"
+        folder.mkdir(parents=True, exist_ok=True)
+        kind = i % 3
+        if kind == 0:
+            (folder / f"a{i}.md").write_text(article_md(rng, i), encoding="utf-8")
+            i += 1
+        elif kind == 1:
+            (folder / f"a{i}.html").write_text(article_html(rng, i), encoding="utf-8")
+            i += 1
+        else:
+            batch = min(20, n_docs - i)
+            with open(folder / f"export_{i}.jsonl", "w", encoding="utf-8") as f:
+                for j in range(batch):
+                    f.write(json.dumps({"id": i + j, "title": f"Article {i + j}", "content": article_md(rng, i + j)}) + "\n")
+            i += batch
+
+
+def fake_embed(texts):
+    # Cheap deterministic stand-in for the embedding API
+    return [[(hash(t) >> s) % 1000 / 1000.0 for s in range(0, 32, 2)] for t in texts]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KB ingestion throughput")
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--no-store", action="store_true", help="Skip Chroma insertion")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        kb = Path(tmp) / "kb"
+        build_corpus(kb, args.docs)
+        files = discover_files(kb)
+        print(f"{args.docs} documents in {len(files)} files (md/html/jsonl, nested)")
+        print(f"{'workers':>8}{'docs':>8}{'chunks':>9}{'seconds':>9}{'docs/sec':>10}")
+        for workers in (int(w) for w in args.workers.split(",")):
+            if args.no_store:
+                add = lambda ids, texts, embeddings, metadatas: None
+            else:
+                import chromadb
+                from chromadb.config import Settings as ChromaSettings
+                client = chromadb.PersistentClient(
+                    path=str(Path(tmp) / f"chroma_{workers}"),
+                    settings=ChromaSettings(anonymized_telemetry=False),
+                )
+                collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+                add = lambda ids, texts, embeddings, metadatas: collection.add(
+                    ids=ids, documents=texts, embeddings=embeddings, metadatas=metadatas
+                )
+            stats = run_pipeline(files, fake_embed, add, max_tokens=120, overlap_tokens=12,
+                                 workers=workers, batch_size=args.batch_size)
+            print(f"{workers:>8}{stats['documents']:>8}{stats['chunks']:>9}{stats['seconds']:>9.2f}{stats['docs_per_second']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
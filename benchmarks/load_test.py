@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Open-loop load test of the triage API with production-like synthetic tickets.
+
+Ticket threads are synthesized from a template corpus (default
+data/tickets_sample.json) with a configurable plan mix, thread length and
+language mix. Each target rate is driven open-loop: requests are sent on
+schedule whether or not earlier ones have finished, and latency is measured
+from the scheduled send time, so queueing inside the server shows up in the
+percentiles instead of silently lowering the offered load.
+
+Reports per rate: achieved throughput, p50/p90/p99/max latency and error
+rate, then the saturation point (first rate where throughput falls below 90%
+of the offered load, errors exceed --max-error-rate, or p99 exceeds --slo-ms).
+
+--start-servers runs everything locally: the fake LLM backend
+(benchmarks/fake_llm.py) and `uvicorn main:app` pointed at it, with a
+throwaway Chroma DB, results log and profile directory. `uvicorn main:app`
+does not index on startup: the first request starts a background index and
+gets 503 until it is built, so the warm-up retries until the KB is ready
+before any rate is measured.
+
+Usage:
+  python benchmarks/load_test.py --start-servers --rates 2,5,10,20 --duration 30
+  python benchmarks/load_test.py --url http://staging:8000 --rates 5,10 --plan-mix free=0.6,pro=0.3,enterprise=0.1
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Opening messages per topic and language, plus follow-ups, for non-template languages
+PHRASES: Dict[str, Dict[str, List[str]]] = {
+    "en": {
+        "billing": ["My payment failed and I was charged twice for the upgrade."],
+        "login": ["I can't log in, I keep getting error 500."],
+        "export": ["The export to PDF button is greyed out on my account."],
+        "ui": ["Dark mode doesn't follow my system setting."],
+        "performance": ["The dashboard takes almost a minute to load."],
+        "follow_up": ["Any update on this?", "This is still not working.", "Please help, it's urgent!"],
+    },
+    "es": {
+        "billing": ["Mi pago falló y me cobraron dos veces por la mejora del plan."],
+        "login": ["No puedo iniciar sesión, siempre aparece el error 500."],
+        "export": ["El botón para exportar a PDF está desactivado en mi cuenta."],
+        "ui": ["El modo oscuro no sigue la configuración de mi sistema."],
+        "performance": ["El panel tarda casi un minuto en cargar."],
+        "follow_up": ["¿Hay alguna novedad?", "Sigue sin funcionar.", "¡Por favor, es urgente!"],
+    },
+    "fr": {
+        "billing": ["Mon paiement a échoué et j'ai été débité deux fois pour la mise à niveau."],
+        "login": ["Je ne peux pas me connecter, j'ai toujours l'erreur 500."],
+        "export": ["Le bouton d'export PDF est grisé sur mon compte."],
+        "ui": ["Le mode sombre ne suit pas le réglage de mon système."],
+        "performance": ["Le tableau de bord met presque une minute à charger."],
+        "follow_up": ["Des nouvelles ?", "Ça ne marche toujours pas.", "Aidez-moi, c'est urgent !"],
+    },
+    "de": {
+        "billing": ["Meine Zahlung ist fehlgeschlagen und mir wurde das Upgrade doppelt berechnet."],
+        "login": ["Ich kann mich nicht anmelden, es kommt immer Fehler 500."],
+        "export": ["Der PDF-Export ist in meinem Konto ausgegraut."],
+        "ui": ["Der Dunkelmodus folgt nicht meiner Systemeinstellung."],
+        "performance": ["Das Dashboard braucht fast eine Minute zum Laden."],
+        "follow_up": ["Gibt es etwas Neues?", "Es funktioniert immer noch nicht.", "Bitte helfen Sie, es ist dringend!"],
+    },
+    "th": {
+        "billing": ["ชำระเงินไม่สำเร็จ แต่ถูกตัดเงินสองครั้ง"],
+        "login": ["เข้าสู่ระบบไม่ได้ ขึ้น error 500 ตลอด"],
+        "export": ["ปุ่ม export PDF กดไม่ได้ในบัญชีของฉัน"],
+        "ui": ["โหมดมืดไม่เปลี่ยนตามการตั้งค่าระบบ"],
+        "performance": ["แดชบอร์ดโหลดช้ามาก เกือบหนึ่งนาที"],
+        "follow_up": ["มีความคืบหน้าไหมคะ", "ยังใช้งานไม่ได้เลย", "ช่วยด่วนด้วยค่ะ!"],
+    },
+}
+TOPICS = ("billing", "login", "export", "ui", "performance")
+REGIONS = (None, "us", "eu", "asia")
+
+
+def parse_mix(spec: str) -> Tuple[List[str], List[float]]:
+    """'free=0.5,pro=0.3' -> (keys, normalized weights)."""
+    pairs = [item.split("=") for item in spec.split(",") if item]
+    keys = [k.strip() for k, _ in pairs]
+    weights = np.array([float(w) for _, w in pairs])
+    return keys, (weights / weights.sum()).tolist()
+
+
+def parse_range(spec: str) -> Tuple[int, int]:
+    lo, _, hi = spec.partition("-")
+    return int(lo), int(hi or lo)
+
+
+class TicketGenerator:
+    """Synthesizes ticket threads: template messages for English, phrase banks for other languages."""
+
+    def __init__(self, templates: List[dict], plan_mix: str, language_mix: str, messages: str, seed: int = 0):
+        self.templates = templates
+        self.plans, self.plan_weights = parse_mix(plan_mix)
+        self.languages, self.language_weights = parse_mix(language_mix)
+        unknown = [lang for lang in self.languages if lang not in PHRASES]
+        if unknown:
+            raise ValueError(f"No phrases for languages: {', '.join(unknown)} (have {', '.join(PHRASES)})")
+        self.min_messages, self.max_messages = parse_range(messages)
+        self.rng = random.Random(seed)
+
+    def _texts(self, language: str, n: int) -> List[str]:
+        bank = PHRASES[language]
+        if language == "en" and self.templates:
+            texts = [m["text"] for m in self.rng.choice(self.templates)["messages"]]
+        else:
+            texts = [self.rng.choice(bank[self.rng.choice(TOPICS)])]
+        while len(texts) < n:
+            texts.append(self.rng.choice(bank["follow_up"]))
+        return texts[:n]
+
+    def ticket(self) -> dict:
+        rng = self.rng
+        plan = rng.choices(self.plans, self.plan_weights)[0]
+        language = rng.choices(self.languages, self.language_weights)[0]
+        n = rng.randint(self.min_messages, self.max_messages)
+        start = datetime.now(timezone.utc) - timedelta(hours=n)
+        messages = []
+        for i, text in enumerate(self._texts(language, n)):
+            start += timedelta(minutes=rng.randint(5, 90))
+            messages.append({"timestamp": start.isoformat(), "text": text})
+        return {
+            "customer": {
+                "plan": plan,
+                "region": rng.choice(REGIONS),
+                "tenure_months": rng.randint(0, 48),
+                "prior_tickets": rng.randint(0, 6),
+            },
+            "messages": messages,
+        }
+
+
+def percentile_ms(seconds: List[float], q: float) -> Optional[float]:
+    return float(np.percentile(seconds, q)) * 1000 if seconds else None
+
+
+def run_rate(
+    client: httpx.Client,
+    url: str,
+    tickets: List[dict],
+    rate: float,
+    duration: float,
+    max_in_flight: int,
+    poisson: bool,
+    rng: random.Random,
+) -> dict:
+    """Send at `rate` req/s for `duration` seconds, open-loop; latency counts from the scheduled send time."""
+    n = max(1, int(rate * duration))
+    offsets, t = [], 0.0
+    for _ in range(n):
+        offsets.append(t)
+        t += rng.expovariate(rate) if poisson else 1.0 / rate
+    offered = n / (t if poisson else duration)
+    latencies: List[float] = []
+    finished: List[float] = []
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def send(scheduled: float, ticket: dict):
+        try:
+            response = client.post(url, json=ticket)
+            error = None if response.status_code < 400 else f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        now = time.perf_counter()
+        with lock:
+            finished.append(now)
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+            else:
+                latencies.append(now - scheduled)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for i, offset in enumerate(offsets):
+            scheduled = started + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, scheduled, tickets[i % len(tickets)])
+    # Throughput over the whole run, including the tail of requests still queued at the end
+    elapsed = max(finished) - started
+    failed = sum(errors.values())
+    return {
+        "target_rps": rate,
+        "offered_rps": offered,
+        "sent": n,
+        "ok": len(latencies),
+        "errors": errors,
+        "error_rate": failed / n,
+        "achieved_rps": len(latencies) / elapsed,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p90_ms": percentile_ms(latencies, 90),
+        "p99_ms": percentile_ms(latencies, 99),
+        "max_ms": percentile_ms(latencies, 100),
+    }
+
+
+def saturation_reason(result: dict, max_error_rate: float, slo_ms: Optional[float]) -> Optional[str]:
+    if result["error_rate"] > max_error_rate:
+        return f"error rate {result['error_rate']:.1%}"
+    if result["achieved_rps"] < 0.9 * result["offered_rps"]:
+        return f"throughput {result['achieved_rps']:.1f}/{result['offered_rps']:.1f} req/s offered"
+    if slo_ms and (result["p99_ms"] or 0) > slo_ms:
+        return f"p99 {result['p99_ms']:.0f} ms > {slo_ms:g} ms"
+    return None
+
+
+def wait_for(url: str, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def warm_up(client: httpx.Client, url: str, ticket: dict, timeout: float) -> httpx.Response:
+    """POST until the server stops answering 503 (KB still being indexed in the background)."""
+    deadline = time.time() + timeout
+    while True:
+        response = client.post(url, json=ticket)
+        if response.status_code != 503 or time.time() > deadline:
+            return response
+        retry_after = min(float(response.headers.get("Retry-After", 2)), 2.0)
+        print(f"Warm-up: HTTP 503 ({response.json().get('detail', 'not ready')}), retrying in {retry_after:g}s")
+        time.sleep(retry_after)
+
+
+def start_servers(args, tmp: str) -> List[subprocess.Popen]:
+    """
+    Start the fake LLM and `uvicorn main:app` against it; returns the processes.
+
+    The API writes only under tmp (Chroma DB, results log, profiles, fixtures). It
+    does not index the KB on startup; the warm-up request starts that.
+    """
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    fake = subprocess.Popen([
+        sys.executable, str(ROOT / "benchmarks" / "fake_llm.py"), "--port", str(args.fake_port),
+        "--latency-ms", str(args.fake_latency_ms), "--jitter-ms", str(args.fake_jitter_ms),
+    ])
+    wait_for(f"{fake_url}/docs")
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "fake",
+        "OPENAI_BASE_URL": f"{fake_url}/v1",
+        "GROQ_API_KEY": "",
+        "EMBEDDING_PROVIDER": "openai",
+        "OPENAI_EMBEDDING_BASE_URL": f"{fake_url}/v1",
+        "CHROMA_DB_PATH": str(Path(tmp) / "chroma_db"),
+        "RESULTS_PATH": str(Path(tmp) / "results"),
+        "PROFILE_PATH": str(Path(tmp) / "profiles"),
+        "LLM_FIXTURES_PATH": str(Path(tmp) / "llm_fixtures"),
+        "LLM_RECORD_MODE": "off",
+        "KB_WATCH_ENABLED": "false",
+    }
+    api = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.api_port),
+        "--workers", str(args.api_workers), "--log-level", "warning",
+    ], cwd=ROOT, env=env)
+    wait_for(f"http://127.0.0.1:{args.api_port}/health")
+    return [api, fake]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test for /triage")
+    parser.add_argument("--url", default=None, help="API base URL (default: local servers)")
+    parser.add_argument("--endpoint", default="/triage", help="Endpoint to drive, with optional query string")
+    parser.add_argument("--header", action="append", default=[], help="Extra header, e.g. X-Tenant:acme")
+    parser.add_argument("--rates", default="1,2,5,10,20", help="Target req/s, comma-separated")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per rate")
+    parser.add_argument("--arrivals", choices=("constant", "poisson"), default="poisson")
+    parser.add_argument("--max-in-flight", type=int, default=512, help="Client-side concurrency cap")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--warmup-timeout", type=float, default=600.0, help="Max seconds to wait for the KB index")
+    parser.add_argument("--templates", default=str(ROOT / "data" / "tickets_sample.json"))
+    parser.add_argument("--plan-mix", default="free=0.5,pro=0.35,enterprise=0.15")
+    parser.add_argument("--language-mix", default="en=0.7,es=0.1,fr=0.05,de=0.05,th=0.1")
+    parser.add_argument("--messages", default="1-4", help="Messages per thread, N or MIN-MAX")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--slo-ms", type=float, default=None, help="p99 latency objective")
+    parser.add_argument("--stop-at-saturation", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    parser.add_argument("--start-servers", action="store_true", help="Run fake LLM + API locally")
+    parser.add_argument("--api-port", type=int, default=8077)
+    parser.add_argument("--api-workers", type=int, default=1)
+    parser.add_argument("--fake-port", type=int, default=9100)
+    parser.add_argument("--fake-latency-ms", type=float, default=400.0)
+    parser.add_argument("--fake-jitter-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    with open(args.templates, "r", encoding="utf-8") as f:
+        templates = json.load(f)
+    generator = TicketGenerator(templates, args.plan_mix, args.language_mix, args.messages, args.seed)
+    tickets = [generator.ticket() for _ in range(500)]
+    headers = dict(h.split(":", 1) for h in args.header)
+
+    processes: List[subprocess.Popen] = []
+    tmp = tempfile.TemporaryDirectory()
+    try:
+        if args.start_servers:
+            processes = start_servers(args, tmp.name)
+        base_url = (args.url or f"http://127.0.0.1:{args.api_port}").rstrip("/")
+        url = base_url + args.endpoint
+        limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+        with httpx.Client(timeout=args.timeout, limits=limits, headers=headers) as client:
+            # Warm-up: the first request starts indexing the KB in the background (503 until it is
+            # built), so retry until it is ready; otherwise the first rates count 503s as errors
+            warm = warm_up(client, url, tickets[0], args.warmup_timeout)
+            print(f"Warm-up: HTTP {warm.status_code}")
+            if warm.status_code == 503:
+                raise SystemExit(f"KB still not indexed after {args.warmup_timeout:g}s; not measuring")
+            print(f"\n{'target':>7}{'offered':>9}{'achieved':>10}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}")
+            results, saturation = [], None
+            rng = random.Random(args.seed)
+            for rate in (float(r) for r in args.rates.split(",")):
+                result = run_rate(client, url, tickets, rate, args.duration, args.max_in_flight,
+                                  args.arrivals == "poisson", rng)
+                results.append(result)
+                fmt = lambda v: f"{v:>9.0f}" if v is not None else f"{'-':>9}"
+                print(f"{rate:>7g}{result['offered_rps']:>9.2f}{result['achieved_rps']:>10.2f}{fmt(result['p50_ms'])}{fmt(result['p90_ms'])}"
+                      f"{fmt(result['p99_ms'])}{fmt(result['max_ms'])}{result['error_rate']:>8.1%}")
+                reason = saturation_reason(result, args.max_error_rate, args.slo_ms)
+                if reason and saturation is None:
+                    saturation = {"target_rps": rate, "reason": reason}
+                    if args.stop_at_saturation:
+                        break
+        sustained = [r["target_rps"] for r in results if not saturation or r["target_rps"] < saturation["target_rps"]]
+        print()
+        if saturation:
+            print(f"Saturation at {saturation['target_rps']:g} req/s ({saturation['reason']}); "
+                  f"max sustained rate tested: {max(sustained) if sustained else 'none'} req/s")
+        else:
+            print(f"No saturation up to {results[-1]['target_rps']:g} req/s; try higher --rates")
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"args": vars(args), "results": results, "saturation": saturation}, f, indent=2)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
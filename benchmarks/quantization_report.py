@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Recall-vs-size report for quantized KB embeddings.
+
+"index MB" is the compact index's resident codes. With a compact index the
+app keeps no other in-memory copy of the vectors: Chroma stores a 1-dimension
+placeholder, and the float vectors are memory-mapped only for re-ranking.
+
+Uses the embeddings already stored in Chroma (index the KB first), or a
+synthetic corpus with --synthetic. Queries are stored vectors plus noise;
+recall@k is measured against exact float32 search.
+
+Usage:
+  python benchmarks/quantization_report.py [--k 3] [--queries 200]
+  python benchmarks/quantization_report.py --synthetic 100000 --dim 1024
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.vector_index import CompactIndex, normalize
+from benchmarks._common import load_kb_embeddings, recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs index size for KB embedding quantization")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N random vectors instead of the KB")
+    parser.add_argument("--dim", type=int, default=1024)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        vectors = rng.standard_normal((args.synthetic, args.dim), dtype=np.float32)
+    else:
+        vectors = load_kb_embeddings()
+    vectors = normalize(vectors)
+    n, dim = vectors.shape
+    k = min(args.k, n)
+
+    picks = rng.integers(0, n, size=args.queries)
+    queries = normalize(vectors[picks] + rng.normal(0, 0.5 / np.sqrt(dim), size=(args.queries, dim)))
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+
+    ids = [str(i) for i in range(n)]
+    float_bytes = vectors.nbytes
+    print(f"{n} vectors x {dim} dims, {args.queries} queries, recall@{k}")
+    print(f"{'mode':<18}{'index MB':>12}{'x smaller':>11}{'recall':>9}")
+    print(f"{'float32':<18}{float_bytes / 1e6:>12.2f}{1.0:>11.1f}{1.0:>9.3f}")
+    for mode in ("int8", "binary"):
+        index = CompactIndex.build(ids, vectors, mode)
+        approx = np.array([np.argsort(-index.candidate_scores(q))[:k] for q in queries])
+        reranked = np.array([
+            [int(i) for i in index.search(q, k=k, rerank_factor=args.rerank_factor)[0]]
+            for q in queries
+        ])
+        ratio = float_bytes / index.nbytes
+        print(f"{mode:<18}{index.nbytes / 1e6:>12.2f}{ratio:>11.1f}{recall(approx, truth):>9.3f}")
+        label = f"{mode} + rerank x{args.rerank_factor}"
+        print(f"{label:<18}{index.nbytes / 1e6:>12.2f}{ratio:>11.1f}{recall(reranked, truth):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark the triage results store.
+
+Writes synthetic results as many small flush-sized segments, times the sink's
+record() call (request-path cost), compaction, and the summary / timeseries
+aggregates over all rows.
+
+Usage: python benchmarks/results_store_benchmark.py [--rows 2000000] [--segment-rows 20000]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.agent.models import AgentOutput, Classification, CustomerInfo, KBResult, NextAction, TicketThread
+from app.results_store import ACTIONS, COLUMNS, KB_SLOTS, SENTIMENTS, URGENCIES, ResultsSink, ResultsStore
+
+
+def synthetic_columns(store: ResultsStore, n: int, start: float, rng: np.random.Generator):
+    queues = store.encode("target_queue", ["billing", "infra", "product", "general_support"])
+    kb = store.encode("kb_id", [f"kb_{i}" for i in range(40)])
+    tenants = store.encode("tenant", ["default", "acme", "globex"])
+    return {
+        "ts": np.sort(start + rng.uniform(0, 7 * 86400, size=n)),
+        "tenant": rng.choice(tenants, size=n, p=[0.6, 0.3, 0.1]),
+        "plan": rng.choice(3, size=n, p=[0.6, 0.3, 0.1]),
+        "urgency": rng.choice(len(URGENCIES), size=n, p=[0.05, 0.2, 0.45, 0.3]),
+        "sentiment": rng.integers(0, len(SENTIMENTS), size=n),
+        "action": rng.integers(0, len(ACTIONS), size=n),
+        "target_queue": np.where(rng.random(n) < 0.2, -1, rng.choice(queues, size=n)),
+        "product": np.full(n, -1),
+        "issue_type": np.full(n, -1),
+        "kb_ids": rng.choice(kb, size=(n, KB_SLOTS)),
+        "latency_ms": rng.lognormal(7.0, 0.4, size=n),
+        "llm_ms": rng.lognormal(6.8, 0.4, size=n),
+        "prompt_tokens": rng.integers(1500, 4000, size=n),
+        "completion_tokens": rng.integers(80, 300, size=n),
+        "iterations": rng.integers(1, 4, size=n),
+        "reused": rng.random(n) < 0.1,
+    }
+
+
+def timed(label: str, fn):
+    started = time.perf_counter()
+    result = fn()
+    print(f"  {label:<34} {(time.perf_counter() - started) * 1000:>9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Results store benchmark")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--segment-rows", type=int, default=20_000, help="Rows per synthetic flush segment")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultsStore(tmp)
+        start = time.time() - 7 * 86400
+        print(f"Writing {args.rows} rows in segments of {args.segment_rows}...")
+        started = time.perf_counter()
+        for offset in range(0, args.rows, args.segment_rows):
+            store.write_segment(synthetic_columns(store, min(args.segment_rows, args.rows - offset), start, rng))
+        print(f"  {'write':<34} {(time.perf_counter() - started) * 1000:>9.1f} ms ({store.segment_count()} segments)")
+
+        row_bytes = sum(np.dtype(d).itemsize * (KB_SLOTS if c == "kb_ids" else 1) for c, d in COLUMNS.items())
+        print(f"  on disk: ~{row_bytes} bytes/row, {row_bytes * args.rows / 1e6:.0f} MB")
+
+        print("\nQueries (before compaction):")
+        summary = timed("summary", store.summary)
+        timed("summary, last 24h, one tenant", lambda: store.summary(since=time.time() - 86400, tenant="acme"))
+        timed("timeseries, hourly", lambda: store.timeseries(3600))
+
+        timed("compact", store.compact)
+        print(f"\nQueries (after compaction, {store.segment_count()} segments):")
+        timed("summary", store.summary)
+        timed("timeseries, hourly", lambda: store.timeseries(3600))
+        print(f"\n  records {summary['records']}, urgency {summary['urgency']}, latency {summary['latency_ms']}")
+
+        sink = ResultsSink(store, flush_seconds=3600, flush_rows=10**9)
+        thread = TicketThread(CustomerInfo("pro", tenure_months=3), [])
+        output = AgentOutput(
+            Classification("high", "Export"), [KBResult("kb_1", "Export", "", 0.8)], {}, NextAction("route_to_specialist", "product"),
+        )
+        n = 100_000
+        started = time.perf_counter()
+        for _ in range(n):
+            sink.record(thread, output, 812.0)
+        print(f"\n  record() on the request path       {(time.perf_counter() - started) / n * 1e6:>9.2f} us/call")
+        timed(f"flush {n} buffered rows", sink.flush)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+/triage response serialization: CPU per response and bytes on the wire.
+
+Compares the previous path (dataclasses.asdict -> Pydantic models ->
+jsonable_encoder -> JSONResponse) with build_triage_payload + ORJSONResponse,
+and the slimmed variants (include_snippets=false, fields=...), raw and gzipped.
+Then drives the real endpoint with concurrent requests through TestClient,
+with the agent stubbed so only API overhead is measured.
+
+Usage: python benchmarks/serialization_benchmark.py [--iterations 20000] [--requests 2000]
+"""
+import argparse
+import dataclasses
+import gzip
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+import app.api as api
+from app.agent.models import AgentOutput, Classification, KBResult, NextAction
+from app.schemas import (
+    ClassificationResponse,
+    KBResultResponse,
+    NextActionResponse,
+    TriageResponse,
+)
+from app.tools.customer_profile import get_customer_profile
+
+SNIPPET = ("If your payment failed, check that your card details are correct and that your bank "
+           "has not blocked the transaction. Pending charges from failed attempts are released "
+           "automatically within 3-5 business days. ") * 3
+
+
+def sample_output() -> AgentOutput:
+    return AgentOutput(
+        classification=Classification(
+            urgency="high", product="billing", issue_type="payment_failure",
+            sentiment="very_negative", short_summary="Customer charged three times but still on Free plan.",
+        ),
+        kb_results=[
+            KBResult(id=f"chunk{i:032d}", title="Billing and Payment Issues", snippet=SNIPPET[:500], score=0.81 - i * 0.05)
+            for i in range(3)
+        ],
+        customer_profile=get_customer_profile("free", 4, None),
+        next_action=NextAction(
+            action="route_to_specialist", target_queue="billing",
+            auto_reply="We're transferring your ticket to our billing team. They'll follow up shortly.",
+        ),
+    )
+
+
+def legacy_body(output: AgentOutput) -> bytes:
+    response = TriageResponse(
+        classification=ClassificationResponse(**dataclasses.asdict(output.classification)),
+        knowledge_base=[KBResultResponse(**dataclasses.asdict(r)) for r in output.kb_results],
+        customer_profile=output.customer_profile,
+        next_action=NextActionResponse(**dataclasses.asdict(output.next_action)),
+    )
+    # FastAPI re-validates against response_model, then encodes
+    validated = TriageResponse.model_validate(response.model_dump())
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def timed_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/triage serialization benchmark")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    output = sample_output()
+    variants = {
+        "legacy (asdict+pydantic+json)": lambda: legacy_body(output),
+        "direct + orjson": lambda: ORJSONResponse(api.build_triage_payload(output)).body,
+        "  include_snippets=false": lambda: ORJSONResponse(api.build_triage_payload(output, include_snippets=False)).body,
+        "  fields=classification,next_action": lambda: ORJSONResponse(
+            api.build_triage_payload(output, ["classification", "next_action"])).body,
+    }
+    print(f"{'variant':<38}{'us/resp':>9}{'bytes':>8}{'gzip':>7}")
+    for name, fn in variants.items():
+        body = fn()
+        print(f"{name:<38}{timed_us(fn, args.iterations):>9.1f}{len(body):>8}{len(gzip.compress(body)):>7}")
+
+    # End-to-end through the ASGI app with the agent stubbed out
+    from fastapi.testclient import TestClient
+    api.triage_ticket = lambda thread: output
+    client = TestClient(api.app)
+    ticket = {
+        "customer": {"plan": "free", "region": None, "tenure_months": 4, "prior_tickets": 0},
+        "messages": [{"timestamp": "2026-02-13T08:00:00Z", "text": "My payment failed when I tried to upgrade to Pro."}],
+    }
+    print(f"\n{args.requests} requests, concurrency {args.concurrency} (agent stubbed)")
+    print(f"{'request':<38}{'req/s':>9}{'wire bytes':>12}")
+    for label, params, headers in (
+        ("/triage", {}, {"Accept-Encoding": "identity"}),
+        ("/triage gzip", {}, {"Accept-Encoding": "gzip"}),
+        ("/triage?include_snippets=false", {"include_snippets": "false"}, {"Accept-Encoding": "identity"}),
+    ):
+        def call(_):
+            r = client.post("/triage", json=ticket, params=params, headers=headers)
+            return int(r.headers.get("content-length", len(r.content)))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            sizes = list(pool.map(call, range(args.requests)))
+        rate = args.requests / (time.perf_counter() - start)
+        print(f"{label:<38}{rate:>9.0f}{sizes[0]:>12}")
+
+
+if __name__ == "__main__":
+    main()
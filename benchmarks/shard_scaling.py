@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Sharded KB search scaling: indexing time and query latency vs shard count.
+
+Builds a synthetic corpus (clustered random unit vectors, --chunks-per-file
+chunks per KB file) into a ShardedVectorStore for each shard count, then
+measures sequential query latency (scatter, per-shard top-k, merge),
+concurrent query throughput, and an incremental reindex of one edited file
+(only the shard owning it is rebuilt).
+
+Shard processes inherit the environment, so EMBEDDING_QUANTIZATION /
+SEARCH_DIMENSIONS apply inside each shard.
+
+Usage: python benchmarks/shard_scaling.py [--chunks 2000000] [--dims 384] [--shards 1,2,4,8]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Add project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.sharding import ShardedVectorStore, ShardPool
+
+BATCH = 5000
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+class Corpus:
+    """Deterministic synthetic chunks: any batch can be regenerated from its offset."""
+
+    def __init__(self, chunks: int, dims: int, chunks_per_file: int, clusters: int = 256, seed: int = 0):
+        self.chunks, self.dims, self.chunks_per_file = chunks, dims, chunks_per_file
+        self.seed = seed
+        self.centers = unit(np.random.default_rng(seed).standard_normal((clusters, dims)))
+
+    def file(self, i: int) -> str:
+        return f"doc_{i // self.chunks_per_file:07d}.md"
+
+    def files(self):
+        return sorted({self.file(i) for i in range(0, self.chunks, self.chunks_per_file)})
+
+    def vectors(self, start: int, n: int, salt: int = 0) -> np.ndarray:
+        rng = np.random.default_rng((self.seed, start, salt))
+        centers = self.centers[rng.integers(0, len(self.centers), size=n)]
+        return unit(centers + rng.standard_normal((n, self.dims)) / np.sqrt(self.dims))
+
+    def rows(self, start: int, n: int, salt: int = 0):
+        ids = [f"c{i}" for i in range(start, start + n)]
+        texts = [f"chunk {i}" for i in range(start, start + n)]
+        metadatas = [{"file": self.file(i), "title": self.file(i)} for i in range(start, start + n)]
+        return ids, texts, self.vectors(start, n, salt).tolist(), metadatas
+
+
+def build(store: ShardedVectorStore, corpus: Corpus) -> float:
+    started = time.perf_counter()
+    staged = store.new_version()
+    store.copy_files([], staged)
+    for start in range(0, corpus.chunks, BATCH):
+        ids, texts, embeddings, metadatas = corpus.rows(start, min(BATCH, corpus.chunks - start))
+        store.add_documents(ids, texts, embeddings, metadatas, target=staged)
+        done = start + len(ids)
+        if done % (BATCH * 40) == 0:
+            print(f"    {done} chunks ({done / (time.perf_counter() - started):.0f}/s)")
+    store.activate(staged)
+    return time.perf_counter() - started
+
+
+def reindex_one_file(store: ShardedVectorStore, corpus: Corpus) -> float:
+    # One edited file: its chunks re-added, every other file carried over
+    files = corpus.files()
+    edited = files[len(files) // 2]
+    first = int(edited[4:11]) * corpus.chunks_per_file
+    started = time.perf_counter()
+    staged = store.new_version()
+    store.copy_files([f for f in files if f != edited], staged)
+    n = min(corpus.chunks_per_file, corpus.chunks - first)
+    ids, texts, embeddings, metadatas = corpus.rows(first, n, salt=1)
+    store.add_documents(ids, texts, embeddings, metadatas, target=staged)
+    store.activate(staged)
+    return time.perf_counter() - started
+
+
+def percentile(values, q) -> float:
+    return float(np.percentile(values, q)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded KB search scaling benchmark")
+    parser.add_argument("--chunks", type=int, default=2_000_000)
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--chunks-per-file", type=int, default=40)
+    parser.add_argument("--shards", default="1,2,4,8", help="Comma-separated shard counts")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=12, help="n_results per query (top_k x KB_OVERFETCH_FACTOR)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--skip-reindex", action="store_true")
+    args = parser.parse_args()
+
+    corpus = Corpus(args.chunks, args.dims, args.chunks_per_file)
+    queries = corpus.vectors(10**9, args.queries, salt=2).tolist()
+    rows = []
+    for shards in [int(s) for s in args.shards.split(",")]:
+        with tempfile.TemporaryDirectory() as tmp:
+            print(f"\n{shards} shard(s): indexing {args.chunks} chunks ({args.dims} dims)...")
+            pool = ShardPool(shards, Path(tmp))
+            try:
+                store = ShardedVectorStore("bench", pool=pool)
+                index_seconds = build(store, corpus)
+                print(f"  indexed in {index_seconds:.1f}s ({args.chunks / index_seconds:.0f} chunks/s)")
+
+                for q in queries[:10]:
+                    store.query(q, args.top_k)  # warm up
+                latencies = []
+                for q in queries:
+                    started = time.perf_counter()
+                    store.query(q, args.top_k)
+                    latencies.append(time.perf_counter() - started)
+
+                def timed_query(q):
+                    started = time.perf_counter()
+                    store.query(q, args.top_k)
+                    return time.perf_counter() - started
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                    concurrent = list(executor.map(timed_query, queries))
+                qps = len(queries) / (time.perf_counter() - started)
+
+                reindex_seconds = None if args.skip_reindex else reindex_one_file(store, corpus)
+                rows.append((shards, index_seconds, percentile(latencies, 50), percentile(latencies, 99),
+                             percentile(concurrent, 99), qps, reindex_seconds))
+            finally:
+                pool.close()
+
+    print(f"\n{args.chunks} chunks, {args.dims} dims, n_results={args.top_k}, concurrency={args.concurrency}")
+    print(f"{'shards':>6} {'index s':>9} {'chunks/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'conc p99':>9} {'qps':>7} {'1-file reindex s':>17}")
+    for shards, index_seconds, p50, p99, conc_p99, qps, reindex_seconds in rows:
+        reindex = f"{reindex_seconds:.2f}" if reindex_seconds is not None else "-"
+        print(
+            f"{shards:>6} {index_seconds:>9.1f} {args.chunks / index_seconds:>9.0f} {p50:>8.1f} {p99:>8.1f} "
+            f"{conc_p99:>9.1f} {qps:>7.0f} {reindex:>17}"
+        )
+
+
+if __name__ == "__main__":
+    main()
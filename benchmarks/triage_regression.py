@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Offline triage-quality regression harness.
+
+--record runs the corpus against the live providers, saving every chat and
+embedding call as fixtures plus the decisions as a baseline. Without it,
+the same corpus is replayed from the fixtures (no network) and decisions
+are compared to each ticket's "expected" labels (accuracy) and to the
+baseline (self-consistency: replaying unchanged code always agrees 100%).
+Tickets whose LLM requests no longer match a fixture (e.g. after a prompt
+change) are listed separately instead of aborting the run.
+
+Reports urgency/action/queue agreement, per-stage latency, LLM iterations
+and token counts, so a prompt or performance change can be checked for
+accuracy and speed in one run. --profile also samples stacks and keeps the
+slowest tickets as flamegraph input (folded stacks) under PROFILE_PATH.
+
+Usage:
+  python benchmarks/triage_regression.py --record [corpus.json]
+  python benchmarks/triage_regression.py [corpus.json]
+  python benchmarks/triage_regression.py --profile [corpus.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add project root
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+FIELDS = ("urgency", "action", "target_queue")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Record/replay triage regression run")
+    parser.add_argument("corpus", nargs="?", default=str(ROOT / "data" / "tickets_sample.json"))
+    parser.add_argument("--record", action="store_true", help="Call live providers and save fixtures + baseline")
+    parser.add_argument("--fixtures", default=None, help="Fixture directory (default LLM_FIXTURES_PATH)")
+    parser.add_argument("--profile", action="store_true", help="Sample stacks; keep the slowest tickets under PROFILE_PATH")
+    return parser.parse_args()
+
+
+def to_thread(ticket: dict):
+    from app.agent.models import CustomerInfo, TicketMessage, TicketThread
+    from app.schemas import TicketThreadRequest
+    request = TicketThreadRequest.model_validate(ticket)
+    return TicketThread(
+        customer=CustomerInfo(
+            plan=request.customer.plan,
+            region=request.customer.region,
+            tenure_months=request.customer.tenure_months,
+            prior_tickets=request.customer.prior_tickets,
+        ),
+        messages=[TicketMessage(timestamp=m.timestamp, text=m.text) for m in request.messages],
+    )
+
+
+def main():
+    args = parse_args()
+    # Must be set before app modules read settings
+    os.environ["LLM_RECORD_MODE"] = "record" if args.record else "replay"
+    if args.fixtures:
+        os.environ["LLM_FIXTURES_PATH"] = args.fixtures
+
+    from app.config import settings
+    # Index the KB into a Chroma DB next to the fixtures, so KB embeddings are recorded too
+    # and a fresh checkout can replay without ever having called the embedding API
+    settings.chroma_db_path = str(Path(settings.llm_fixtures_path) / "chroma_db")
+
+    from app.agent.triage_agent import triage_ticket
+    from app.kb_loader import index_knowledge_base
+    from app.profiling import SlowestProfiles, profile_request
+    from app.tracing import traced
+
+    baseline_path = Path(settings.llm_fixtures_path) / "baseline.json"
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    index_knowledge_base()
+
+    profile_store = SlowestProfiles(settings.profile_path, settings.profile_keep_slowest)
+    # decisions stays aligned with corpus (None = not replayed); traces/totals cover replayed tickets
+    decisions, traces, totals, unreplayed = [], [], [], []
+    for i, ticket in enumerate(corpus):
+        try:
+            if args.profile:
+                with profile_request(f"ticket {i}", settings.profile_sample_interval_ms / 1000) as profile:
+                    output = triage_ticket(to_thread(ticket))
+                trace, total = profile.trace, profile.wall_ms
+                profile_store.add(profile)
+            else:
+                with traced() as trace:
+                    started = time.perf_counter()
+                    output = triage_ticket(to_thread(ticket))
+                    total = (time.perf_counter() - started) * 1000
+        except LookupError as e:
+            # Replay only: a request changed since recording, so this ticket has no fixture
+            decisions.append(None)
+            unreplayed.append((i, str(e)))
+            print(f"[{i}] not replayed: {e}")
+            continue
+        totals.append(total)
+        decisions.append({
+            "urgency": output.classification.urgency,
+            "action": output.next_action.action,
+            "target_queue": output.next_action.target_queue,
+        })
+        traces.append(trace)
+        print(f"[{i}] {decisions[-1]}")
+
+    if args.record:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(decisions, f, indent=2)
+        print(f"Recorded fixtures and baseline for {len(corpus)} tickets in {baseline_path.parent}")
+
+    baseline = []
+    if baseline_path.exists():
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    references = (
+        ("vs expected labels", [ticket.get("expected") for ticket in corpus]),
+        ("vs baseline (self-consistency)", [baseline[i] if i < len(baseline) else None for i in range(len(corpus))]),
+    )
+    for title, expected_labels in references:
+        print(f"\n--- Agreement {title} ---")
+        for field in FIELDS:
+            compared = agree = 0
+            for decision, expected in zip(decisions, expected_labels):
+                if decision is None or not expected or field not in expected:
+                    continue
+                compared += 1
+                agree += decision[field] == expected[field]
+            if compared:
+                print(f"  {field:<13} {agree}/{compared} ({agree / compared:.0%})")
+            else:
+                print(f"  {field:<13} nothing to compare")
+
+    if unreplayed:
+        print(f"\n--- Not replayed ({len(unreplayed)}/{len(corpus)}; excluded above, re-record with --record) ---")
+        for i, error in unreplayed:
+            print(f"  [{i}] {error}")
+    if not traces:
+        return
+
+    print("\n--- Latency per ticket (ms, mean) ---")
+    n = len(traces)
+    stage_names = sorted({name for t in traces for name in t.stages})
+    for name in stage_names:
+        wall = sum(t.stages[name].wall_seconds for t in traces if name in t.stages) * 1000 / n
+        calls = sum(t.stages[name].calls for t in traces if name in t.stages) / n
+        print(f"  {name:<32} {wall:>9.2f}  ({calls:.1f} calls)")
+    print(f"  {'total':<32} {sum(totals) / n:>9.2f}")
+
+    def counter(name):
+        return sum(t.counters.get(name, 0) for t in traces)
+
+    if counter("chat_recorded_ms"):
+        print(f"  {'llm (as recorded)':<32} {counter('chat_recorded_ms') / n:>9.2f}")
+
+    print("\n--- Usage ---")
+    print(f"  llm calls/ticket     {counter('llm_calls') / n:.2f}")
+    print(f"  agent iterations     {counter('llm_iterations') / n:.2f}/ticket")
+    print(f"  tool memo hits       {int(counter('tool_memo_hits'))}")
+    settled = sum(counter(f"speculation_{o}") for o in ("hits", "misses", "unused", "errors"))
+    if settled:
+        print(f"  speculation hits     {int(counter('speculation_hits'))}/{int(settled)} "
+              f"({counter('speculation_hits') / settled:.0%}; {int(counter('speculation_misses'))} missed, "
+              f"{int(counter('speculation_unused'))} unused)")
+    stops = sorted({name for t in traces for name in t.counters if name.startswith("agent_stop:")})
+    print("  loop stopped by      " + ", ".join(f"{name.split(':', 1)[1]} x{int(counter(name))}" for name in stops))
+    print(f"  prompt tokens        {int(counter('prompt_tokens'))} ({counter('prompt_tokens') / n:.0f}/ticket)")
+    print(f"  completion tokens    {int(counter('completion_tokens'))} ({counter('completion_tokens') / n:.0f}/ticket)")
+
+    if args.profile:
+        kept = profile_store.report()
+        print(f"\n--- Slowest {len(kept)} tickets (folded stacks in {settings.profile_path}) ---")
+        for profile_id, summary in kept.items():
+            print(f"  {profile_id}  {summary['label']:<12} {summary['wall_ms']:>9.1f} ms  "
+                  f"cpu {summary['cpu_ms']:.1f} ms  alloc {summary['allocated_blocks']:+d} blocks")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,11 @@ Usage:
   2. Run: uv run python chat_with_bot.py
   3. Choose a customer profile by number.
   4. Type your message and press Enter; the bot responds. Type 'quit' or 'exit' to end.
+
+  --profile prints a stage/CPU/allocation breakdown and the hottest frames after each turn,
+  and keeps the slowest turns as flamegraph input (folded stacks) under PROFILE_PATH.
 """
+import argparse
 import json
 import sys
 from pathlib import Path
@@ -22,7 +26,9 @@ sys.path.insert(0, str(Path(__file__).resolve().parent))
 
 from app.agent.models import CustomerInfo, TicketMessage, TicketThread
 from app.agent.triage_agent import triage_ticket
+from app.config import settings
 from app.kb_loader import index_knowledge_base
+from app.profiling import SlowestProfiles, print_profile, profile_request
 
 
 MOCK_CUSTOMERS_PATH = Path(__file__).parent / "data" / "mock_customers.json"
@@ -38,7 +44,7 @@ def load_mock_customers():
     return data.get("customers", data) if isinstance(data, dict) else data
 
 
-def run_chat():
+def run_chat(profile_turns: bool = False):
     customers = load_mock_customers()
     if not customers:
         print("No customers in mock_customers.json. Add at least one profile.")
@@ -66,6 +72,7 @@ def run_chat():
         prior_tickets=profile.get("prior_tickets", 0),
     )
     messages: list[TicketMessage] = []
+    profile_store = SlowestProfiles(settings.profile_path, settings.profile_keep_slowest) if profile_turns else None
 
     print("\n--- Chat with RAG bot (customer: {} | plan: {}) ---".format(
         profile.get("label", profile.get("id", "")), customer.plan))
@@ -88,7 +95,13 @@ def run_chat():
 
         print("\nBot (thinking...)")
         try:
-            output = triage_ticket(thread)
+            if profile_store is not None:
+                with profile_request(f"chat turn {len(messages)}", settings.profile_sample_interval_ms / 1000) as profile:
+                    output = triage_ticket(thread)
+                print_profile(profile)
+                profile_store.add(profile)
+            else:
+                output = triage_ticket(thread)
         except Exception as e:
             print(f"Error: {e}")
             continue
@@ -132,6 +145,9 @@ def run_chat():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat with the triage bot")
+    parser.add_argument("--profile", action="store_true", help="Profile each turn (see PROFILE_PATH)")
+    args = parser.parse_args()
     print("Initializing knowledge base (if needed)...")
     index_knowledge_base()
-    run_chat()
+    run_chat(profile_turns=args.profile)